@@ -0,0 +1,210 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmarks for lax control flow.
+
+To make it run faster, set env var TARGET_TOTAL_SECS to a low number (e.g. 2).
+"""
+from functools import partial
+
+from absl import app
+
+import jax
+from jax import lax
+from jax import numpy as np
+from jax.config import config
+
+from benchmarks import benchmark
+
+import numpy as onp
+
+
+def _rnn_params(n_in, n_hid, n_out, length):
+  """The RNN of lax_control_flow_test.testScanRnn, at a configurable size."""
+  r = onp.random.RandomState(0)
+  W_trans = r.randn(n_hid, n_hid + n_in).astype(onp.float32)
+  W_out = r.randn(n_out, n_hid + n_in).astype(onp.float32)
+  inputs = r.randn(length, n_in).astype(onp.float32)
+  targets = r.randn(length, n_out).astype(onp.float32)
+  return (W_trans, W_out), inputs, targets
+
+def _rnn_step(params, state, input):
+  W_trans, W_out = params
+  stacked = np.concatenate([state, input])
+  output = np.tanh(np.dot(W_out, stacked))
+  next_state = np.tanh(np.dot(W_trans, stacked))
+  return next_state, output
+
+def _rnn_loss(params, inputs, targets, unroll=1, checkpoint_levels=0):
+  init_state = np.zeros(params[0].shape[0], np.float32)
+  _, outputs = lax.scan(partial(_rnn_step, params), init_state, inputs,
+                        unroll=unroll, checkpoint_levels=checkpoint_levels)
+  return np.sum((outputs - targets) ** 2)
+
+
+def scan_unroll_benchmark():
+  def get_benchmark_fn(length, unroll, mode):
+    params, inputs, targets = _rnn_params(4, 8, 1, length)
+    loss = partial(_rnn_loss, unroll=unroll)
+    f = jax.jit(loss if mode == "forward" else jax.grad(loss))
+    jax.tree_util.tree_map(lambda x: x.block_until_ready(),
+                           f(params, inputs, targets))
+    def benchmark_fn():
+      out = f(params, inputs, targets)
+      jax.tree_util.tree_map(lambda x: x.block_until_ready(), out)
+    return benchmark_fn
+
+  params = []
+  for length in (100, 1000):
+    for unroll in (1, 2, 4, 8, 16):
+      for mode in ("forward", "grad"):
+        params.append({"length": length, "unroll": unroll, "mode": mode})
+  benchmark.benchmark_suite(get_benchmark_fn, params, "scan_unroll")
+
+
+def fori_loop_unroll_benchmark():
+  def get_benchmark_fn(unroll):
+    body = lambda i, x: x * 0.999 + np.sin(x)
+    f = jax.jit(lambda x: lax.fori_loop(0, 1000, body, x, unroll=unroll))
+    x = np.ones(16)
+    f(x).block_until_ready()
+    return lambda: f(x).block_until_ready()
+
+  params = [{"unroll": unroll} for unroll in (1, 2, 4, 8, 16)]
+  benchmark.benchmark_suite(get_benchmark_fn, params, "fori_loop_unroll")
+
+
+def scan_checkpoint_benchmark():
+  """Times the gradient of a long RNN for each level of scan checkpointing."""
+  def get_benchmark_fn(length, checkpoint_levels):
+    params, inputs, targets = _rnn_params(4, 256, 1, length)
+    f = jax.jit(jax.grad(partial(_rnn_loss,
+                                 checkpoint_levels=checkpoint_levels)))
+    jax.tree_util.tree_map(lambda x: x.block_until_ready(),
+                           f(params, inputs, targets))
+    def benchmark_fn():
+      out = f(params, inputs, targets)
+      jax.tree_util.tree_map(lambda x: x.block_until_ready(), out)
+    return benchmark_fn
+
+  params = []
+  for length in (1000, 10000):
+    for checkpoint_levels in (0, 1, 2):
+      params.append({"length": length, "checkpoint_levels": checkpoint_levels})
+  benchmark.benchmark_suite(get_benchmark_fn, params, "scan_checkpoint")
+
+
+def linear_recurrence_benchmark():
+  """Compares lax.scan and lax.associative_scan on h[t] = a[t] h[t-1] + b[t]."""
+  def sequential(a, b):
+    step = lambda h, ab: (ab[0] * h + ab[1],) * 2
+    return lax.scan(step, np.zeros(a.shape[1:], a.dtype), (a, b))[1]
+
+  def parallel(a, b):
+    def combine(x, y):
+      (a_x, b_x), (a_y, b_y) = x, y
+      return a_x * a_y, a_y * b_x + b_y
+    return lax.associative_scan(combine, (a, b))[1]
+
+  def get_benchmark_fn(length, method):
+    r = onp.random.RandomState(0)
+    a = r.rand(length, 64).astype(onp.float32)
+    b = r.randn(length, 64).astype(onp.float32)
+    f = jax.jit(sequential if method == "scan" else parallel)
+    f(a, b).block_until_ready()
+    return lambda: f(a, b).block_until_ready()
+
+  params = []
+  for length in (1000, 100000):
+    for method in ("scan", "associative_scan"):
+      params.append({"length": length, "method": method})
+  benchmark.benchmark_suite(get_benchmark_fn, params, "linear_recurrence")
+
+
+def _with_cond_batching(strategy, fun, *args):
+  prev = config.FLAGS.jax_cond_batching
+  config.update("jax_cond_batching", strategy)
+  try:
+    return fun(*args)
+  finally:
+    config.update("jax_cond_batching", prev)
+
+
+def cond_batching_benchmark():
+  """Finds where predicated batching of cond beats selecting between branches.
+
+  Only `fraction` of the lanes take the expensive branch.
+  """
+  def expensive(x):
+    for _ in range(4):
+      x = np.tanh(np.dot(x, x))
+    return x
+
+  def get_benchmark_fn(width, fraction, strategy):
+    r = onp.random.RandomState(0)
+    pred = r.rand(1024) < fraction
+    xs = r.randn(1024, width, width).astype(onp.float32)
+    f = jax.jit(jax.vmap(lambda p, x: lax.cond(p, x, expensive, x, np.sin)))
+    _with_cond_batching(strategy, f, pred, xs).block_until_ready()
+    return lambda: f(pred, xs).block_until_ready()
+
+  params = []
+  for width in (4, 32):
+    for fraction in (0.01, 0.1, 0.5, 0.9):
+      for strategy in ("select", "predicated"):
+        params.append({"width": width, "fraction": fraction,
+                       "strategy": strategy})
+  benchmark.benchmark_suite(get_benchmark_fn, params, "cond_batching")
+
+
+def while_loop_batching_benchmark():
+  """Compares while_loop batching strategies as trip counts diverge.
+
+  One in `1 / fraction` lanes runs 100 iterations, the others run 1.
+  """
+  def body(c):
+    i, x = c
+    return i - 1, np.tanh(np.dot(x, x))
+
+  def get_benchmark_fn(fraction, strategy):
+    r = onp.random.RandomState(0)
+    trips = onp.where(r.rand(1024) < fraction, 100, 1).astype(onp.int32)
+    xs = r.randn(1024, 32, 32).astype(onp.float32)
+    f = jax.jit(jax.vmap(
+        lambda n, x: lax.while_loop(lambda c: c[0] > 0, body, (n, x))[1]))
+    _with_cond_batching(strategy, f, trips, xs).block_until_ready()
+    return lambda: f(trips, xs).block_until_ready()
+
+  params = []
+  for fraction in (0.01, 0.1, 0.5, 1.0):
+    for strategy in ("select", "predicated"):
+      params.append({"fraction": fraction, "strategy": strategy})
+  benchmark.benchmark_suite(get_benchmark_fn, params, "while_loop_batching")
+
+
+def run_all_benchmarks():
+  scan_unroll_benchmark()
+  fori_loop_unroll_benchmark()
+  scan_checkpoint_benchmark()
+  linear_recurrence_benchmark()
+  cond_batching_benchmark()
+  while_loop_batching_benchmark()
+
+
+def main(unused_argv):
+  run_all_benchmarks()
+
+
+if __name__ == "__main__":
+  config.config_with_absl()
+  app.run(main)
@@ -0,0 +1,93 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmarks for evaluating and analyzing jaxprs.
+
+To make it run faster, set env var TARGET_TOTAL_SECS to a low number (e.g. 2).
+"""
+from absl import app
+
+import jax
+from jax import core
+from jax import numpy as np
+from jax.config import config
+from jax.experimental import jaxpr_serialization
+
+from benchmarks import benchmark
+
+
+def _chain_jaxpr(num_eqns):
+  def f(x, y):
+    for _ in range(num_eqns // 2):
+      x = np.sin(x) * y
+    return x
+  return jax.make_jaxpr(f)(1., 2.)
+
+
+def eval_jaxpr_benchmark():
+  """Compares the dict-based interpreter with the prepared one.
+
+  The jaxpr is evaluated under `make_jaxpr`, so primitives are only evaluated
+  abstractly and the measurement is dominated by interpreter overhead rather
+  than by XLA dispatch.
+  """
+  def get_benchmark_fn(num_eqns, evaluator):
+    typed_jaxpr = _chain_jaxpr(num_eqns)
+    jaxpr, consts = typed_jaxpr.jaxpr, typed_jaxpr.literals
+    def f(x, y):
+      return evaluator(jaxpr, consts, x, y)[0]
+    make_trace = lambda: jax.make_jaxpr(f)(1., 2.)
+    def benchmark_fn():
+      for _ in range(10):
+        make_trace()
+    return benchmark_fn
+
+  params = []
+  for num_eqns in (10, 100, 1000):
+    for evaluator in (core.eval_jaxpr, core.eval_prepared_jaxpr):
+      params.append({"num_eqns": num_eqns, "evaluator": evaluator})
+  benchmark.benchmark_suite(get_benchmark_fn, params, "eval_jaxpr")
+
+
+def load_jaxpr_benchmark():
+  """Compares tracing a function with loading its serialized jaxpr."""
+  def get_benchmark_fn(num_eqns, load):
+    def f(x, y):
+      for _ in range(num_eqns // 2):
+        x = np.sin(x) * y
+      return x
+    if load:
+      data = jaxpr_serialization.dumps(jax.make_jaxpr(f)(1., 2.))
+      return lambda: jaxpr_serialization.loads(data)
+    else:
+      return lambda: jax.make_jaxpr(f)(1., 2.)
+
+  params = []
+  for num_eqns in (10, 100, 1000):
+    for load in (False, True):
+      params.append({"num_eqns": num_eqns, "load": load})
+  benchmark.benchmark_suite(get_benchmark_fn, params, "load_jaxpr")
+
+
+def run_all_benchmarks():
+  eval_jaxpr_benchmark()
+  load_jaxpr_benchmark()
+
+
+def main(unused_argv):
+  run_all_benchmarks()
+
+
+if __name__ == "__main__":
+  config.config_with_absl()
+  app.run(main)
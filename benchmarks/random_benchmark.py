@@ -0,0 +1,210 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmarks for jax.random.
+
+To make it run faster, set env var TARGET_TOTAL_SECS to a low number (e.g. 2).
+"""
+from absl import app
+from tabulate import tabulate
+
+import jax
+from jax import lax
+from jax import numpy as np
+from jax import random
+from jax.config import config
+
+from benchmarks import benchmark
+
+import numpy as onp
+
+
+def _iota_bits(key, count):
+  """The counter-array implementation `_random_bits` used to be based on."""
+  counts = lax.tie_in(key, lax.iota(onp.uint32, count))
+  return random.threefry_2x32(key, counts)
+
+def _random_bits(key, count):
+  return random._random_bits(key, 32, (count,))
+
+
+def random_bits_benchmark():
+  def get_benchmark_fn(count, impl):
+    f = jax.jit(lambda key: impl(key, count))
+    key = random.PRNGKey(0)
+    f(key).block_until_ready()
+    return lambda: f(key).block_until_ready()
+
+  params = []
+  for count in (2 ** 16, 2 ** 20 + 1, 2 ** 24):
+    for impl in (_iota_bits, _random_bits):
+      params.append({"count": count, "impl": impl})
+  benchmark.benchmark_suite(get_benchmark_fn, params, "random_bits")
+
+
+def random_bits_memory():
+  """Prints the estimated peak bytes allocated per generated random bit.
+
+  The estimates come from `jax.cost_analysis`, which does not trace any data,
+  so this also covers requests too large to generate on most hosts.
+  """
+  key = random.PRNGKey(0)
+  rows = []
+  for count in (2 ** 20, 2 ** 20 + 1, 2 ** 33):
+    for impl in (_iota_bits, _random_bits):
+      if impl is _iota_bits and count >= 2 ** 32:
+        continue  # the counters don't fit in uint32
+      cost = jax.cost_analysis(lambda key: impl(key, count))(key)
+      rows.append([count, impl.__name__, cost.peak_bytes / (32 * count)])
+  print("---------Peak bytes per random bit---------")
+  print(tabulate(rows, ["count", "impl", "bytes/bit"]))
+  print()
+
+
+def prng_impl_benchmark():
+  def get_benchmark_fn(impl, op):
+    key = random.PRNGKey(0, impl=impl)
+    if op == "uniform":
+      f = jax.jit(lambda key: random.uniform(key, (2 ** 20,)))
+    elif op == "split":
+      f = jax.jit(lambda key: random.split(key, 2 ** 16))
+    else:
+      f = jax.jit(lambda key: jax.vmap(random.fold_in, (None, 0))(
+          key, onp.arange(2 ** 16)))
+    f(key).block_until_ready()
+    return lambda: f(key).block_until_ready()
+
+  params = []
+  for impl in ("threefry2x32", "philox4x32", "unsafe_philox4x32"):
+    for op in ("uniform", "split", "fold_in"):
+      params.append({"impl": impl, "op": op})
+  benchmark.benchmark_suite(get_benchmark_fn, params, "prng_impl")
+
+
+def batch_sampling_benchmark():
+  """Compares the batch_* functions to mapping the per-key ones with vmap."""
+  samplers = {
+      "split": (random.batch_split, random.split),
+      "normal": (lambda keys, _: random.batch_normal(keys, (128,)),
+                 lambda key, _: random.normal(key, (128,))),
+      "categorical": (random.batch_categorical, random.categorical),
+      "permutation": (lambda keys, _: random.batch_permutation(keys, 128),
+                      lambda key, _: random.permutation(key, 128)),
+  }
+
+  def get_benchmark_fn(num_keys, sampler, mode):
+    keys = random.split(random.PRNGKey(0), num_keys)
+    batch_fn, fn = samplers[sampler]
+    if sampler == "split":
+      arg, in_axes = 2, (0, None)
+    else:
+      arg, in_axes = np.zeros((num_keys, 16)), (0, 0)
+    if mode == "batch":
+      f = jax.jit(lambda keys: batch_fn(keys, arg))
+    else:
+      f = jax.jit(lambda keys: jax.vmap(fn, in_axes)(keys, arg))
+    f(keys).block_until_ready()
+    return lambda: f(keys).block_until_ready()
+
+  params = []
+  for num_keys in (64, 4096):
+    for sampler in samplers:
+      for mode in ("vmap", "batch"):
+        params.append({"num_keys": num_keys, "sampler": sampler, "mode": mode})
+  benchmark.benchmark_suite(get_benchmark_fn, params, "batch_sampling")
+
+
+def permutation_benchmark():
+  def get_benchmark_fn(n, method):
+    if method == "sort":
+      f = jax.jit(lambda key: random._shuffle(key, np.arange(n), 0))
+    else:
+      f = jax.jit(lambda key: random._index_permutation(key, n))
+    key = random.PRNGKey(0)
+    f(key).block_until_ready()
+    return lambda: f(key).block_until_ready()
+
+  params = []
+  for n in (2 ** 16, 2 ** 20, 10 ** 7):
+    for method in ("sort", "permutation_index"):
+      params.append({"n": n, "method": method})
+  benchmark.benchmark_suite(get_benchmark_fn, params, "permutation")
+
+
+def sampler_benchmark():
+  samplers = {
+      "gamma": lambda key, x: random.gamma(key, x),
+      "beta": lambda key, x: random.beta(key, x, x),
+      "dirichlet": lambda key, x: random.dirichlet(key, x.reshape(-1, 10)),
+      "poisson": lambda key, x: random.poisson(key, x, x.shape),
+  }
+
+  def get_benchmark_fn(sampler, param, size):
+    f = jax.jit(samplers[sampler])
+    key = random.PRNGKey(0)
+    x = np.full((size,), param)
+    f(key, x).block_until_ready()
+    return lambda: f(key, x).block_until_ready()
+
+  params = []
+  for sampler in samplers:
+    for param in (0.5, 3., 30.):
+      for size in (10 ** 4, 10 ** 6):
+        params.append({"sampler": sampler, "param": param, "size": size})
+  benchmark.benchmark_suite(get_benchmark_fn, params, "samplers")
+
+
+def categorical_benchmark():
+  """Compares ways of drawing many samples from a large categorical."""
+  def get_benchmark_fn(vocab, num_samples, method):
+    logits = random.normal(random.PRNGKey(1), (vocab,))
+    if method == "categorical":
+      f = jax.jit(lambda key: random.categorical(key, logits,
+                                                 shape=(num_samples,)))
+    elif method == "without_replacement":
+      f = jax.jit(lambda key: random.categorical_without_replacement(
+          key, logits, num_samples))
+    else:
+      table = random.alias_table(jax.nn.softmax(logits))
+      f = jax.jit(lambda key: random.alias_categorical(key, table,
+                                                       (num_samples,)))
+    key = random.PRNGKey(0)
+    f(key).block_until_ready()
+    return lambda: f(key).block_until_ready()
+
+  params = []
+  for vocab in (1000, 50000):
+    for num_samples in (16, 1024):
+      for method in ("categorical", "without_replacement", "alias"):
+        params.append({"vocab": vocab, "num_samples": num_samples,
+                       "method": method})
+  benchmark.benchmark_suite(get_benchmark_fn, params, "categorical")
+
+
+def run_all_benchmarks():
+  random_bits_benchmark()
+  prng_impl_benchmark()
+  batch_sampling_benchmark()
+  permutation_benchmark()
+  sampler_benchmark()
+  categorical_benchmark()
+  random_bits_memory()
+
+
+def main(unused_argv):
+  run_all_benchmarks()
+
+
+if __name__ == "__main__":
+  config.config_with_absl()
+  app.run(main)
@@ -0,0 +1,143 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmarks for transfers between the host and devices.
+
+To make it run faster, set env var TARGET_TOTAL_SECS to a low number (e.g. 2).
+"""
+from absl import app
+
+import jax
+from jax.config import config
+from jax.experimental.transfer_pool import TransferPool
+from jax.interpreters import xla
+
+from benchmarks import benchmark
+
+import numpy as onp
+
+
+def _leafwise_device_put(xs):
+  return [xla.device_put_p.bind(x) for x in xs]
+
+def _leafwise_device_get(xs):
+  for x in xs:
+    x.copy_to_host_async()
+  return [x.copy() for x in xs]
+
+
+def _params(num_arrays, array_size):
+  r = onp.random.RandomState(0)
+  return [r.randn(array_size).astype(onp.float32) for _ in range(num_arrays)]
+
+
+def device_put_benchmark():
+  def get_benchmark_fn(num_arrays, array_size, method):
+    xs = _params(num_arrays, array_size)
+    put = jax.device_put if method == "batched" else _leafwise_device_put
+    put(xs)  # compiles the computation splitting the transferred buffer
+    def benchmark_fn():
+      for x in put(xs):
+        x.block_until_ready()
+    return benchmark_fn
+
+  params = []
+  for num_arrays, array_size in ((10, 10 ** 5), (1000, 100), (10000, 10)):
+    for method in ("leafwise", "batched"):
+      params.append({"num_arrays": num_arrays, "array_size": array_size,
+                     "method": method})
+  benchmark.benchmark_suite(get_benchmark_fn, params, "device_put")
+
+
+def device_get_benchmark():
+  def get_benchmark_fn(num_arrays, array_size, method):
+    xs = _params(num_arrays, array_size)
+    get = jax.device_get if method == "batched" else _leafwise_device_get
+    # Fresh DeviceArrays each time, since fetched values are cached on them.
+    make_xs = lambda: [xla.device_put_p.bind(x) for x in xs]
+    get(make_xs())  # compiles the computation packing the buffers
+    def benchmark_fn():
+      get(make_xs())
+    return benchmark_fn
+
+  params = []
+  for num_arrays, array_size in ((10, 10 ** 5), (1000, 100), (10000, 10)):
+    for method in ("leafwise", "batched"):
+      params.append({"num_arrays": num_arrays, "array_size": array_size,
+                     "method": method})
+  benchmark.benchmark_suite(get_benchmark_fn, params, "device_get")
+
+
+def cpu_zero_copy_benchmark():
+  """Round trips a large array through a CPU DeviceArray."""
+  def get_benchmark_fn(size, zero_copy):
+    x = onp.ones(size, onp.float32)
+    def benchmark_fn():
+      prev = config.FLAGS.jax_cpu_zero_copy
+      config.update("jax_cpu_zero_copy", zero_copy)
+      try:
+        onp.asarray(jax.device_put(x))
+      finally:
+        config.update("jax_cpu_zero_copy", prev)
+    return benchmark_fn
+
+  params = []
+  for size in (10 ** 4, 10 ** 7):
+    for zero_copy in (False, True):
+      params.append({"size": size, "zero_copy": zero_copy})
+  benchmark.benchmark_suite(get_benchmark_fn, params, "cpu_zero_copy")
+
+
+def transfer_pool_benchmark():
+  """Puts a stream of input batches of the same shapes on the CPU."""
+  def get_benchmark_fn(batch_size, method):
+    r = onp.random.RandomState(0)
+    # float64 images and int64 labels, as input pipelines often produce, which
+    # `device_put` converts.
+    batch = {"image": r.randn(batch_size, 32, 32, 3),
+             "label": r.randint(0, 10, size=batch_size)}
+    pool = TransferPool()
+    put = pool.put if method == "pool" else jax.device_put
+    def benchmark_fn():
+      prev = config.FLAGS.jax_cpu_zero_copy
+      config.update("jax_cpu_zero_copy", True)
+      try:
+        for _ in range(10):
+          for x in jax.tree_leaves(put(batch)):
+            x.block_until_ready()
+      finally:
+        config.update("jax_cpu_zero_copy", prev)
+    return benchmark_fn
+
+  params = []
+  for batch_size in (8, 256):
+    for method in ("device_put", "pool"):
+      params.append({"batch_size": batch_size, "method": method})
+  benchmark.benchmark_suite(get_benchmark_fn, params, "transfer_pool")
+
+
+def run_all_benchmarks():
+  device_put_benchmark()
+  device_get_benchmark()
+  if jax.devices()[0].platform == "cpu":
+    cpu_zero_copy_benchmark()
+    transfer_pool_benchmark()
+
+
+def main(unused_argv):
+  run_all_benchmarks()
+
+
+if __name__ == "__main__":
+  config.config_with_absl()
+  app.run(main)
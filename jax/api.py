@@ -25,11 +25,14 @@ arrays.
 
 
 import collections
+import concurrent.futures
 import functools
+import gc
 import inspect
 import itertools as it
 import threading
-from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Tuple, Union
+from typing import (Any, Callable, Dict, Iterable, List, NamedTuple, Optional,
+                    Sequence, Tuple, Union)
 from warnings import warn
 
 import numpy as onp
@@ -43,7 +46,7 @@ from .core import eval_jaxpr
 from .api_util import (wraps, flatten_fun, apply_flat_fun, flatten_fun_nokwargs,
                        flatten_fun_nokwargs2, argnums_partial)
 from .tree_util import (tree_map, tree_flatten, tree_unflatten, tree_structure,
-                        tree_transpose, tree_leaves, tree_multimap,
+                        tree_transpose, tree_multimap,
                         treedef_is_leaf, _replace_nones)
 from .util import (unzip2, curry, partial, safe_map, safe_zip, prod,
                    split_list, extend_name_stack, wrap_name)
@@ -59,6 +62,7 @@ from .interpreters import xla
 from .interpreters import pxla
 from .interpreters import ad
 from .interpreters import batching
+from .interpreters import cost
 from .interpreters import parallel
 from .interpreters import masking
 from .custom_derivatives import custom_jvp, custom_vjp
@@ -831,6 +835,43 @@ def _flatten_axes(treedef, axis_tree):
   return axes
 
 
+def vmap_report(fun: Callable, in_axes=0, out_axes=0
+                ) -> Callable[..., batching.BatchingReport]:
+  """Creates a function that reports how ``vmap(fun)`` gets batched.
+
+  Args:
+    fun: Function to be mapped, as for ``vmap``.
+    in_axes: See the ``vmap`` docstring.
+    out_axes: See the ``vmap`` docstring.
+
+  Returns:
+    A function that, when applied to example arguments, traces ``vmap(fun)``
+    abstractly (nothing is compiled or executed) and returns a
+    ``BatchingReport``. The report lists every primitive that was batched and,
+    for each, the fallback work its batching rule introduced: operands
+    broadcast along the batch dimension, batch dimensions moved with a
+    transpose, and selects between both branches of a batched predicate. Each
+    fallback carries an estimate of the extra FLOPs and bytes it costs.
+
+  For example:
+
+  >>> f = lambda p, x: lax.cond(p, x, np.sin, x, np.cos)
+  >>> report = vmap_report(f)(np.array([True, False]), np.ones((2, 3)))
+  >>> [r.primitive for r in report.fallbacks]
+  ['cond']
+  """
+  vmapped = vmap(fun, in_axes, out_axes)
+
+  @wraps(fun)
+  def report_maker(*args):
+    with batching.batching_diagnostics() as report:
+      make_jaxpr(vmapped)(*args)
+    return report
+
+  report_maker.__name__ = "vmap_report({})".format(report_maker.__name__)
+  return report_maker
+
+
 def pmap(fun: Callable, axis_name: Optional[AxisName] = None, *, in_axes=0,
          static_broadcasted_argnums: Union[int, Iterable[int]] = (),
          devices=None, backend: Optional[str] = None,
@@ -1549,6 +1590,41 @@ def make_jaxpr(fun: Callable,
   return jaxpr_maker
 
 
+def cost_analysis(fun: Callable,
+                  static_argnums: Union[int, Iterable[int]] = ()
+                  ) -> Callable[..., cost.Cost]:
+  """Creates a function that statically estimates the cost of ``fun``.
+
+  Args:
+    fun: The function whose cost is to be estimated. Its arguments and return
+      value follow the same rules as for ``make_jaxpr``.
+    static_argnums: See the ``jax.jit`` docstring.
+
+  Returns:
+    A wrapped version of ``fun`` that when applied to example arguments traces
+    it to a ``jaxpr`` (without compiling or executing it) and returns a
+    ``Cost`` with estimated ``flops``, ``bytes_read``, ``bytes_written`` and
+    ``peak_bytes`` (the peak total size of live arrays, inputs included).
+
+  Estimates come from cost rules registered per primitive and recurse into
+  ``jit``, ``pmap``, ``scan``, ``cond`` and ``while_loop`` bodies. Since trip
+  counts of ``while_loop`` aren't known statically, a single iteration is
+  counted. The estimate ignores fusion and buffer reuse by XLA, so byte counts
+  and peak memory are upper bounds.
+
+  >>> jax.cost_analysis(lambda x, y: np.dot(x, y))(np.ones((8, 4)), np.ones(4))
+  Cost(flops=64, bytes_read=144, bytes_written=32, peak_bytes=176)
+  """
+  jaxpr_maker = make_jaxpr(fun, static_argnums)
+
+  @wraps(fun)
+  def cost_fun(*args, **kwargs):
+    return cost.jaxpr_cost(jaxpr_maker(*args, **kwargs).jaxpr)
+
+  cost_fun.__name__ = "cost_analysis({})".format(cost_fun.__name__)
+  return cost_fun
+
+
 def device_put(x, device: Optional[xc.Device] = None):
   """Transfers ``x`` to ``device``.
 
@@ -1563,25 +1639,155 @@ def device_put(x, device: Optional[xc.Device] = None):
 
   For more details on data placement see the https://jax.readthedocs.io/en/latest/faq.html#controlling-data-and-computation-placement-on-devices.
 
+  Small numpy arrays of the same dtype are packed into a single buffer for the
+  transfer, so putting a pytree of many small arrays is not much slower than
+  putting one large array.
+
   Returns:
     A copy of ``x`` that resides on ``device``.
   """
-  return tree_map(lambda y: xla.device_put_p.bind(y, device=device), x)
+  leaves, treedef = tree_flatten(x)
+  return tree_unflatten(treedef, xla.device_put_many(leaves, device))
 
 
-# TODO(mattjj): consider revising
-def _device_get(x):
-  if isinstance(x, core.Tracer):
-    return x
-  return x.copy()
-
 def device_get(x):
-  for y in tree_leaves(x):
-    try:
-      y.copy_to_host_async()
-    except AttributeError:
-      pass
-  return tree_map(_device_get, x)
+  """Transfers the arrays in ``x`` to the host as numpy arrays.
+
+  Like ``device_put``, small arrays on the same device and of the same dtype
+  are fetched together in a single transfer.
+
+  Args:
+    ``x``: An array, scalar, or (nested) standard Python container thereof.
+
+  Returns:
+    ``x`` with each ``DeviceArray`` replaced by a numpy array holding its value.
+  """
+  leaves, treedef = tree_flatten(x)
+  return tree_unflatten(treedef, xla.device_get_many(leaves))
+
+
+def device_get_async(x) -> concurrent.futures.Future:
+  """Starts transferring the arrays in ``x`` to the host, without waiting.
+
+  Like ``device_get``, but returns as soon as the transfers are started, so that
+  more work can be dispatched and other requests handled while they complete.
+  In a coroutine, the result can be awaited with
+  ``await asyncio.wrap_future(jax.device_get_async(x))``.
+
+  Args:
+    ``x``: An array, scalar, or (nested) standard Python container thereof.
+
+  Returns:
+    A ``concurrent.futures.Future`` resolving to what ``device_get(x)``
+    returns.
+  """
+  leaves, treedef = tree_flatten(x)
+  finish = xla.start_device_get_many(leaves)
+  return xla.host_read_executor().submit(
+      lambda: tree_unflatten(treedef, finish()))
+
+
+class ArrayInfo(NamedTuple):
+  """A live array, as listed in the ``largest_arrays`` of ``MemoryStats``.
+
+  ``nbytes`` is the size of the device memory the array holds on the device,
+  which may be shared with other arrays (e.g. ``x`` and ``x.T``).
+  ``creation_site`` is the line of code that created the array, if the
+  ``jax_array_creation_sites`` flag was set then, and None otherwise.
+  """
+  shape: Tuple[int, ...]
+  dtype: onp.dtype
+  nbytes: int
+  creation_site: Optional[str]
+
+class MemoryStats(NamedTuple):
+  """Device memory held by live arrays on one device."""
+  device: Any
+  num_buffers: int
+  bytes_in_use: int
+  bytes_by_dtype: Dict[onp.dtype, int]
+  largest_arrays: List[ArrayInfo]
+
+
+def live_arrays(device: Optional[xc.Device] = None) -> List[xla.DeviceArray]:
+  """Returns the live arrays that hold device memory.
+
+  Args:
+    device: optional ``Device``. If given, only arrays with a buffer on it are
+      returned.
+
+  Returns:
+    A list of the ``DeviceArray``s and ``ShardedDeviceArray``s that hold device
+    buffers, i.e. that aren't deleted and aren't lazy constants like the result
+    of ``np.zeros``.
+
+  The arrays are found by scanning the objects tracked by Python's garbage
+  collector, so this takes time proportional to the size of the Python heap. It
+  is meant for diagnosing memory use, and adds no cost to creating arrays.
+  """
+  return [x for x, _ in _live_array_buffers(device)]
+
+def memory_stats(device: Optional[xc.Device] = None,
+                 num_largest: int = 10) -> MemoryStats:
+  """Summarizes the device memory held by live arrays on ``device``.
+
+  Args:
+    device: optional ``Device``, by default the default device.
+    num_largest: how many of the largest arrays to list (default 10).
+
+  Returns:
+    A ``MemoryStats`` with the number of distinct device buffers held by live
+    arrays, their total size ``bytes_in_use`` and its breakdown by dtype, and
+    an ``ArrayInfo`` for each of the ``num_largest`` largest arrays, largest
+    first.
+
+  Set the ``jax_array_creation_sites`` flag (or the ``JAX_ARRAY_CREATION_SITES``
+  environment variable) to also report the line of code that created each
+  array, e.g. to find the source of a leak. Recording it costs a walk up the
+  Python stack per array created.
+
+  Like ``live_arrays``, this scans the Python heap. Memory held by XLA itself,
+  e.g. for executables or by its allocator, isn't counted.
+  """
+  if device is None:
+    device = xb.get_backend().get_default_device_assignment(1)[0]
+  buffers = {}
+  bytes_by_dtype: Dict[onp.dtype, int] = collections.defaultdict(int)
+  arrays = []
+  for x, held in _live_array_buffers(device):
+    arrays.append(ArrayInfo(x.shape, x.dtype, sum(n for _, n, _ in held),
+                            xla.creation_site(x)))
+    for buf, nbytes, dtype in held:
+      if id(buf) not in buffers:
+        buffers[id(buf)] = buf
+        bytes_by_dtype[dtype] += nbytes
+  arrays.sort(key=lambda info: info.nbytes, reverse=True)
+  return MemoryStats(device, len(buffers), sum(bytes_by_dtype.values()),
+                     dict(bytes_by_dtype), arrays[:num_largest])
+
+def _live_array_buffers(device):
+  # Yields each live array with a list of (buffer, nbytes, dtype) for the
+  # device buffers it holds on `device`, or on any device if `device` is None.
+  for x in gc.get_objects():
+    if not issubclass(type(x), xla.DeviceArray):
+      continue
+    if isinstance(x, pxla.ShardedDeviceArray):
+      if x.device_buffers is None:
+        continue
+      held = [(buf, prod(buf.shape().dimensions()) * x.dtype.itemsize, x.dtype)
+              for buf in x.device_buffers if not buf.is_deleted()]
+    else:
+      # Lazy aliases of a deleted array still hold its (deleted) buffer.
+      if (x.device_buffer is xla.deleted_buffer or xla.is_device_constant(x) or
+          type(x.device_buffer) is xla.SpilledBuffer or
+          x.device_buffer.is_deleted()):
+        continue
+      base = xla._lazy_base_aval(x.aval, x._lazy_expr)
+      dtype = onp.dtype(base.dtype)
+      held = [(x.device_buffer, prod(base.shape) * dtype.itemsize, dtype)]
+    held = [h for h in held if device is None or h[0].device() == device]
+    if held:
+      yield x, held
 
 
 def _check_args(args):
@@ -1740,7 +1946,7 @@ def custom_transforms(fun):
 
   def fun_impl(*args, **params):
     consts, args = split_list(args, [params['num_consts']])
-    return core.eval_jaxpr(params['jaxpr'], consts, *args)
+    return core.eval_prepared_jaxpr(params['jaxpr'], consts, *args)
   fun_p.def_impl(fun_impl)
 
   def fun_jvp(primals, tangents, **params):
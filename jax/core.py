@@ -19,7 +19,7 @@ from contextlib import contextmanager
 from collections import namedtuple
 from functools import total_ordering
 import itertools as it
-from weakref import ref
+from weakref import ref, WeakKeyDictionary
 import threading
 from typing import Dict, Generator, Iterator, Sequence, Type
 import types
@@ -119,7 +119,7 @@ class TypedJaxpr(object):
 
 @curry
 def jaxpr_as_fun(typed_jaxpr: TypedJaxpr, *args):
-  return eval_jaxpr(typed_jaxpr.jaxpr, typed_jaxpr.literals, *args)
+  return eval_prepared_jaxpr(typed_jaxpr.jaxpr, typed_jaxpr.literals, *args)
 
 
 
@@ -286,6 +286,96 @@ def eval_jaxpr(jaxpr, consts, *args):
   return map(read, jaxpr.outvars)
 
 
+class PreparedJaxpr(object):
+  """A jaxpr compiled to a flat instruction list for repeated evaluation.
+
+  `eval_jaxpr` resolves variables through a dict, re-extracts call jaxprs and
+  re-wraps subfunctions for every equation on every call. A `PreparedJaxpr`
+  does that work once: each variable is assigned an integer slot in a flat
+  environment list, literals are written into a template environment, and
+  each equation becomes a tuple of a pre-resolved `bind`, pre-wrapped
+  subfunctions, input and output slot indices and params. Evaluation then
+  only copies the template and runs the instruction list.
+
+  Primitives are still applied via `bind`, so a `PreparedJaxpr` can be
+  evaluated under any transformation, just like `eval_jaxpr`.
+  """
+  __slots__ = ["source", "template", "const_slots", "in_slots", "out_slots",
+               "instructions", "__weakref__"]
+
+  def __init__(self, jaxpr: Jaxpr):
+    slots: Dict[Any, int] = {unitvar: 0}
+    template: List[Any] = [unit]
+
+    def slot(v):
+      if type(v) is Literal:
+        template.append(v.val)
+        return len(template) - 1
+      i = slots.get(v)
+      if i is None:
+        i = slots[v] = len(template)
+        template.append(None)
+      return i
+
+    self.source = (jaxpr.constvars, jaxpr.invars, jaxpr.outvars, jaxpr.eqns)
+    self.const_slots = tuple(map(slot, jaxpr.constvars))
+    self.in_slots = tuple(map(slot, jaxpr.invars))
+    instructions = []
+    for eqn in jaxpr.eqns:
+      in_slots = tuple(map(slot, eqn.invars))
+      call_jaxpr, params = extract_call_jaxpr(eqn.primitive, eqn.params)
+      if call_jaxpr:
+        # The wrapped function is built once and reused across evaluations, so
+        # that caches keyed on it (e.g. `xla_call`'s) hit on repeated calls.
+        subfuns = (lu.wrap_init(partial(prepare_jaxpr(call_jaxpr), ())),)
+      else:
+        subfuns = ()
+      out_slots = tuple(map(slot, eqn.outvars))
+      instructions.append((eqn.primitive.bind, subfuns, in_slots, params,
+                           eqn.primitive.multiple_results, out_slots))
+    self.instructions = tuple(instructions)
+    self.out_slots = tuple(map(slot, jaxpr.outvars))
+    self.template = tuple(template)
+
+  def is_valid_for(self, jaxpr: Jaxpr) -> bool:
+    constvars, invars, outvars, eqns = self.source
+    return (constvars is jaxpr.constvars and invars is jaxpr.invars and
+            outvars is jaxpr.outvars and eqns is jaxpr.eqns)
+
+  def __call__(self, consts, *args):
+    env = list(self.template)
+    for i, val in zip(self.const_slots, consts):
+      env[i] = val
+    for i, val in zip(self.in_slots, args):
+      env[i] = val
+    for bind, subfuns, in_slots, params, multiple_results, out_slots \
+        in self.instructions:
+      ans = bind(*subfuns, *[env[i] for i in in_slots], **params)
+      if multiple_results:
+        for i, val in zip(out_slots, ans):
+          env[i] = val
+      else:
+        env[out_slots[0]] = ans
+    return [env[i] for i in self.out_slots]
+
+_prepared_jaxprs: 'WeakKeyDictionary[Jaxpr, PreparedJaxpr]' = WeakKeyDictionary()
+
+def prepare_jaxpr(jaxpr: Jaxpr) -> PreparedJaxpr:
+  """Returns a (cached) `PreparedJaxpr` for evaluating `jaxpr` repeatedly.
+
+  The cache is keyed on the jaxpr object and invalidated if any of its variable
+  or equation lists have been replaced since it was prepared.
+  """
+  prepared = _prepared_jaxprs.get(jaxpr)
+  if prepared is None or not prepared.is_valid_for(jaxpr):
+    prepared = _prepared_jaxprs[jaxpr] = PreparedJaxpr(jaxpr)
+  return prepared
+
+def eval_prepared_jaxpr(jaxpr: Jaxpr, consts, *args):
+  """Like `eval_jaxpr`, but evaluates via a cached `PreparedJaxpr`."""
+  return prepare_jaxpr(jaxpr)(consts, *args)
+
+
 # -------------------- tracing --------------------
 
 
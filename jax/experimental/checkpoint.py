@@ -0,0 +1,262 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Saving and restoring pytrees of arrays.
+
+`save` writes a pytree of arrays, such as the parameters of a model, to a
+directory holding a JSON index and a single contiguous binary blob with the
+bytes of every leaf. `restore` memory-maps the blob and transfers each leaf to
+the device straight from the mapping, so only the leaves being restored are
+read from disk, and never all at once::
+
+  >>> checkpoint.save("/tmp/ckpt", params)
+  >>> params = checkpoint.restore("/tmp/ckpt")
+  >>> layer = checkpoint.restore("/tmp/ckpt", subtree=("layers", 0))
+
+Dicts, lists, tuples and None are recorded in the index, so `restore` can
+rebuild them by itself; pytrees with other containers are restored by passing
+a `target` pytree with the same structure. The shards of a
+`ShardedDeviceArray` are written one at a time from the devices holding them,
+without gathering the whole array on one device, and are reassembled on
+restore.
+"""
+
+import json
+import os
+from typing import Any, Sequence
+
+import numpy as onp
+
+from jax import api
+from jax import dtypes
+from jax.interpreters import pxla
+from jax.tree_util import (tree_flatten, tree_unflatten, tree_structure,
+                           treedef_is_leaf)
+
+_FORMAT_VERSION = 1
+_INDEX_FILE = "index.json"
+_DATA_FILE = "data.bin"
+# Each array starts at a multiple of this many bytes in the blob, so that its
+# memory map is aligned.
+_ALIGNMENT = 64
+
+
+def save(path: str, tree, overwrite: bool = False):
+  """Writes the pytree of arrays `tree` to the directory `path`.
+
+  Args:
+    path: the directory to write, which is created if needed.
+    tree: a pytree whose leaves are arrays or scalars.
+    overwrite: whether to replace a checkpoint already in `path` (default
+      False).
+  """
+  index_path = os.path.join(path, _INDEX_FILE)
+  if os.path.exists(index_path) and not overwrite:
+    raise ValueError("A checkpoint already exists at {}; pass overwrite=True "
+                     "to replace it.".format(path))
+  os.makedirs(path, exist_ok=True)
+  leaves, _ = tree_flatten(tree)
+  structure = _encode_structure(tree, iter(range(len(leaves))))
+
+  # Both files are written under temporary names and then renamed over any old
+  # ones, the index last. An interrupted save leaves an existing checkpoint
+  # intact, and arrays restored from it with as_numpy=True keep mapping the old
+  # blob rather than see it rewritten.
+  data_path = os.path.join(path, _DATA_FILE)
+  entries = []
+  with open(data_path + ".tmp", "wb") as f:
+    for leaf in leaves:
+      if isinstance(leaf, pxla.ShardedDeviceArray) and leaf._npy_value is None:
+        entries.append(_write_sharded(f, leaf))
+      else:
+        entries.append(_write_array(f, onp.asarray(leaf)))
+
+  index = {"version": _FORMAT_VERSION, "structure": structure,
+           "leaves": entries}
+  with open(index_path + ".tmp", "w") as f:
+    json.dump(index, f)
+  os.replace(data_path + ".tmp", data_path)
+  os.replace(index_path + ".tmp", index_path)
+
+def _write_array(f, x):
+  offset = f.tell()
+  f.write(onp.ascontiguousarray(x).tobytes())
+  f.write(b"\0" * (-f.tell() % _ALIGNMENT))
+  return {"dtype": x.dtype.name, "shape": list(x.shape), "offset": offset}
+
+def _write_sharded(f, x):
+  shards, seen = [], set()
+  for buf, index in zip(x.device_buffers, x.indices):
+    index = _encode_index(index)
+    key = json.dumps(index)
+    if key in seen:
+      continue  # a replica of a shard we already wrote
+    seen.add(key)
+    shard = _write_array(f, buf.to_py())
+    shard["index"] = index
+    shards.append(shard)
+  return {"dtype": x.dtype.name, "shape": list(x.shape), "shards": shards}
+
+
+def restore(path: str, target=None, subtree: Sequence[Any] = (),
+            device=None, as_numpy: bool = False):
+  """Restores a pytree saved by `save` in the directory `path`.
+
+  Args:
+    path: the directory of the checkpoint.
+    target: optional pytree with the structure of the restored pytree (or of
+      its `subtree`), whose leaves are ignored. Required if the saved pytree
+      has containers other than dicts, lists, tuples and None.
+    subtree: optional sequence of dict keys and sequence indices locating the
+      part of the saved pytree to restore, e.g. ``("layers", 0)``. Only the
+      leaves of that subtree are read.
+    device: optional device to put the restored arrays on.
+    as_numpy: if True, return read-only numpy arrays backed by the memory map
+      of the checkpoint, which are read from disk when accessed, instead of
+      putting them on a device.
+
+  Returns:
+    The restored pytree, with `DeviceArray` leaves (or numpy ones if
+    `as_numpy` is True).
+  """
+  with open(os.path.join(path, _INDEX_FILE)) as f:
+    index = json.load(f)
+  if index["version"] > _FORMAT_VERSION:
+    raise ValueError("Checkpoint at {} has format version {}, but this version "
+                     "of JAX only reads versions up to {}.".format(
+                         path, index["version"], _FORMAT_VERSION))
+  structure = index["structure"]
+  for key in subtree:
+    structure = _substructure(structure, key, subtree)
+
+  leaf_ids = []
+  _structure_leaves(structure, leaf_ids)
+  data_path = os.path.join(path, _DATA_FILE)
+  if os.path.getsize(data_path):
+    blob = onp.memmap(data_path, mode="r")
+  else:
+    blob = onp.zeros(0, onp.uint8)  # empty files can't be memory-mapped
+  leaves = [_read_leaf(blob, index["leaves"][i]) for i in leaf_ids]
+  if not as_numpy:
+    # `device_put` reads the pages of the memory map as it transfers them.
+    leaves = api.device_put(leaves, device)
+
+  if target is not None:
+    treedef = tree_structure(target)
+    if treedef.num_leaves != len(leaves):
+      raise ValueError("restore got a target with {} leaves, but the "
+                       "checkpoint has {}.".format(treedef.num_leaves,
+                                                   len(leaves)))
+    return tree_unflatten(treedef, leaves)
+  return _decode_structure(structure, dict(zip(leaf_ids, leaves)))
+
+def _read_leaf(blob, entry):
+  dtype = _dtype(entry["dtype"])
+  shape = tuple(entry["shape"])
+  if "shards" not in entry:
+    return _view(blob, dtype, shape, entry["offset"])
+  out = onp.empty(shape, dtype)
+  for shard in entry["shards"]:
+    index = _decode_index(shard["index"])
+    out[index] = _view(blob, dtype, out[index].shape, shard["offset"])
+  out.flags.writeable = False
+  return out
+
+def _view(blob, dtype, shape, offset):
+  size = int(onp.prod(shape, dtype=onp.int64)) * dtype.itemsize
+  # `onp.asarray` drops the memmap subclass, but not the mapping itself.
+  return onp.asarray(blob[offset:offset + size]).view(dtype).reshape(shape)
+
+def _dtype(name):
+  return onp.dtype(dtypes.bfloat16) if name == "bfloat16" else onp.dtype(name)
+
+
+# The structure of a pytree is encoded in JSON, with leaves replaced by their
+# positions in the flattened pytree, as:
+#   {"dict": [[key, structure], ...]}, {"list": [structure, ...]},
+#   {"tuple": [structure, ...]}, null, {"leaf": i}
+# or, for other containers, {"node": [i, ...]} listing the node's leaves.
+
+def _encode_structure(tree, leaf_ids):
+  if tree is None:
+    return None
+  elif type(tree) is dict and all(type(k) in (str, int) for k in tree):
+    return {"dict": [[k, _encode_structure(tree[k], leaf_ids)]
+                     for k in sorted(tree)]}
+  elif type(tree) in (list, tuple):
+    return {type(tree).__name__: [_encode_structure(x, leaf_ids)
+                                  for x in tree]}
+  elif treedef_is_leaf(tree_structure(tree)):
+    return {"leaf": next(leaf_ids)}
+  else:
+    num_leaves = tree_structure(tree).num_leaves
+    return {"node": [next(leaf_ids) for _ in range(num_leaves)]}
+
+def _decode_structure(structure, leaves):
+  if structure is None:
+    return None
+  (kind, value), = structure.items()
+  if kind == "dict":
+    return {k: _decode_structure(v, leaves) for k, v in value}
+  elif kind == "list":
+    return [_decode_structure(x, leaves) for x in value]
+  elif kind == "tuple":
+    return tuple(_decode_structure(x, leaves) for x in value)
+  elif kind == "leaf":
+    return leaves[value]
+  else:
+    raise ValueError("The checkpoint holds a container restore can't rebuild "
+                     "by itself; pass a `target` with the structure of the "
+                     "restored pytree.")
+
+def _structure_leaves(structure, out):
+  if structure is None:
+    return
+  (kind, value), = structure.items()
+  if kind == "dict":
+    for _, v in value:
+      _structure_leaves(v, out)
+  elif kind in ("list", "tuple"):
+    for x in value:
+      _structure_leaves(x, out)
+  elif kind == "leaf":
+    out.append(value)
+  else:
+    out.extend(value)
+
+def _substructure(structure, key, subtree):
+  kind = None if structure is None else next(iter(structure))
+  if kind == "dict":
+    for k, v in structure["dict"]:
+      if k == key:
+        return v
+  elif kind in ("list", "tuple"):
+    children = structure[kind]
+    if type(key) is int and -len(children) <= key < len(children):
+      return children[key]
+  raise KeyError("restore got subtree {}, but the checkpoint has no entry {!r} "
+                 "there.".format(tuple(subtree), key))
+
+
+# Shard indices are tuples of ints and slices, encoded as ints and
+# [start, stop, step] lists.
+
+def _encode_index(index):
+  if not isinstance(index, tuple):
+    index = (index,)
+  return [[i.start, i.stop, i.step] if isinstance(i, slice) else int(i)
+          for i in index]
+
+def _decode_index(index):
+  return tuple(slice(*i) if isinstance(i, list) else i for i in index)
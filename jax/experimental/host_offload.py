@@ -0,0 +1,227 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Spilling cold DeviceArrays to host memory when device memory runs short.
+
+Once `enable` is called, JAX tracks when each `DeviceArray` created afterwards
+was last used by a computation. When an allocation on a device fails for lack
+of memory, the least recently used arrays on that device are spilled: their
+values are copied to host memory and their device buffers are released, and
+the allocation is retried. A spilled array is put back on its device the next
+time a computation uses it, and reading its value on the host needs no
+transfer at all. This lets workloads that hold more arrays than fit on the
+device, like large caches of embeddings, run more slowly rather than fail::
+
+  >>> from jax.experimental import host_offload
+  >>> host_offload.enable(watermark_bytes=8 << 30)
+
+With a `watermark_bytes`, arrays are also spilled whenever the tracked arrays
+on a device would hold more than that many bytes, before allocations fail.
+
+Only arrays whose value is their whole buffer are tracked, and arrays sharing a
+buffer, like the result of `device_put` of an array already on its device, are
+spilled and reloaded together. Lazy views like ``x.T`` or ``np.zeros(...)``
+aren't tracked, and neither are `ShardedDeviceArray`s. A buffer shared by a
+spilled array and a lazy view of it stays on the device as long as the view is
+alive.
+"""
+
+import collections
+from typing import Callable, Optional
+import weakref
+
+from jax.interpreters import xla
+from jax.lib import xla_bridge as xb
+from jax.util import prod
+
+
+def enable(watermark_bytes: Optional[int] = None):
+  """Starts tracking DeviceArrays and spilling them to the host as needed.
+
+  Args:
+    watermark_bytes: optional number of bytes the tracked arrays on each device
+      may hold before the least recently used ones are spilled. By default,
+      arrays are only spilled when an allocation fails.
+  """
+  if xla.memory_manager is None:
+    xla.memory_manager = _MemoryManager(watermark_bytes)
+  else:
+    xla.memory_manager.watermark_bytes = watermark_bytes
+
+def disable():
+  """Stops tracking and spilling arrays.
+
+  Arrays that are spilled stay on the host until they're next used.
+  """
+  xla.memory_manager = None
+
+def add_pressure_callback(callback: Callable):
+  """Registers `callback(device)` to be called when `device` runs out of memory.
+
+  Callbacks run before arrays are spilled, e.g. to let an application drop
+  caches it can recompute. `enable` must have been called.
+  """
+  if xla.memory_manager is None:
+    raise RuntimeError("host_offload.add_pressure_callback requires "
+                       "host_offload.enable() to have been called.")
+  xla.memory_manager.pressure_callbacks.append(callback)
+
+def spill(x: xla.DeviceArray):
+  """Spills `x` to host memory until it's next used by a computation."""
+  if type(x) is not xla.DeviceArray:
+    raise TypeError("host_offload.spill expects a DeviceArray, got {}."
+                    .format(type(x)))
+  if xla.memory_manager is not None:
+    xla.memory_manager.spill(x)
+  else:
+    xla.spill_to_host(x)
+
+def is_spilled(x: xla.DeviceArray) -> bool:
+  """Whether the value of `x` is currently held in host memory only."""
+  return type(x.device_buffer) is xla.SpilledBuffer
+
+
+class _Buffer(object):
+  """The tracked arrays sharing a device buffer."""
+  __slots__ = ["key", "refs", "device", "nbytes", "spilled"]
+
+  def __init__(self, key, device, nbytes):
+    self.key = key  # the id of the buffer the arrays hold
+    self.refs = []  # weak references to the arrays
+    self.device = device
+    self.nbytes = nbytes
+    self.spilled = False
+
+  def arrays(self):
+    return [x for x in (ref() for ref in self.refs) if x is not None]
+
+
+class _MemoryManager(object):
+
+  def __init__(self, watermark_bytes):
+    self.watermark_bytes = watermark_bytes
+    self.pressure_callbacks = []
+    # Maps the ids of tracked device buffers (or of the SpilledBuffers standing
+    # in for them) to _Buffers, least recently used first.
+    self.buffers = collections.OrderedDict()
+    self.resident_bytes = collections.defaultdict(int)
+    # _Buffers some of whose arrays died. Weak reference callbacks only append
+    # to it, since they can run in the middle of an update of `buffers`.
+    self.dead = []
+
+  def track(self, x):
+    self._collect()
+    key = id(x.device_buffer)
+    buf = self.buffers.get(key)
+    if buf is not None and not any(y.device_buffer is x.device_buffer
+                                   for y in buf.arrays()):
+      self._untrack(buf)  # the id belonged to a buffer that's gone
+      buf = None
+    if buf is None:
+      buf = _Buffer(key, x.device_buffer.device(),
+                    prod(x.shape) * x.dtype.itemsize)
+      buf.spilled = type(x.device_buffer) is xla.SpilledBuffer
+      self.buffers[key] = buf
+      if not buf.spilled:
+        self.resident_bytes[buf.device] += buf.nbytes
+    else:
+      self.buffers.move_to_end(key)
+    buf.refs.append(weakref.ref(x, lambda _: self.dead.append(buf)))
+    if not buf.spilled:
+      self._enforce_watermark(buf.device)
+
+  def _collect(self):
+    while self.dead:
+      buf = self.dead.pop()
+      buf.refs = [ref for ref in buf.refs if ref() is not None]
+      if not buf.refs:
+        self._untrack(buf)
+
+  def _untrack(self, buf):
+    if self.buffers.get(buf.key) is buf:
+      del self.buffers[buf.key]
+      if not buf.spilled:
+        self.resident_bytes[buf.device] -= buf.nbytes
+
+  def _rekey(self, buf, device_buffer):
+    del self.buffers[buf.key]
+    buf.key = id(device_buffer)
+    self.buffers[buf.key] = buf
+
+  def touch(self, x):
+    self._collect()
+    key = id(x.device_buffer)
+    if key in self.buffers:
+      self.buffers.move_to_end(key)
+
+  def reloaded(self, x, spilled):
+    """Called when `x`'s buffer was reloaded from the SpilledBuffer `spilled`."""
+    self._collect()
+    buf = self.buffers.get(id(spilled))
+    if buf is not None and buf.spilled:
+      for y in buf.arrays():
+        y.device_buffer = x.device_buffer
+      self._rekey(buf, x.device_buffer)
+      buf.spilled = False
+      self.resident_bytes[buf.device] += buf.nbytes
+      self._enforce_watermark(buf.device)
+
+  def spill(self, x):
+    self._collect()
+    buf = self.buffers.get(id(x.device_buffer))
+    xla.spill_to_host(x)
+    if buf is not None and not buf.spilled:
+      # The buffer is only freed once none of the arrays holds it.
+      for y in buf.arrays():
+        y.device_buffer = x.device_buffer
+      self._rekey(buf, x.device_buffer)
+      buf.spilled = True
+      self.resident_bytes[buf.device] -= buf.nbytes
+
+  def relieve_pressure(self, device) -> bool:
+    """Spills the least recently used half of the arrays on `device`.
+
+    Returns whether anything was spilled.
+    """
+    if device is None:
+      device = xb.get_backend().get_default_device_assignment(1)[0]
+    for callback in self.pressure_callbacks:
+      callback(device)
+    self._collect()
+    return self._spill_until(device, self.resident_bytes[device] // 2) > 0
+
+  def _enforce_watermark(self, device):
+    if (self.watermark_bytes is not None and
+        self.resident_bytes[device] > self.watermark_bytes):
+      # Keeps the most recently used array, which is about to be used.
+      self._spill_until(device, self.watermark_bytes, keep_last=True)
+
+  def _spill_until(self, device, target_bytes, keep_last=False):
+    bufs = list(self.buffers.values())
+    if keep_last:
+      bufs = bufs[:-1]
+    count = 0
+    for buf in bufs:
+      if self.resident_bytes[device] <= target_bytes:
+        break
+      if buf.device != device or buf.spilled:
+        continue
+      arrays = buf.arrays()
+      if not arrays or any(x.device_buffer is xla.deleted_buffer
+                           for x in arrays):
+        self._untrack(buf)
+      else:
+        self.spill(arrays[0])
+        count += 1
+    return count
@@ -0,0 +1,469 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Saving and loading jaxprs.
+
+`dumps` turns a `Jaxpr` or `TypedJaxpr`, such as the output of
+`jax.make_jaxpr`, into bytes that `loads` turns back into an equivalent jaxpr,
+possibly in another process. Loading does not run any of the Python code that
+produced the jaxpr, and `jit_jaxpr` compiles and runs a loaded `TypedJaxpr`
+without tracing it again::
+
+  >>> typed_jaxpr = jax.make_jaxpr(f)(x)
+  >>> data = jaxpr_serialization.dumps(typed_jaxpr)
+  >>> # ... later, maybe on another host:
+  >>> f_loaded = jaxpr_serialization.jit_jaxpr(jaxpr_serialization.loads(data))
+  >>> f_loaded(x)  # a list of the flat outputs of f
+
+The format is a small binary preamble, a versioned JSON header describing the
+jaxprs, and the raw bytes of any array constants. Subjaxprs in equation params
+(control flow bodies, call primitives, custom derivative rules) are stored once
+even if they are shared. Primitives are identified by name, so any primitive
+that appears in a jaxpr must be registered in one of JAX's rule tables (or via
+`register_primitive`) by the time it is loaded. Params must be built from
+Python scalars, strings, tuples, lists, dicts, NumPy dtypes and arrays, jaxprs,
+devices and types registered with `register_param_type`; other params, such as
+the Python callbacks of `custom_vjp`, can't be serialized.
+"""
+
+import json
+import struct
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+import numpy as onp
+
+from jax import core
+from jax import dtypes
+from jax import lax
+from jax import linear_util as lu
+from jax.abstract_arrays import ShapedArray, abstract_token, raise_to_shaped
+from jax.custom_derivatives import custom_jvp_call_jaxpr_p
+from jax.interpreters import ad
+from jax.interpreters import batching
+from jax.interpreters import xla
+from jax.lax import lax_control_flow
+from jax.lib import xla_bridge as xb
+from jax.lib import xla_client
+from jax.version import __version__
+
+
+_MAGIC = b"JAXPR\0"
+_FORMAT_VERSION = 1
+_ALIGNMENT = 64
+
+
+### Public
+
+def dumps(jaxpr) -> bytes:
+  """Serializes a `Jaxpr` or `TypedJaxpr` to bytes."""
+  if type(jaxpr) not in (core.Jaxpr, core.TypedJaxpr):
+    raise TypeError("Expected a Jaxpr or TypedJaxpr, got {}.".format(type(jaxpr)))
+  writer = _Writer()
+  root = writer.value(jaxpr)
+  header = {"format": "jaxpr", "version": _FORMAT_VERSION,
+            "jax_version": __version__, "root": root,
+            "jaxprs": writer.jaxprs, "typed_jaxprs": writer.typed_jaxprs}
+  header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+  # Pad the header with whitespace so that array data starts aligned.
+  preamble_size = len(_MAGIC) + 8
+  header_bytes += b" " * (-(preamble_size + len(header_bytes)) % _ALIGNMENT)
+  return b"".join([_MAGIC, struct.pack("<Q", len(header_bytes)), header_bytes,
+                   *writer.buffers])
+
+def loads(data: bytes):
+  """Deserializes a `Jaxpr` or `TypedJaxpr` serialized by `dumps`."""
+  data = memoryview(data)
+  if bytes(data[:len(_MAGIC)]) != _MAGIC:
+    raise ValueError("Not a serialized jaxpr.")
+  header_size, = struct.unpack("<Q", data[len(_MAGIC):len(_MAGIC) + 8])
+  start = len(_MAGIC) + 8
+  header = json.loads(bytes(data[start:start + header_size]).decode("utf-8"))
+  if header.get("format") != "jaxpr":
+    raise ValueError("Not a serialized jaxpr.")
+  if header["version"] > _FORMAT_VERSION:
+    raise ValueError(
+        "Serialized jaxpr has format version {}, but this version of JAX ({}) "
+        "can only read versions up to {}."
+        .format(header["version"], __version__, _FORMAT_VERSION))
+  reader = _Reader(header, data[start + header_size:])
+  return reader.value(header["root"])
+
+def dump(jaxpr, file) -> None:
+  """Serializes a `Jaxpr` or `TypedJaxpr` to a binary file object."""
+  file.write(dumps(jaxpr))
+
+def load(file):
+  """Deserializes a `Jaxpr` or `TypedJaxpr` from a binary file object."""
+  return loads(file.read())
+
+
+def jit_jaxpr(typed_jaxpr: core.TypedJaxpr, *, device=None, backend=None,
+              name: str = "jaxpr") -> Callable:
+  """Returns a jitted function that evaluates `typed_jaxpr`.
+
+  The returned function takes the flat inputs of the jaxpr and returns a list
+  of its flat outputs. When called on concrete arguments it compiles the jaxpr
+  directly, without tracing any Python code. It can also be transformed or
+  called from inside other jitted functions, in which case the jaxpr is traced
+  like any other function.
+  """
+  fun = lu.wrap_init(core.jaxpr_as_fun(typed_jaxpr))
+
+  def f_jitted(*args):
+    if core.find_top_trace(args) is None:
+      compiled_fun = xla.jaxpr_callable(typed_jaxpr, device, backend, name,
+                                        *map(xla.arg_spec, args))
+      return compiled_fun(*args)
+    return xla.xla_call(fun, *args, device=device, backend=backend, name=name)
+
+  f_jitted.__name__ = name
+  return f_jitted
+
+
+def register_primitive(prim: core.Primitive) -> None:
+  """Makes `prim` loadable even if it has no rules in JAX's rule tables."""
+  _registered_primitives.add(prim)
+
+def register_param_type(cls: type, name: str) -> None:
+  """Allows params of type `cls` to be serialized.
+
+  `cls` must either be a namedtuple, whose fields are serialized in turn, or an
+  enum-like type whose members are serialized by their `name` attribute.
+  `name` identifies the type in serialized jaxprs.
+  """
+  _param_types[name] = cls
+  _param_type_names[cls] = name
+
+# Per-primitive hooks to turn params that are not serializable as they are
+# into ones that are, and back. Maps a primitive to a pair of functions from
+# params dicts to params dicts.
+param_rules: Dict[core.Primitive, Tuple[Callable, Callable]] = {}
+
+
+### Writing
+
+class _Writer(object):
+  def __init__(self):
+    self.jaxprs: List[Any] = []
+    self.typed_jaxprs: List[Any] = []
+    self.buffers: List[bytes] = []
+    self.nbytes = 0
+    self._indices: Dict[int, int] = {}
+    self._keepalive: List[Any] = []  # so that ids in self._indices stay unique
+
+  def value(self, x):
+    if x is None or type(x) in (bool, int, float, str):
+      return x
+    elif type(x) is complex:
+      return {"complex": [x.real, x.imag]}
+    elif type(x) is tuple:
+      return {"tuple": [self.value(y) for y in x]}
+    elif type(x) is list:
+      return {"list": [self.value(y) for y in x]}
+    elif type(x) is dict:
+      return {"dict": [[self.value(k), self.value(v)] for k, v in x.items()]}
+    elif x is core.unit:
+      return {"unit": 0}
+    elif type(x) is core.Jaxpr:
+      return {"jaxpr": self.jaxpr(x)}
+    elif type(x) is core.TypedJaxpr:
+      return {"typed_jaxpr": self.typed_jaxpr(x)}
+    elif isinstance(x, onp.dtype):
+      return {"dtype": x.name}
+    elif isinstance(x, type) and issubclass(x, onp.generic):
+      return {"scalar_type": onp.dtype(x).name}
+    elif isinstance(x, onp.generic):
+      return {"scalar": self.array(onp.asarray(x))}
+    elif isinstance(x, (onp.ndarray, xla.DeviceArray)):
+      return {"array": self.array(onp.asarray(x))}
+    elif isinstance(x, xla_client.Device):
+      return {"device": [x.platform, x.id]}
+    elif type(x) in _param_type_names:
+      name = _param_type_names[type(x)]
+      if isinstance(x, tuple):
+        return {"namedtuple": [name, [self.value(y) for y in x]]}
+      else:
+        return {"enum": [name, x.name]}
+    else:
+      raise TypeError("Can't serialize {!r} of type {}.".format(x, type(x)))
+
+  def array(self, x):
+    x = onp.ascontiguousarray(x)
+    self.buffers.append(x.tobytes())
+    offset, size = self.nbytes, x.nbytes
+    padding = -size % _ALIGNMENT
+    self.buffers.append(b"\0" * padding)
+    self.nbytes += size + padding
+    return [x.dtype.name, list(x.shape), offset]
+
+  def aval(self, aval):
+    aval = raise_to_shaped(aval)
+    if aval is core.abstract_unit:
+      return "unit"
+    elif aval is abstract_token:
+      return "token"
+    elif type(aval) is ShapedArray:
+      shape = [int(d) for d in aval.shape]
+      return [aval.dtype.name, shape, 1] if aval.weak_type else [aval.dtype.name, shape]
+    else:
+      raise TypeError("Can't serialize abstract value {}.".format(aval))
+
+  def _memoized(self, table, x, encode):
+    try:
+      return self._indices[id(x)]
+    except KeyError:
+      encoded = encode(x)
+      index = self._indices[id(x)] = len(table)
+      table.append(encoded)
+      self._keepalive.append(x)
+      return index
+
+  def jaxpr(self, jaxpr: core.Jaxpr) -> int:
+    return self._memoized(self.jaxprs, jaxpr, self._encode_jaxpr)
+
+  def typed_jaxpr(self, typed_jaxpr: core.TypedJaxpr) -> int:
+    return self._memoized(self.typed_jaxprs, typed_jaxpr,
+                          self._encode_typed_jaxpr)
+
+  def _encode_typed_jaxpr(self, typed_jaxpr):
+    return {"jaxpr": self.jaxpr(typed_jaxpr.jaxpr),
+            "literals": [self.value(x) for x in typed_jaxpr.literals],
+            "in_avals": [self.aval(a) for a in typed_jaxpr.in_avals],
+            "out_avals": [self.aval(a) for a in typed_jaxpr.out_avals]}
+
+  def _encode_jaxpr(self, jaxpr):
+    # Variables are numbered in binding order; the unit variable is never bound.
+    env: Dict[core.Var, int] = {}
+    def bind(v):
+      if v is core.unitvar:
+        return None
+      env[v] = len(env)
+      return self.aval(v.aval)
+    def atom(v):
+      if type(v) is core.Literal:
+        return {"literal": self.value(v.val)}
+      elif v is core.unitvar:
+        return None
+      else:
+        return env[v]
+
+    constvars = [bind(v) for v in jaxpr.constvars]
+    invars = [bind(v) for v in jaxpr.invars]
+    eqns = []
+    for eqn in jaxpr.eqns:
+      eqn_invars = [atom(v) for v in eqn.invars]
+      params = self.params(eqn.primitive, eqn.params)
+      eqn_outvars = [bind(v) for v in eqn.outvars]
+      eqns.append({"primitive": eqn.primitive.name, "invars": eqn_invars,
+                   "outvars": eqn_outvars, "params": params})
+    return {"constvars": constvars, "invars": invars, "eqns": eqns,
+            "outvars": [atom(v) for v in jaxpr.outvars]}
+
+  def params(self, prim, params):
+    rule = param_rules.get(prim)
+    if rule is not None:
+      params = rule[0](params)
+    encoded = {}
+    for name, param in params.items():
+      try:
+        encoded[name] = self.value(param)
+      except TypeError as e:
+        raise TypeError("Can't serialize param {} of primitive {}: {}"
+                        .format(name, prim, e)) from None
+    return encoded
+
+
+### Reading
+
+class _Reader(object):
+  def __init__(self, header, buffers):
+    self.header = header
+    self.buffers = buffers
+    self._jaxprs: Dict[int, core.Jaxpr] = {}
+    self._typed_jaxprs: Dict[int, core.TypedJaxpr] = {}
+    self._primitives = None
+
+  def value(self, x):
+    if type(x) is not dict:
+      return x
+    (tag, x), = x.items()
+    if tag == "tuple":
+      return tuple(self.value(y) for y in x)
+    elif tag == "list":
+      return [self.value(y) for y in x]
+    elif tag == "dict":
+      return {self.value(k): self.value(v) for k, v in x}
+    elif tag == "complex":
+      return complex(*x)
+    elif tag == "unit":
+      return core.unit
+    elif tag == "jaxpr":
+      return self.jaxpr(x)
+    elif tag == "typed_jaxpr":
+      return self.typed_jaxpr(x)
+    elif tag == "dtype":
+      return _dtype(x)
+    elif tag == "scalar_type":
+      return _dtype(x).type
+    elif tag == "scalar":
+      return self.array(x)[()]
+    elif tag == "array":
+      return self.array(x)
+    elif tag == "device":
+      platform, device_id = x
+      for device in xb.devices(platform):
+        if device.id == device_id:
+          return device
+      raise ValueError("No {} device with id {}.".format(platform, device_id))
+    elif tag == "namedtuple":
+      name, fields = x
+      return _param_type(name)(*map(self.value, fields))
+    elif tag == "enum":
+      name, member = x
+      return getattr(_param_type(name), member)
+    else:
+      raise ValueError("Unknown serialized value tag {}.".format(tag))
+
+  def array(self, x):
+    dtype, shape, offset = x
+    dtype = _dtype(dtype)
+    return onp.frombuffer(self.buffers, dtype, count=int(onp.prod(shape)),
+                          offset=offset).reshape(shape)
+
+  def aval(self, x):
+    if x == "unit":
+      return core.abstract_unit
+    elif x == "token":
+      return abstract_token
+    else:
+      dtype, shape, *weak_type = x
+      return ShapedArray(tuple(shape), _dtype(dtype), weak_type=bool(weak_type))
+
+  def primitive(self, name):
+    if self._primitives is None:
+      self._primitives = _known_primitives()
+    candidates = self._primitives.get(name, ())
+    if len(candidates) != 1:
+      problem = "Unknown" if not candidates else "Ambiguous"
+      raise ValueError("{} primitive {}; use register_primitive to register it."
+                       .format(problem, name))
+    prim, = candidates
+    return prim
+
+  def jaxpr(self, index: int) -> core.Jaxpr:
+    try:
+      return self._jaxprs[index]
+    except KeyError:
+      jaxpr = self._jaxprs[index] = self._decode_jaxpr(self.header["jaxprs"][index])
+      return jaxpr
+
+  def typed_jaxpr(self, index: int) -> core.TypedJaxpr:
+    try:
+      return self._typed_jaxprs[index]
+    except KeyError:
+      encoded = self.header["typed_jaxprs"][index]
+      typed_jaxpr = core.TypedJaxpr(
+          self.jaxpr(encoded["jaxpr"]),
+          [self.value(x) for x in encoded["literals"]],
+          [self.aval(a) for a in encoded["in_avals"]],
+          [self.aval(a) for a in encoded["out_avals"]])
+      self._typed_jaxprs[index] = typed_jaxpr
+      return typed_jaxpr
+
+  def _decode_jaxpr(self, encoded):
+    newvar = core.gensym('')
+    env: List[core.Var] = []
+    def bind(aval):
+      if aval is None:
+        return core.unitvar
+      v = newvar(self.aval(aval))
+      env.append(v)
+      return v
+    def atom(x):
+      if x is None:
+        return core.unitvar
+      elif type(x) is int:
+        return env[x]
+      else:
+        return core.Literal(self.value(x["literal"]))
+
+    constvars = [bind(a) for a in encoded["constvars"]]
+    invars = [bind(a) for a in encoded["invars"]]
+    eqns = []
+    for eqn in encoded["eqns"]:
+      prim = self.primitive(eqn["primitive"])
+      eqn_invars = [atom(x) for x in eqn["invars"]]
+      params = {name: self.value(param) for name, param in eqn["params"].items()}
+      rule = param_rules.get(prim)
+      if rule is not None:
+        params = rule[1](params)
+      eqn_outvars = [bind(a) for a in eqn["outvars"]]
+      eqns.append(core.new_jaxpr_eqn(eqn_invars, eqn_outvars, prim, params))
+    outvars = [atom(x) for x in encoded["outvars"]]
+    return core.Jaxpr(constvars, invars, outvars, eqns)
+
+
+def _dtype(name):
+  return onp.dtype(dtypes.bfloat16) if name == "bfloat16" else onp.dtype(name)
+
+
+### Registries
+
+_registered_primitives: Set[core.Primitive] = set()
+
+def _known_primitives() -> Dict[str, Set[core.Primitive]]:
+  tables = [xla.translations, xla.initial_style_translations,
+            xla.call_translations, xla.parallel_translations,
+            *xla.backend_specific_translations.values(), ad.primitive_jvps,
+            ad.primitive_transposes, batching.primitive_batchers,
+            _registered_primitives]
+  primitives: Dict[str, Set[core.Primitive]] = {}
+  for table in tables:
+    for prim in table:
+      primitives.setdefault(prim.name, set()).add(prim)
+  return primitives
+
+_param_types: Dict[str, type] = {}
+_param_type_names: Dict[type, str] = {}
+
+def _param_type(name):
+  try:
+    return _param_types[name]
+  except KeyError:
+    raise ValueError("Unknown param type {}; use register_param_type to "
+                     "register it.".format(name)) from None
+
+register_param_type(lax.ConvDimensionNumbers, "lax.ConvDimensionNumbers")
+register_param_type(lax.GatherDimensionNumbers, "lax.GatherDimensionNumbers")
+register_param_type(lax.ScatterDimensionNumbers, "lax.ScatterDimensionNumbers")
+register_param_type(lax.Precision, "lax.Precision")
+register_param_type(lax_control_flow._LinearSolveTuple, "lax._LinearSolveTuple")
+
+
+# The JVP rule of a custom_jvp function is a thunk that traces the rule when
+# first needed. We trace it at serialization time and store the jaxpr instead.
+
+def _custom_jvp_call_jaxpr_to_serializable(params):
+  params = dict(params)
+  params["jvp_jaxpr"] = params.pop("jvp_jaxpr_thunk")()
+  return params
+
+def _custom_jvp_call_jaxpr_from_serializable(params):
+  params = dict(params)
+  jvp_jaxpr = params.pop("jvp_jaxpr")
+  params["jvp_jaxpr_thunk"] = lambda: jvp_jaxpr
+  return params
+
+param_rules[custom_jvp_call_jaxpr_p] = (_custom_jvp_call_jaxpr_to_serializable,
+                                        _custom_jvp_call_jaxpr_from_serializable)
@@ -0,0 +1,125 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Reading scalar metrics of a training loop without stalling dispatch.
+
+Calling ``float(loss)`` at every step waits for the step to finish and for the
+loss to be transferred to the host before the next step can be dispatched.
+`Metrics` instead keeps the scalars of each step on the device, and reads
+those of many steps in a single transfer every `read_every` steps, in the
+background. Logging code asks for the latest values that have arrived, which
+never blocks::
+
+  >>> metrics = Metrics(read_every=100)
+  >>> for step in range(num_steps):
+  ...   params, loss, accuracy = train_step(params, batch)
+  ...   metrics.update(step, loss=loss, accuracy=accuracy)
+  ...   if step % 10 == 0:
+  ...     print(metrics.latest_step, metrics.latest())
+  >>> metrics.wait()
+  >>> print(metrics.mean())
+"""
+
+import collections
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as onp
+
+from jax import api
+from jax import core
+
+
+class Metrics(object):
+  """Accumulates scalar metrics on the device and reads them in batches.
+
+  Args:
+    read_every: number of steps whose metrics are read in each transfer to the
+      host. Reads can also be started at any time with `start_read`.
+    history: optional number of read steps to keep for `values` and `mean`.
+      By default, all of them are kept.
+  """
+
+  def __init__(self, read_every: int = 100, history: Optional[int] = None):
+    if read_every < 1:
+      raise ValueError("Metrics requires read_every >= 1, got {}."
+                       .format(read_every))
+    self.read_every = read_every
+    self._pending: List[Tuple[Any, Dict[str, Any]]] = []
+    self._reads: collections.deque = collections.deque()
+    self._values: collections.deque = collections.deque(maxlen=history)
+
+  def update(self, step: Any, **metrics):
+    """Records the scalar `metrics` of `step`, without transferring them.
+
+    The values can be DeviceArrays, which stay on the device until they're
+    read, or Python and numpy scalars.
+    """
+    for name, value in metrics.items():
+      if isinstance(value, core.Tracer):
+        raise TypeError("Metrics.update got a traced value for {!r}; record "
+                        "metrics outside of jit and other transformations."
+                        .format(name))
+      if onp.shape(value) != ():
+        raise TypeError("Metrics.update expects scalars, got shape {} for {!r}."
+                        .format(onp.shape(value), name))
+    self._pending.append((step, metrics))
+    if len(self._pending) >= self.read_every:
+      self.start_read()
+
+  def start_read(self):
+    """Starts reading the metrics recorded since the last read, if any."""
+    if self._pending:
+      self._reads.append(api.device_get_async(self._pending))
+      self._pending = []
+
+  def _collect(self, block: bool):
+    while self._reads and (block or self._reads[0].done()):
+      for step, metrics in self._reads.popleft().result():
+        self._values.append(
+            (step, {name: onp.asarray(v).item() for name, v in metrics.items()}))
+
+  def wait(self):
+    """Reads all the recorded metrics, waiting for them to arrive."""
+    self.start_read()
+    self._collect(block=True)
+
+  @property
+  def latest_step(self) -> Any:
+    """The step of the latest metrics that arrived, or None."""
+    self._collect(block=False)
+    return self._values[-1][0] if self._values else None
+
+  def latest(self) -> Dict[str, float]:
+    """Returns the latest metrics that arrived on the host, without blocking.
+
+    Metrics recorded since then but still on the device or in flight aren't
+    waited for; call `wait` first to get the metrics of the last step.
+    """
+    self._collect(block=False)
+    return dict(self._values[-1][1]) if self._values else {}
+
+  def values(self) -> List[Tuple[Any, Dict[str, float]]]:
+    """Returns the `(step, metrics)` pairs that arrived, oldest first."""
+    self._collect(block=False)
+    return list(self._values)
+
+  def mean(self) -> Dict[str, float]:
+    """Returns the mean of each metric over the steps that arrived."""
+    sums: Dict[str, float] = collections.defaultdict(float)
+    counts: Dict[str, int] = collections.defaultdict(int)
+    for _, metrics in self.values():
+      for name, value in metrics.items():
+        sums[name] += value
+        counts[name] += 1
+    return {name: sums[name] / counts[name] for name in sums}
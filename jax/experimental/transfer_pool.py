@@ -0,0 +1,136 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Reusing host staging buffers for input batches of fixed shapes.
+
+Every `device_put` of a numpy array converts it to the canonical dtype and
+makes it contiguous in freshly allocated host memory if needed, and allocates
+a new device buffer. Input pipelines that put batches of the same shapes over
+and over can use a `TransferPool` instead, which keeps a few aligned host
+staging buffers per ``(shape, dtype, device)`` and copies each batch into one
+whose previous contents are no longer used::
+
+  >>> pool = TransferPool()
+  >>> for batch in dataset:
+  ...   params = train_step(params, pool.put(batch))
+
+With the ``jax_cpu_zero_copy`` flag on the CPU backend, the staging buffers are
+the device buffers themselves, so deleting (or dropping) the arrays of a batch
+recycles their device memory for a later one. On other backends, the device
+buffers are allocated by the backend's allocator, which caches freed memory,
+and jaxlib doesn't provide pinned host memory to stage transfers in.
+"""
+
+from collections import defaultdict
+import sys
+from typing import Any, Optional
+
+import numpy as onp
+
+from jax import api
+from jax import dtypes
+from jax import profiler
+from jax.abstract_arrays import ShapedArray
+from jax.interpreters import xla
+from jax.lib import xla_client as xc
+from jax.tree_util import tree_flatten, tree_unflatten
+
+# Staging buffers are aligned to this many bytes, enough for XLA:CPU to use them
+# as device buffers.
+_ALIGNMENT = 64
+
+
+class TransferPool(object):
+  """Puts numpy arrays on a device through reusable host staging buffers.
+
+  Args:
+    device: optional ``Device`` to put arrays on, as in `jax.device_put`.
+    max_buffers_per_key: maximum number of staging buffers kept for each shape
+      and dtype. When all of them are still in use, arrays are put without
+      staging.
+  """
+
+  def __init__(self, device: Optional[xc.Device] = None,
+               max_buffers_per_key: int = 4):
+    self.device = device
+    self.max_buffers_per_key = max_buffers_per_key
+    self._buffers = defaultdict(list)
+    self.num_allocated = 0
+    self.num_reused = 0
+
+  def put(self, tree) -> Any:
+    """Like ``jax.device_put(tree, self.device)``, staging numpy arrays.
+
+    Leaves other than numpy arrays are put with `jax.device_put`.
+    """
+    leaves, treedef = tree_flatten(tree)
+    out = [self._put_array(x) if type(x) is onp.ndarray else
+           api.device_put(x, self.device) for x in leaves]
+    return tree_unflatten(treedef, out)
+
+  def _put_array(self, x):
+    dtype = dtypes.canonicalize_dtype(x.dtype)
+    staging = self._acquire(x.shape, dtype)
+    if staging is None:
+      return api.device_put(x, self.device)
+    onp.copyto(staging, x, casting="unsafe")
+    with profiler.phase("transfer", "device_put"):
+      buf, aliased = xla._device_put_array_maybe_aliased(staging, self.device)
+    out = xla.aval_to_result_handler(self.device,
+                                     ShapedArray(x.shape, dtype))(buf)
+    if aliased:
+      out._npy_value = staging.view()
+      out._npy_value.flags.writeable = False
+    return out
+
+  def _acquire(self, shape, dtype):
+    buffers = self._buffers[(shape, dtype)]
+    for staging in buffers:
+      refcounts = _refcounts(staging)
+      if all(n <= free for n, free in zip(refcounts, _FREE_REFCOUNTS)):
+        self.num_reused += 1
+        return staging
+    if len(buffers) >= self.max_buffers_per_key:
+      return None
+    staging = _aligned_empty(shape, dtype)
+    buffers.append(staging)
+    self.num_allocated += 1
+    return staging
+
+  def clear(self):
+    """Drops the staging buffers, which are freed once they're not in use."""
+    self._buffers.clear()
+
+
+def _aligned_empty(shape, dtype) -> onp.ndarray:
+  nbytes = int(onp.prod(shape, dtype=onp.int64)) * dtype.itemsize
+  raw = onp.empty(nbytes + _ALIGNMENT, onp.uint8)
+  start = -raw.ctypes.data % _ALIGNMENT
+  return raw[start:start + nbytes].view(dtype).reshape(shape)
+
+# A staging buffer is free once only the pool refers to it, i.e. the device
+# buffers of earlier transfers are gone, and so are the views of its memory,
+# whose base is the buffer the staging array is a view of. The reference counts
+# of a free buffer depend on the Python version, so they're measured here, the
+# same way `_acquire` looks at them.
+
+def _refcounts(staging):
+  return sys.getrefcount(staging), sys.getrefcount(staging.base)
+
+def _refcounts_of_free_buffer():
+  buffers = [_aligned_empty((1,), onp.dtype(onp.float32))]
+  for staging in buffers:
+    return _refcounts(staging)
+
+_FREE_REFCOUNTS = _refcounts_of_free_buffer()
@@ -12,8 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from collections import Counter
+from contextlib import contextmanager
+import threading
+from typing import (Any, Callable, Dict, List, NamedTuple, Optional, Sequence,
+                    Tuple, Union)
+
 import numpy as onp
-from typing import Any, Callable, Dict, Optional, Sequence, Tuple, Union
 
 from .. import core
 from .. import dtypes
@@ -21,7 +26,7 @@ from ..core import Trace, Tracer, new_master
 from ..abstract_arrays import ShapedArray, raise_to_shaped
 from ..ad_util import add_jaxvals, add_jaxvals_p, zeros_like_jaxval, zeros_like_p
 from .. import linear_util as lu
-from ..util import unzip2, partial, safe_map, wrap_name, split_list
+from ..util import unzip2, partial, safe_map, wrap_name, split_list, prod
 from . import xla
 from . import partial_eval as pe
 
@@ -131,7 +136,11 @@ class BatchTrace(Trace):
     else:
       # TODO(mattjj,phawkins): if no rule implemented, could vmap-via-map here
       batched_primitive = get_primitive_batcher(primitive)
-      val_out, dim_out = batched_primitive(vals_in, dims_in, **params)
+      if _diagnostics.sinks:
+        val_out, dim_out = _diagnosed_batcher(primitive, batched_primitive,
+                                              vals_in, dims_in, params)
+      else:
+        val_out, dim_out = batched_primitive(vals_in, dims_in, **params)
       if primitive.multiple_results:
         return map(partial(BatchTracer, self), val_out, dim_out)
       else:
@@ -293,6 +302,171 @@ primitive_batchers[zeros_like_p] = zeros_like_batched
 
 defvectorized(xla.device_put_p)
 
+### diagnostics
+
+# When diagnostics are being collected (see `batching_diagnostics`), every
+# primitive bound on batched operands produces a `BatchedPrimitive` record, and
+# the utilities below that materialize extra work (broadcasting an unbatched
+# operand, moving a batch dimension with a transpose, or selecting between the
+# results of both sides of a batched predicate) attach a `BatchingFallback` to
+# the primitive whose batching rule invoked them.
+
+class BatchingFallback(NamedTuple):
+  kind: str  # one of 'broadcast', 'transpose', 'select' or 'both_branches'
+  shape: Tuple[int, ...]
+  dtype: onp.dtype
+  extra_flops: int
+  extra_bytes: int
+
+class BatchedPrimitive(NamedTuple):
+  primitive: str
+  fallbacks: Tuple[BatchingFallback, ...]
+
+  @property
+  def efficient(self) -> bool:
+    return not self.fallbacks
+
+class _DiagnosticsState(threading.local):
+  sinks: List[List[BatchedPrimitive]]
+  fallbacks: List[List[BatchingFallback]]
+
+  def __init__(self):
+    self.sinks = []
+    self.fallbacks = []
+_diagnostics = _DiagnosticsState()
+
+# Name under which fallbacks outside of any batching rule (e.g. moving output
+# batch dimensions to `out_axes`) are reported.
+_VMAP_OUTPUTS = '<vmap outputs>'
+
+class BatchingReport(object):
+  """The batching records collected by `batching_diagnostics`."""
+
+  def __init__(self):
+    self.records: List[BatchedPrimitive] = []
+
+  @property
+  def efficient(self) -> List[BatchedPrimitive]:
+    return [r for r in self.records if r.efficient]
+
+  @property
+  def fallbacks(self) -> List[BatchedPrimitive]:
+    return [r for r in self.records if not r.efficient]
+
+  @property
+  def extra_flops(self) -> int:
+    return sum(f.extra_flops for r in self.records for f in r.fallbacks)
+
+  @property
+  def extra_bytes(self) -> int:
+    return sum(f.extra_bytes for r in self.records for f in r.fallbacks)
+
+  def summary(self) -> Dict[str, Dict[str, Any]]:
+    """Aggregates the records per primitive name."""
+    out: Dict[str, Dict[str, Any]] = {}
+    for r in self.records:
+      entry = out.setdefault(r.primitive, dict(
+          count=0, efficient=0, fallbacks=Counter(), extra_flops=0,
+          extra_bytes=0))
+      entry['count'] += 1
+      entry['efficient'] += r.efficient
+      for f in r.fallbacks:
+        entry['fallbacks'][f.kind] += 1
+        entry['extra_flops'] += f.extra_flops
+        entry['extra_bytes'] += f.extra_bytes
+    return out
+
+  def __str__(self):
+    lines = ['{:<24} {:>6} {:>9} {:>12} {:>12}  {}'.format(
+        'primitive', 'count', 'efficient', 'extra_flops', 'extra_bytes',
+        'fallbacks')]
+    summary = sorted(self.summary().items(),
+                     key=lambda kv: (-kv[1]['extra_bytes'], kv[0]))
+    for name, e in summary:
+      fallbacks = ', '.join('{}={}'.format(k, v)
+                            for k, v in sorted(e['fallbacks'].items()))
+      lines.append('{:<24} {:>6} {:>9} {:>12} {:>12}  {}'.format(
+          name, e['count'], e['efficient'], e['extra_flops'], e['extra_bytes'],
+          fallbacks))
+    return '\n'.join(lines)
+  __repr__ = __str__
+
+@contextmanager
+def batching_diagnostics():
+  """Context manager collecting a `BatchingReport` for everything batched.
+
+  Primitives batched within the context are recorded along with any fallback
+  work their batching rules materialized, so that performance cliffs under
+  `vmap` can be found without reading the batched jaxpr. Outside of this
+  context no records are kept.
+  """
+  report = BatchingReport()
+  _diagnostics.sinks.append(report.records)
+  try:
+    yield report
+  finally:
+    _diagnostics.sinks.pop()
+
+@contextmanager
+def deferred_diagnostics():
+  """Buffers diagnostics records rather than reporting them.
+
+  Batching rules that trace a subcomputation several times (e.g. to find a
+  fixpoint of batched carries) use this to report only the trace they keep,
+  via `commit_diagnostics`. Does nothing unless diagnostics are enabled.
+  """
+  records: List[BatchedPrimitive] = []
+  fallbacks: List[BatchingFallback] = []
+  if not _diagnostics.sinks:
+    yield records, fallbacks
+    return
+  _diagnostics.sinks.append(records)
+  _diagnostics.fallbacks.append(fallbacks)
+  try:
+    yield records, fallbacks
+  finally:
+    _diagnostics.fallbacks.pop()
+    _diagnostics.sinks.pop()
+
+def commit_diagnostics(deferred):
+  records, fallbacks = deferred
+  if not _diagnostics.sinks:
+    return
+  _diagnostics.sinks[-1].extend(records)
+  if fallbacks and _diagnostics.fallbacks:
+    _diagnostics.fallbacks[-1].extend(fallbacks)
+  elif fallbacks:
+    _diagnostics.sinks[-1].append(BatchedPrimitive(_VMAP_OUTPUTS,
+                                                   tuple(fallbacks)))
+
+def diagnostics_enabled() -> bool:
+  return bool(_diagnostics.sinks)
+
+def _diagnosed_batcher(primitive, batched_primitive, vals_in, dims_in, params):
+  fallbacks: List[BatchingFallback] = []
+  _diagnostics.fallbacks.append(fallbacks)
+  try:
+    out = batched_primitive(vals_in, dims_in, **params)
+  finally:
+    _diagnostics.fallbacks.pop()
+  _diagnostics.sinks[-1].append(BatchedPrimitive(primitive.name,
+                                                 tuple(fallbacks)))
+  return out
+
+def _aval_nbytes(aval):
+  return prod(aval.shape) * aval.dtype.itemsize
+
+def record_fallback(kind: str, aval, extra_flops: int, extra_bytes: int):
+  """Attributes fallback work on a value of type `aval` to the current rule."""
+  if not _diagnostics.sinks:
+    return
+  fallback = BatchingFallback(kind, aval.shape, aval.dtype, extra_flops,
+                              extra_bytes)
+  if _diagnostics.fallbacks:
+    _diagnostics.fallbacks[-1].append(fallback)
+  else:
+    _diagnostics.sinks[-1].append(BatchedPrimitive(_VMAP_OUTPUTS, (fallback,)))
+
 ### util
 
 # These utilities depend on primitives for things like broadcasting, reshaping,
@@ -312,6 +486,9 @@ def broadcast(x, sz, axis):
     axis = onp.ndim(x)
   shape = list(onp.shape(x))
   shape.insert(axis, sz)
+  if _diagnostics.sinks:
+    aval = ShapedArray(tuple(shape), dtypes.result_type(x))
+    record_fallback('broadcast', aval, 0, _aval_nbytes(aval))
   if isinstance(x, onp.ndarray) or onp.isscalar(x):
     return onp.broadcast_to(dtypes.coerce_to_array(x), shape)
   else:
@@ -324,6 +501,9 @@ def moveaxis(x, src, dst):
   if src == dst:
     return x
   src, dst = src % x.ndim, dst % x.ndim
+  if _diagnostics.sinks and src != dst:
+    aval = raise_to_shaped(core.get_aval(x))
+    record_fallback('transpose', aval, 0, 2 * _aval_nbytes(aval))
   perm = [i for i in range(onp.ndim(x)) if i != src]
   perm.insert(dst, src)
   return x.transpose(perm)
@@ -0,0 +1,175 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Static FLOP and memory cost estimates for jaxprs.
+
+Each primitive may register a cost rule in `cost_rules`, alongside its
+translation and batching rules. A rule is called as
+`rule(in_avals, out_avals, **params)` and returns a `Cost` for one application
+of the primitive. Primitives without a rule are assumed to only read their
+operands and write their results, unless they carry subjaxprs in their params,
+in which case those are analyzed recursively.
+"""
+
+import itertools as it
+from typing import Callable, Dict, NamedTuple, Sequence
+
+from .. import core
+from ..util import partial, prod
+
+
+class Cost(NamedTuple):
+  """Estimated cost of a jaxpr or of a single equation.
+
+  For a jaxpr, `peak_bytes` is the peak total size of the values live at any
+  point of its evaluation, including its inputs. For a single equation it is
+  the scratch memory needed beyond its operands and results.
+  """
+  flops: float = 0
+  bytes_read: int = 0
+  bytes_written: int = 0
+  peak_bytes: int = 0
+
+  def __add__(self, other):
+    return Cost(self.flops + other.flops,
+                self.bytes_read + other.bytes_read,
+                self.bytes_written + other.bytes_written,
+                max(self.peak_bytes, other.peak_bytes))
+
+  def scale(self, n):
+    """The cost of evaluating `n` times, reusing the same scratch memory."""
+    return Cost(self.flops * n, self.bytes_read * n, self.bytes_written * n,
+                self.peak_bytes)
+
+CostRule = Callable[..., Cost]
+cost_rules: Dict[core.Primitive, CostRule] = {}
+
+
+def aval_size(aval) -> int:
+  return prod(aval.shape) if isinstance(aval, core.ShapedArray) else 0
+
+def aval_bytes(aval) -> int:
+  if isinstance(aval, core.ShapedArray):
+    return prod(aval.shape) * aval.dtype.itemsize
+  else:
+    return 0
+
+def memory_cost(in_avals: Sequence, out_avals: Sequence, flops: float = 0,
+                peak_bytes: int = 0) -> Cost:
+  """The cost of reading all operands once and writing all results once."""
+  return Cost(flops, sum(map(aval_bytes, in_avals)),
+              sum(map(aval_bytes, out_avals)), peak_bytes)
+
+
+def defnoop(prim):
+  """Registers `prim` as free, e.g. because its results alias its operands."""
+  cost_rules[prim] = _noop_cost_rule
+
+def _noop_cost_rule(in_avals, out_avals, **params):
+  return Cost()
+
+def defmemory(prim):
+  """Registers `prim` as data movement only (no FLOPs)."""
+  cost_rules[prim] = _memory_cost_rule
+
+def _memory_cost_rule(in_avals, out_avals, **params):
+  return memory_cost(in_avals, out_avals)
+
+def defelementwise(prim, flops_per_element=1):
+  """Registers `prim` as costing `flops_per_element` per result element."""
+  cost_rules[prim] = partial(_elementwise_cost_rule, flops_per_element)
+
+def _elementwise_cost_rule(flops_per_element, in_avals, out_avals, **params):
+  flops = flops_per_element * sum(map(aval_size, out_avals))
+  return memory_cost(in_avals, out_avals, flops)
+
+def defreduction(prim):
+  """Registers `prim` as costing one FLOP per operand element."""
+  cost_rules[prim] = _reduction_cost_rule
+
+def _reduction_cost_rule(in_avals, out_avals, **params):
+  return memory_cost(in_avals, out_avals, sum(map(aval_size, in_avals)))
+
+
+def _subjaxpr_cost(jaxpr: core.Jaxpr, times=1) -> Cost:
+  cost = jaxpr_cost(jaxpr)
+  in_bytes = sum(aval_bytes(v.aval) for v in it.chain(jaxpr.constvars,
+                                                      jaxpr.invars))
+  return Cost(cost.flops, cost.bytes_read, cost.bytes_written,
+              max(0, cost.peak_bytes - in_bytes)).scale(times)
+
+def subjaxpr_cost(jaxpr, times=1) -> Cost:
+  """The cost of evaluating a (typed) subjaxpr `times` times from a rule.
+
+  The subjaxpr's inputs are assumed to be live already, so only its additional
+  live memory is reported as scratch in `peak_bytes`.
+  """
+  if type(jaxpr) is core.TypedJaxpr:
+    jaxpr = jaxpr.jaxpr
+  return _subjaxpr_cost(jaxpr, times)
+
+
+def eqn_cost(eqn: core.JaxprEqn) -> Cost:
+  in_avals = [v.aval for v in eqn.invars]
+  out_avals = [v.aval for v in eqn.outvars]
+  rule = cost_rules.get(eqn.primitive)
+  if rule is not None:
+    return rule(in_avals, out_avals, **eqn.params)
+  call_jaxpr, params = core.extract_call_jaxpr(eqn.primitive, eqn.params)
+  if call_jaxpr is not None:
+    # Map primitives evaluate their (per-device) body once per mapped index.
+    times = params.get('axis_size', 1) if eqn.primitive.map_primitive else 1
+    return memory_cost(in_avals, out_avals) + subjaxpr_cost(call_jaxpr, times)
+  cost = memory_cost(in_avals, out_avals)
+  for param in eqn.params.values():
+    if type(param) in (core.Jaxpr, core.TypedJaxpr):
+      cost = cost + subjaxpr_cost(param)
+  return cost
+
+
+def jaxpr_cost(jaxpr: core.Jaxpr) -> Cost:
+  """Estimates the FLOPs, bytes accessed and peak live memory of `jaxpr`.
+
+  Peak memory assumes intermediates are freed right after their last use and
+  that no buffers are aliased or fused away, so it is an upper bound on what
+  XLA will need for the same program.
+  """
+  num_eqns = len(jaxpr.eqns)
+  last_use: Dict[core.Var, int] = {}
+  for i, eqn in enumerate(jaxpr.eqns):
+    for v in eqn.invars:
+      if type(v) is core.Var:
+        last_use[v] = i
+  for v in jaxpr.outvars:
+    if type(v) is core.Var:
+      last_use[v] = num_eqns
+
+  # Inputs are owned by the caller, so they stay live throughout.
+  live: Dict[core.Var, int] = {}
+  live_bytes = sum(aval_bytes(v.aval)
+                   for v in it.chain(jaxpr.constvars, jaxpr.invars))
+  total = Cost(peak_bytes=live_bytes)
+  for i, eqn in enumerate(jaxpr.eqns):
+    cost = eqn_cost(eqn)
+    out_bytes = sum(aval_bytes(v.aval) for v in eqn.outvars)
+    peak = live_bytes + out_bytes + cost.peak_bytes
+    total = total + cost._replace(peak_bytes=peak)
+    for v in eqn.outvars:
+      if type(v) is core.Var:
+        live[v] = aval_bytes(v.aval)
+        live_bytes += live[v]
+    for v in it.chain(eqn.invars, eqn.outvars):
+      if type(v) is core.Var and v in live and last_use.get(v, i) <= i:
+        live_bytes -= live.pop(v)
+  return total
@@ -45,6 +45,7 @@ from ..config import flags
 from .. import core
 from .. import linear_util as lu
 from .. import lazy
+from .. import profiler
 from ..abstract_arrays import (ConcreteArray, ShapedArray, array_types,
                                raise_to_shaped)
 from ..util import (partial, unzip2, prod, safe_map, safe_zip,
@@ -473,6 +474,8 @@ class ShardedDeviceArray(xla.DeviceArray):
     self.sharding_spec = sharding_spec
     self.indices = indices
     self._npy_value = None
+    if FLAGS.jax_array_creation_sites:
+      xla.record_creation_site(self)
     if not core.skip_checks:
       assert type(aval) is ShapedArray
 
@@ -482,6 +485,13 @@ class ShardedDeviceArray(xla.DeviceArray):
       for buf in self.device_buffers:
         buf.copy_to_host_async()
 
+  def to_host_future(self):
+    self._check_if_deleted()
+    if self._npy_value is not None:
+      return xla._completed_future(self._npy_value)
+    self.copy_to_host_async()
+    return xla.host_read_executor().submit(lambda: self._value)
+
   def delete(self):
     for buf in self.device_buffers:
       buf.delete()
@@ -621,8 +631,10 @@ def parallel_callable(fun, backend, axis_name, axis_size, global_axis_size,
   pvals = [pe.PartialVal.unknown(aval) for aval in sharded_avals]
   # We add a dummy first invar, to carry the trace  details to `dynamic_fun`
   pval = pe.PartialVal.unknown(core.abstract_unit)  # dummy value for axis env
-  jaxpr, out_pvals, consts = pe.trace_to_jaxpr(
-      dynamic_fun, [pval] + pvals, instantiate=False, stage_out=True, bottom=True)
+  with profiler.phase("trace", fun.__name__):
+    jaxpr, out_pvals, consts = pe.trace_to_jaxpr(
+        dynamic_fun, [pval] + pvals, instantiate=False, stage_out=True,
+        bottom=True)
   jaxpr.invars = jaxpr.invars[1:]  # ignore dummy
 
   out_pvs, out_consts = unzip2(out_pvals)
@@ -657,12 +669,13 @@ def parallel_callable(fun, backend, axis_name, axis_size, global_axis_size,
 
   tuple_args = len(sharded_avals) > 100  # pass long arg lists as tuple for TPU
 
-  c = xb.make_computation_builder("pmap_{}".format(fun.__name__))
-  xla_consts = _map(partial(xb.constant, c), consts)
-  xla_args = xla._xla_callable_args(c, sharded_avals, tuple_args)
-  out_nodes = xla.jaxpr_subcomp(c, jaxpr, backend, axis_env, xla_consts,
-                                extend_name_stack(wrap_name(name, 'pmap')), *xla_args)
-  built = c.Build(xops.Tuple(c, out_nodes))
+  with profiler.phase("lower", fun.__name__):
+    c = xb.make_computation_builder("pmap_{}".format(fun.__name__))
+    xla_consts = _map(partial(xb.constant, c), consts)
+    xla_args = xla._xla_callable_args(c, sharded_avals, tuple_args)
+    out_nodes = xla.jaxpr_subcomp(c, jaxpr, backend, axis_env, xla_consts,
+                                  extend_name_stack(wrap_name(name, 'pmap')), *xla_args)
+    built = c.Build(xops.Tuple(c, out_nodes))
 
   if devices is None:
     if num_global_replicas > xb.device_count(backend):
@@ -704,7 +717,8 @@ def parallel_callable(fun, backend, axis_name, axis_size, global_axis_size,
           device_assignment=device_assignment)
   compile_options.tuple_arguments = tuple_args
   backend = xb.get_backend(backend)
-  compiled = backend.compile(built, compile_options=compile_options)
+  with profiler.phase("compile", fun.__name__):
+    compiled = backend.compile(built, compile_options=compile_options)
 
   input_sharding_specs = [_pmap_sharding_spec(num_local_replicas, axis_size,
                                               aval, m)
@@ -717,8 +731,8 @@ def parallel_callable(fun, backend, axis_name, axis_size, global_axis_size,
   handle_outs = _pvals_to_results_handler(axis_size, num_local_replicas,
                                           out_pvals, compiled.local_devices(),
                                           backend)
-  return partial(execute_replicated, compiled, backend, handle_args,
-                 handle_outs)
+  return partial(execute_replicated, fun.__name__, compiled, backend,
+                 handle_args, handle_outs)
 
 multi_host_supported_collectives: Set[core.Primitive] = set()
 
@@ -823,10 +837,13 @@ def _pmap_sharding_spec(nrep, axis_size, sharded_aval, mapped):
         replication_factor=replication_factor * axis_size)
 
 
-def execute_replicated(compiled, backend, in_handler, out_handler, *args):
-  input_bufs = in_handler(args)
-  out_bufs = compiled.ExecuteOnLocalDevices(list(input_bufs))
-  return out_handler(out_bufs)
+def execute_replicated(name, compiled, backend, in_handler, out_handler, *args):
+  with profiler.phase("transfer", name):
+    input_bufs = in_handler(args)
+  with profiler.phase("execute", name):
+    out_bufs = compiled.ExecuteOnLocalDevices(list(input_bufs))
+  with profiler.phase("result", name):
+    return out_handler(out_bufs)
 
 
 xla_pmap_p = core.Primitive('xla_pmap')
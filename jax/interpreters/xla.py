@@ -14,9 +14,14 @@
 
 
 from collections import defaultdict
+import concurrent.futures
 import itertools as it
 import operator as op
-from typing import Any, Callable, Dict, Optional, Sequence, Tuple, Type
+import os
+import sys
+from typing import (Any, Callable, Dict, List, Optional, Sequence, Tuple,
+                    Type)
+import weakref
 
 from absl import logging
 import numpy as onp
@@ -27,6 +32,7 @@ from .. import ad_util
 from .. import dtypes
 from .. import lazy
 from .. import linear_util as lu
+from .. import profiler
 from ..abstract_arrays import (ConcreteArray, ShapedArray, AbstractToken,
                                make_shaped_array, array_types, raise_to_shaped,
                                abstract_token)
@@ -55,6 +61,19 @@ flags.DEFINE_bool('jax_debug_nans',
 flags.DEFINE_bool('jax_log_compiles',
                   bool_env('JAX_LOG_COMPILES', False),
                   'Print a message each time a `jit` computation is compiled.')
+flags.DEFINE_bool('jax_cpu_zero_copy',
+                  bool_env('JAX_CPU_ZERO_COPY', False),
+                  'On the CPU backend, share memory between numpy arrays and '
+                  'device buffers instead of copying: suitably aligned, '
+                  'contiguous numpy arrays passed to `device_put` or `jit` are '
+                  'used as device buffers directly, and `np.asarray` of a '
+                  'DeviceArray returns a read-only view of its buffer. Writes '
+                  'to an aliased numpy array are visible to JAX, and views must '
+                  'not be used after the DeviceArray is deleted explicitly.')
+flags.DEFINE_bool('jax_array_creation_sites',
+                  bool_env('JAX_ARRAY_CREATION_SITES', False),
+                  'Record the line of user code that created each DeviceArray, '
+                  'for the `creation_site`s reported by `jax.memory_stats`.')
 
 def _map(f, *xs): return tuple(map(f, *xs))
 def identity(x): return x
@@ -110,8 +129,38 @@ def device_put(x, device: Optional[Device] = None):
     raise TypeError(f"No device_put handler for type: {type(x)}") from err
 
 def _device_put_array(x, device: Optional[Device]):
+  return _device_put_array_maybe_aliased(x, device)[0]
+
+# XLA:CPU requires buffers to be aligned to this many bytes.
+_CPU_MIN_ALIGNMENT = 16
+
+def _device_put_array_maybe_aliased(x, device: Optional[Device]):
+  """Returns a buffer holding `x`, and whether it shares `x`'s memory."""
   backend = xb.get_device_backend(device)
-  return backend.buffer_from_pyval(x, device)
+  if (FLAGS.jax_cpu_zero_copy and backend.platform == 'cpu' and
+      type(x) is onp.ndarray and x.flags.c_contiguous and x.dtype.isnative and
+      x.ctypes.data % _CPU_MIN_ALIGNMENT == 0 and hasattr(x, '__dlpack__')):
+    # Like `dlpack.from_dlpack`, the buffer holds a reference to the array, so
+    # the memory stays alive as long as either of them does.
+    try:
+      dlpack = x.__dlpack__()
+    except (BufferError, TypeError):
+      pass  # e.g. read-only arrays or dtypes numpy can't export
+    else:
+      client = getattr(backend, "client", backend)
+      return xc._xla.DLPackManagedTensorToBuffer(dlpack, client), True
+  return (_relieving_memory_pressure(device, backend.buffer_from_pyval, x,
+                                     device), False)
+
+def _buffer_to_py(buf: PyLocalBuffer) -> onp.ndarray:
+  if FLAGS.jax_cpu_zero_copy and buf.platform() == 'cpu':
+    try:
+      # A view that keeps `buf` alive, on jaxlibs whose CPU buffers support
+      # the buffer protocol.
+      return onp.asarray(memoryview(buf))
+    except (TypeError, ValueError, BufferError):
+      pass
+  return buf.to_py()
 
 def _device_put_scalar(x, device):
   return _device_put_array(dtypes.coerce_to_array(x), device)
@@ -173,9 +222,29 @@ def arg_spec(x):
 
 def apply_primitive(prim, *args, **params):
   """Impl rule that compiles and runs a single primitive 'prim' using XLA."""
-  compiled_fun = xla_primitive_callable(prim, *map(arg_spec, args), **params)
+  lexprs = tuple(map(_fusible_lazy_expr, args))
+  if prim in initial_style_translations or all(l is None for l in lexprs):
+    compiled_fun = xla_primitive_callable(prim, *map(arg_spec, args), **params)
+  else:
+    compiled_fun = xla_fused_primitive_callable(prim, lexprs,
+                                                 *map(arg_spec, args), **params)
   return compiled_fun(*args)
 
+def _fusible_lazy_expr(x) -> Optional[lazy.LazyExpr]:
+  # Lazy expressions over a buffer are staged into the computations that
+  # consume them, rather than forced into a buffer of their own.
+  if (type(x) is DeviceArray and not lazy.is_trivial(x._lazy_expr) and
+      not is_device_constant(x)):
+    return x._lazy_expr
+  return None
+
+def _primitive_result_handler(prim, device, aval_out):
+  if not prim.multiple_results:
+    return aval_to_result_handler(device, aval_out)
+  else:
+    handlers = tuple(map(partial(aval_to_result_handler, device), aval_out))
+    return lambda xs: tuple(h(x) for h, x in zip(handlers, xs))
+
 @cache()
 def xla_primitive_callable(prim, *arg_specs: Tuple[core.AbstractValue,
                                                    Optional[Device]], **params):
@@ -183,11 +252,7 @@ def xla_primitive_callable(prim, *arg_specs: Tuple[core.AbstractValue,
   device = _device_from_arg_devices(arg_devices)
   backend = xb.get_device_backend(device)
   aval_out = prim.abstract_eval(*avals, **params)
-  if not prim.multiple_results:
-    handle_result = aval_to_result_handler(device, aval_out)
-  else:
-    handlers = tuple(map(partial(aval_to_result_handler, device), aval_out))
-    handle_result = lambda xs: tuple(h(x) for h, x in zip(handlers, xs))
+  handle_result = _primitive_result_handler(prim, device, aval_out)
   tuple_args = len(avals) > 100
   if prim in initial_style_translations:
     nreps = initial_style_primitive_replicas(params)
@@ -198,19 +263,47 @@ def xla_primitive_callable(prim, *arg_specs: Tuple[core.AbstractValue,
         f"compiling a primitive computation `{prim}` that requires {nreps} "
         f"replicas, but only {xb.device_count(backend)} XLA devices are "
         f"available on backend {backend.platform}.")
-  built_c = primitive_computation(prim, AxisEnv(nreps), backend, tuple_args,
-                                  *avals, **params)
+  with profiler.phase("lower", prim.name):
+    built_c = primitive_computation(prim, AxisEnv(nreps), backend, tuple_args,
+                                    *avals, **params)
   options = xb.get_compile_options(
       num_replicas=nreps,
       num_partitions=1,
       device_assignment=device and (device.id,))
   options.tuple_arguments = tuple_args
-  compiled = backend.compile(built_c, compile_options=options)
+  with profiler.phase("compile", prim.name):
+    compiled = backend.compile(built_c, compile_options=options)
   if nreps == 1:
     return partial(_execute_compiled_primitive, prim, compiled, handle_result)
   else:
     return partial(_execute_replicated_primitive, prim, compiled, handle_result)
 
+@cache()
+def xla_fused_primitive_callable(prim, lexprs: Tuple[Optional[lazy.LazyExpr], ...],
+                                  *arg_specs: Tuple[core.AbstractValue,
+                                                    Optional[Device]], **params):
+  """Like `xla_primitive_callable`, but the arguments with lazy expressions in
+  `lexprs` are passed as their underlying buffers, and the expressions are
+  evaluated inside the computation."""
+  avals, arg_devices = unzip2(arg_specs)
+  device = _device_from_arg_devices(arg_devices)
+  backend = xb.get_device_backend(device)
+  aval_out = prim.abstract_eval(*avals, **params)
+  handle_result = _primitive_result_handler(prim, device, aval_out)
+  tuple_args = len(avals) > 100
+  with profiler.phase("lower", prim.name):
+    built_c = fused_primitive_computation(prim, lexprs, AxisEnv(1), backend,
+                                          tuple_args, *avals, **params)
+  options = xb.get_compile_options(
+      num_replicas=1,
+      num_partitions=1,
+      device_assignment=device and (device.id,))
+  options.tuple_arguments = tuple_args
+  with profiler.phase("compile", prim.name):
+    compiled = backend.compile(built_c, compile_options=options)
+  return partial(_execute_fused_primitive, prim, compiled, handle_result,
+                 lexprs)
+
 def _device_from_arg_devices(devices: Sequence[Optional[Device]]) -> Optional[Device]:
   """Given devices of inputs, determine where to perform a computation.
 
@@ -230,12 +323,28 @@ def _device_from_arg_devices(devices: Sequence[Optional[Device]]) -> Optional[De
 
 @cache()
 def primitive_computation(prim, axis_env, backend, tuple_args, *avals, **params):
+  return _primitive_computation(prim, axis_env, backend, tuple_args, avals,
+                                None, params)
+
+@cache()
+def fused_primitive_computation(prim, lexprs, axis_env, backend, tuple_args,
+                                *avals, **params):
+  return _primitive_computation(prim, axis_env, backend, tuple_args, avals,
+                                lexprs, params)
+
+def _primitive_computation(prim, axis_env, backend, tuple_args, avals, lexprs,
+                           params):
   c = xb.make_computation_builder(f"primitive_computation_{prim.name}")
   c.SetOpMetadata(xc.OpMetadata(
       op_type=prim.name,
       op_name=str(pp_eqn_compact(prim.name, params))))
   platform = xb.get_backend(backend).platform
-  xla_args = _xla_callable_args(c, avals, tuple_args)
+  if lexprs is None:
+    xla_args = _xla_callable_args(c, avals, tuple_args)
+  else:
+    base_avals = map(_lazy_base_aval, avals, lexprs)
+    xla_args = map(partial(lazy.stage_lexpr, c), lexprs,
+                   _xla_callable_args(c, base_avals, tuple_args))
   # return val always set as a side-effect on c
   if prim in backend_specific_translations[platform]:
     rule = backend_specific_translations[platform][prim]
@@ -264,20 +373,41 @@ def primitive_subcomputation(prim, *avals, **params):
 
 def _execute_compiled_primitive(prim, compiled, result_handler, *args):
   device, = compiled.local_devices()
-  input_bufs = [device_put(x, device) for x in args if x is not token]
-  out_bufs = compiled.Execute(input_bufs)
+  with profiler.phase("transfer", prim.name):
+    input_bufs = [device_put(x, device) for x in args if x is not token]
+  with profiler.phase("execute", prim.name):
+    out_bufs = _relieving_memory_pressure(device, compiled.Execute,
+                                          input_bufs)
+  if FLAGS.jax_debug_nans:
+    check_nans(prim, out_bufs)
+  with profiler.phase("result", prim.name):
+    return result_handler(out_bufs if prim.multiple_results else out_bufs[0])
+
+def _execute_fused_primitive(prim, compiled, result_handler, lexprs, *args):
+  device, = compiled.local_devices()
+  with profiler.phase("transfer", prim.name):
+    input_bufs = [device_put(x, device) if lexpr is None
+                  else _copy_device_array_to_device(x, device).device_buffer
+                  for x, lexpr in zip(args, lexprs) if x is not token]
+  with profiler.phase("execute", prim.name):
+    out_bufs = _relieving_memory_pressure(device, compiled.Execute,
+                                          input_bufs)
   if FLAGS.jax_debug_nans:
     check_nans(prim, out_bufs)
-  return result_handler(out_bufs if prim.multiple_results else out_bufs[0])
+  with profiler.phase("result", prim.name):
+    return result_handler(out_bufs if prim.multiple_results else out_bufs[0])
 
 def _execute_replicated_primitive(prim, compiled, result_handler, *args):
-  input_bufs = [
-      [device_put(x, device) for x in args if x is not token]
-      for device in compiled.local_devices()]
-  out_buf = compiled.ExecuteOnLocalDevices(input_bufs)[0]
+  with profiler.phase("transfer", prim.name):
+    input_bufs = [
+        [device_put(x, device) for x in args if x is not token]
+        for device in compiled.local_devices()]
+  with profiler.phase("execute", prim.name):
+    out_buf = compiled.ExecuteOnLocalDevices(input_bufs)[0]
   if not prim.multiple_results:
     out_buf, = out_buf
-  return result_handler(out_buf)
+  with profiler.phase("result", prim.name):
+    return result_handler(out_buf)
 
 def check_nans(prim, bufs):
   for buf in bufs:
@@ -481,9 +611,37 @@ def _xla_callable(fun: lu.WrappedFun, device, backend, name, *arg_specs):
 
   abstract_args, arg_devices = unzip2(arg_specs)
   pvals: Sequence[pe.PartialVal] = [pe.PartialVal.unknown(aval) for aval in abstract_args]
-  jaxpr, pvals, consts = pe.trace_to_jaxpr(
-      fun, pvals, instantiate=False, stage_out=True, bottom=True)
+  with profiler.phase("trace", fun.__name__):
+    jaxpr, pvals, consts = pe.trace_to_jaxpr(
+        fun, pvals, instantiate=False, stage_out=True, bottom=True)
+  return _xla_compile_jaxpr(jaxpr, pvals, consts, fun.__name__, device,
+                            backend, name, abstract_args, arg_devices)
 
+@cache()
+def jaxpr_callable(typed_jaxpr: core.TypedJaxpr, device, backend, name,
+                   *arg_specs):
+  """Compiles a closed jaxpr for the given argument specs, without tracing.
+
+  This is the counterpart of `_xla_callable` for programs that are already
+  available as jaxprs, e.g. because they were deserialized.
+  """
+  if device is not None and backend is not None:
+    raise ValueError("can't specify both a device and a backend for jit, "
+                     "got device={} and backend={}".format(device, backend))
+
+  abstract_args, arg_devices = unzip2(arg_specs)
+  expected = [a.strip_weak_type() for a in typed_jaxpr.in_avals]
+  actual = [raise_to_shaped(a).strip_weak_type() for a in abstract_args]
+  if expected != actual:
+    raise TypeError("jaxpr {} expects arguments of types {}, got {}."
+                    .format(name, expected, actual))
+  pvals = [pe.PartialVal.unknown(aval) for aval in typed_jaxpr.out_avals]
+  return _xla_compile_jaxpr(typed_jaxpr.jaxpr, pvals, typed_jaxpr.literals,
+                            name, device, backend, name, abstract_args,
+                            arg_devices)
+
+def _xla_compile_jaxpr(jaxpr, pvals, consts, fun_name, device, backend, name,
+                       abstract_args, arg_devices):
   _map(prefetch, it.chain(consts, jaxpr_literals(jaxpr)))
 
   nreps = jaxpr_replicas(jaxpr)
@@ -498,7 +656,7 @@ def _xla_callable(fun: lu.WrappedFun, device, backend, name, *arg_specs):
     return partial(_execute_trivial, jaxpr, device, consts, result_handlers)
 
   log_priority = logging.WARNING if FLAGS.jax_log_compiles else logging.DEBUG
-  logging.log(log_priority, "Compiling %s for args %s.", fun.__name__, abstract_args)
+  logging.log(log_priority, "Compiling %s for args %s.", fun_name, abstract_args)
 
   if nreps > xb.device_count(backend):
     raise ValueError(
@@ -512,13 +670,14 @@ def _xla_callable(fun: lu.WrappedFun, device, backend, name, *arg_specs):
 
   tuple_args = len(abstract_args) > 100  # pass long arg lists as tuple for TPU
 
-  c = xb.make_computation_builder("jit_{}".format(fun.__name__))
-  xla_consts = _map(partial(xb.constant, c), consts)
-  xla_args = _xla_callable_args(c, abstract_args, tuple_args)
-  out_nodes = jaxpr_subcomp(
-      c, jaxpr, backend, AxisEnv(nreps, (), ()), xla_consts,
-      extend_name_stack(wrap_name(name, 'jit')), *xla_args)
-  built = c.Build(xops.Tuple(c, out_nodes))
+  with profiler.phase("lower", fun_name):
+    c = xb.make_computation_builder("jit_{}".format(fun_name))
+    xla_consts = _map(partial(xb.constant, c), consts)
+    xla_args = _xla_callable_args(c, abstract_args, tuple_args)
+    out_nodes = jaxpr_subcomp(
+        c, jaxpr, backend, AxisEnv(nreps, (), ()), xla_consts,
+        extend_name_stack(wrap_name(name, 'jit')), *xla_args)
+    built = c.Build(xops.Tuple(c, out_nodes))
 
   options = xb.get_compile_options(
       num_replicas=nreps,
@@ -526,12 +685,13 @@ def _xla_callable(fun: lu.WrappedFun, device, backend, name, *arg_specs):
       device_assignment=(device.id,) if device else None)
   options.tuple_arguments = tuple_args
   backend = xb.get_backend(backend)
-  compiled = backend.compile(built, compile_options=options)
+  with profiler.phase("compile", fun_name):
+    compiled = backend.compile(built, compile_options=options)
 
   if nreps == 1:
-    return partial(_execute_compiled, compiled, result_handlers)
+    return partial(_execute_compiled, fun_name, compiled, result_handlers)
   else:
-    return partial(_execute_replicated, compiled, result_handlers)
+    return partial(_execute_replicated, fun_name, compiled, result_handlers)
 
 def _xla_callable_device(nreps, backend, device, arg_devices):
   if nreps > 1:
@@ -572,20 +732,27 @@ def _pval_to_result_handler(device, pval):
   else:
     return aval_to_result_handler(device, pv)
 
-def _execute_compiled(compiled, handlers, *args):
+def _execute_compiled(name, compiled, handlers, *args):
   device, = compiled.local_devices()
-  input_bufs = [device_put(x, device) for x in args if x is not token]
-  out_bufs = compiled.Execute(input_bufs)
+  with profiler.phase("transfer", name):
+    input_bufs = [device_put(x, device) for x in args if x is not token]
+  with profiler.phase("execute", name):
+    out_bufs = _relieving_memory_pressure(device, compiled.Execute,
+                                          input_bufs)
   if FLAGS.jax_debug_nans: check_nans(xla_call_p, out_bufs)
-  return [handler(out_buf) for handler, out_buf in zip(handlers, out_bufs)]
-
-def _execute_replicated(compiled, handlers, *args):
-  input_bufs = [
-      [device_put(x, device) for x in args if x is not token]
-      for device in compiled.local_devices()]
-  out_bufs = compiled.ExecuteOnLocalDevices(input_bufs)[0]
+  with profiler.phase("result", name):
+    return [handler(out_buf) for handler, out_buf in zip(handlers, out_bufs)]
+
+def _execute_replicated(name, compiled, handlers, *args):
+  with profiler.phase("transfer", name):
+    input_bufs = [
+        [device_put(x, device) for x in args if x is not token]
+        for device in compiled.local_devices()]
+  with profiler.phase("execute", name):
+    out_bufs = compiled.ExecuteOnLocalDevices(input_bufs)[0]
   if FLAGS.jax_debug_nans: check_nans(xla_call_p, out_bufs)
-  return [handler(out_buf) for handler, out_buf in zip(handlers, out_bufs)]
+  with profiler.phase("result", name):
+    return [handler(out_buf) for handler, out_buf in zip(handlers, out_bufs)]
 
 def _execute_trivial(jaxpr, device: Optional[Device], consts, handlers, *args):
   env = {core.unitvar: core.unit}
@@ -743,6 +910,25 @@ class DeviceValue(object):
     self.device_buffer.block_host_until_ready()
     return self
 
+_jax_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+_creation_sites: Dict[int, Tuple[Any, str]] = {}
+
+def record_creation_site(x):
+  """Records the innermost frame outside of JAX as the creation site of `x`."""
+  frame = sys._getframe(1)
+  while frame.f_back is not None and frame.f_code.co_filename.startswith(_jax_dir):
+    frame = frame.f_back
+  code = frame.f_code
+  site = "{}:{} ({})".format(code.co_filename, frame.f_lineno, code.co_name)
+  key = id(x)
+  ref = weakref.ref(x, lambda _: _creation_sites.pop(key, None))
+  _creation_sites[key] = (ref, site)
+
+def creation_site(x) -> Optional[str]:
+  """The creation site of `x`, if the jax_array_creation_sites flag was set."""
+  ref, site = _creation_sites.get(id(x), (None, None))
+  return site if ref is not None and ref() is x else None
+
 def _forward_method(attrname, self, fun, *args):
   return fun(getattr(self, attrname), *args)
 _forward_to_value = partial(_forward_method, "_value")
@@ -762,6 +948,11 @@ class DeviceArray(DeviceValue):
     self._lazy_expr = lazy_expr
 
     self._npy_value = None
+    if FLAGS.jax_array_creation_sites:
+      record_creation_site(self)
+    if (memory_manager is not None and lazy.is_trivial(lazy_expr) and
+        type(device_buffer) is not DeviceConstant):
+      memory_manager.track(self)
     if not core.skip_checks:
       assert type(aval) is ShapedArray
       npy_value = self._value
@@ -775,7 +966,7 @@ class DeviceArray(DeviceValue):
       if is_device_constant(self):
         self._npy_value = lazy.eval_lexpr(self._lazy_expr, None)
       else:
-        self._npy_value = _force(self).device_buffer.to_py()
+        self._npy_value = _buffer_to_py(_force(self).device_buffer)
       self._npy_value.flags.writeable = False
     return self._npy_value
 
@@ -805,6 +996,28 @@ class DeviceArray(DeviceValue):
     if self._npy_value is None and not is_device_constant(self):
       self.device_buffer.copy_to_host_async()
 
+  def to_host_future(self) -> concurrent.futures.Future:
+    """Starts copying the value to the host without waiting for it.
+
+    Returns a `concurrent.futures.Future` resolving to the value as a read-only
+    ndarray, like `onp.asarray(self)`. The caller can go on dispatching work
+    while the value is computed and transferred. In a coroutine, the future can
+    be awaited with `await asyncio.wrap_future(x.to_host_future())`.
+    """
+    self._check_if_deleted()
+    if self._npy_value is not None or is_device_constant(self):
+      return _completed_future(self._value)
+    buf = _force(self).device_buffer
+    buf.copy_to_host_async()
+    return host_read_executor().submit(self._finish_host_read, buf)
+
+  def _finish_host_read(self, buf):
+    value = _buffer_to_py(buf)
+    value.flags.writeable = False
+    if self._npy_value is None:
+      self._npy_value = value
+    return self._npy_value
+
   def delete(self):
     """Deletes the device array and any cached copy on the host.
 
@@ -909,6 +1122,69 @@ class DeviceConstant(object):
 def is_device_constant(x):
   return type(x) is DeviceArray and type(x.device_buffer) is DeviceConstant
 
+class SpilledBuffer(object):
+  """Stands in for the device buffer of a DeviceArray spilled to the host.
+
+  The value is put back on the device the next time it's used by a computation.
+  DeviceArrays sharing the spilled buffer, like lazy transposes of it, share
+  the reloaded buffer too.
+  """
+  __slots__ = ["npy_value", "_device", "_buffer"]
+  def __init__(self, npy_value, device):
+    self.npy_value = npy_value
+    self._device = device
+    self._buffer = None
+  def device(self): return self._device
+  def platform(self): return self._device.platform
+  def to_py(self): return self.npy_value
+  def copy_to_host_async(self): pass
+  def block_host_until_ready(self): pass
+  def delete(self): self.npy_value = self._buffer = None
+  def reload(self) -> PyLocalBuffer:
+    if self._buffer is None:
+      self._buffer = _device_put_array(self.npy_value, self._device)
+    return self._buffer
+
+# The memory manager of jax.experimental.host_offload, if it's enabled. It's
+# told when DeviceArrays are created, used and reloaded, and asked to free
+# device memory when an allocation fails.
+memory_manager: Any = None
+
+def spill_to_host(x: DeviceArray):
+  """Frees the device buffer of `x`, keeping its value in host memory."""
+  x._check_if_deleted()
+  if type(x.device_buffer) is not SpilledBuffer and not is_device_constant(x):
+    device = x.device_buffer.device()
+    value = x._value  # copies the value to the host, if it isn't there yet
+    x.device_buffer = SpilledBuffer(value, device)
+
+def _reload_if_spilled(x: DeviceArray):
+  if type(x.device_buffer) is SpilledBuffer:
+    spilled = x.device_buffer
+    x.device_buffer = spilled.reload()
+    if memory_manager is not None:
+      memory_manager.reloaded(x, spilled)
+
+def _is_out_of_memory(err: RuntimeError) -> bool:
+  msg = str(err)
+  return ('RESOURCE_EXHAUSTED' in msg or 'Resource exhausted' in msg or
+          'Out of memory' in msg)
+
+def _relieving_memory_pressure(device, fun, *args):
+  """Calls `fun(*args)`, which allocates memory on `device`.
+
+  If it fails for lack of device memory and the memory manager is enabled,
+  the manager spills arrays from `device` to the host and the call is retried,
+  until it succeeds or there's nothing left to spill.
+  """
+  while True:
+    try:
+      return fun(*args)
+    except RuntimeError as err:
+      if (memory_manager is None or not _is_out_of_memory(err) or
+          not memory_manager.relieve_pressure(device)):
+        raise
+
 core.literalable_types.add(DeviceArray)
 core.pytype_aval_mappings[DeviceArray] = ConcreteArray
 pytype_aval_mappings[DeviceArray] = op.attrgetter('aval')
@@ -923,11 +1199,14 @@ def _device_array_constant_handler(c, val, canonicalize_types=True):
 xb.register_constant_handler(DeviceArray, _device_array_constant_handler)
 
 def _device_put_device_array(x: DeviceArray, device: Optional[Device]):
+  if memory_manager is not None:
+    memory_manager.touch(x)
   x = _copy_device_array_to_device(x, device)
   return _force(x).device_buffer
 device_put_handlers[DeviceArray] = _device_put_device_array
 
 def _copy_device_array_to_device(x: DeviceArray, device: Optional[xc.Device]) -> DeviceArray:
+  _reload_if_spilled(x)
   if device is None:
     # no copying to be done because there's no target specified
     return x
@@ -952,6 +1231,7 @@ def _copy_device_array_to_device(x: DeviceArray, device: Optional[xc.Device]) ->
   return DeviceArray(x.aval, device, x._lazy_expr, moved_buf)
 
 def _force(x: DeviceArray) -> DeviceArray:
+  _reload_if_spilled(x)
   if lazy.is_trivial(x._lazy_expr):
     return x
   else:
@@ -964,6 +1244,22 @@ def _force(x: DeviceArray) -> DeviceArray:
     result = force_fun(x)
     return DeviceArray(x.aval, x._device, lazy.array(x.aval.shape), result)
 
+def lazy_view(aval, x: DeviceArray, lexpr: lazy.LazyExpr) -> DeviceArray:
+  """A DeviceArray with value `lexpr` over the buffer of `x`.
+
+  The result is forced into a buffer of its own if keeping it lazy would nest
+  the expression too deeply or keep alive a much larger buffer.
+  """
+  out = DeviceArray(aval, x._device, lexpr, x.device_buffer)
+  return _force(out) if lazy.should_force(lexpr) else out
+
+def _lazy_base_aval(aval, lexpr: Optional[lazy.LazyExpr]):
+  """The aval of the buffer of a DeviceArray with `aval` and `lexpr`."""
+  if lexpr is None:
+    return aval
+  return ShapedArray(lazy.array_var_shape(lexpr),
+                     lazy.array_var_dtype(lexpr, aval.dtype))
+
 @cache()
 def _lazy_force_computation(aval: core.ShapedArray,
                             device: Device, lexpr: lazy.LazyExpr
@@ -972,11 +1268,7 @@ def _lazy_force_computation(aval: core.ShapedArray,
   if lazy.is_constant(lexpr):
     param = None
   else:
-    idxs = [(src, dst) for dst, src in enumerate(lexpr.dims) if src is not None]
-    param_shape = [None] * len(idxs)
-    for src, dst in idxs:
-      param_shape[src] = aval.shape[dst]
-    param = xb.parameter(c, 0, xc.Shape.array_shape(aval.dtype, param_shape))
+    param = xb.parameter(c, 0, aval_to_xla_shape(_lazy_base_aval(aval, lexpr)))
   xla_out = lazy.stage_lexpr(c, lexpr, param)
   built_c = c.Build(xla_out)
 
@@ -1008,7 +1300,19 @@ def _device_put_impl(x, device: Optional[Device] = None):
     raise TypeError(
         f"Argument '{x}' of type {type(x)} is not a valid JAX type") from err
   handler = aval_to_result_handler(device, a)  # type: ignore[arg-type]
-  return handler(device_put(x, device))
+  if type(x) is onp.ndarray and FLAGS.jax_cpu_zero_copy:
+    x = canonicalize_dtype(x)
+    with profiler.phase("transfer", "device_put"):
+      buf, aliased = _device_put_array_maybe_aliased(x, device)
+    out = handler(buf)
+    if aliased:
+      # Reading the value back is a view of the memory shared with `x`.
+      out._npy_value = x.view()
+      out._npy_value.flags.writeable = False
+    return out
+  with profiler.phase("transfer", "device_put"):
+    buf = device_put(x, device)
+  return handler(buf)
 
 device_put_p = core.Primitive('device_put')
 device_put_p.def_impl(_device_put_impl)
@@ -1017,6 +1321,150 @@ ad.deflinear(device_put_p, lambda cotangent, **kwargs: [cotangent])
 masking.defvectorized(device_put_p)
 
 
+# Arrays of at most this many bytes are packed into one buffer per dtype and
+# device by `device_put_many` and `device_get_many`, so that many small arrays
+# take a single transfer.
+_TRANSFER_BATCH_MAX_BYTES = 1 << 20
+
+def device_put_many(xs: Sequence[Any], device: Optional[Device] = None
+                    ) -> List[Any]:
+  """Like `[device_put_p.bind(x, device=device) for x in xs]`, in fewer transfers.
+
+  Small numpy arrays of the same dtype are concatenated on the host, transferred
+  as one buffer, and split into separate arrays again on the device.
+  """
+  groups = defaultdict(list)
+  for i, x in enumerate(xs):
+    if (type(x) in array_types and x.dtype.kind in 'biufc' and
+        x.nbytes <= _TRANSFER_BATCH_MAX_BYTES):
+      groups[dtypes.canonicalize_dtype(x.dtype)].append(i)
+
+  out = [None] * len(xs)
+  for dtype, idxs in groups.items():
+    if len(idxs) < 2:
+      continue
+    shapes = tuple(onp.shape(xs[i]) for i in idxs)
+    packed = onp.concatenate([onp.ravel(xs[i]).astype(dtype, copy=False)
+                              for i in idxs])
+    with profiler.phase("transfer", "device_put"):
+      packed_buf = _device_put_array(packed, device)
+    unpack = _unpack_computation(dtype, shapes, packed_buf.device())
+    for i, shape, buf in zip(idxs, shapes, unpack(packed_buf)):
+      out[i] = aval_to_result_handler(device, ShapedArray(shape, dtype))(buf)
+  return [device_put_p.bind(x, device=device) if y is None else y
+          for x, y in zip(xs, out)]
+
+@cache()
+def _unpack_computation(dtype, shapes: Tuple[Tuple[int, ...], ...],
+                        device: Device) -> Callable[[PyLocalBuffer], List]:
+  c = xb.make_computation_builder("unpack")
+  sizes = [prod(shape) for shape in shapes]
+  packed = xb.parameter(c, 0, xc.Shape.array_shape(dtype, (sum(sizes),)))
+  outs = []
+  for shape, start in zip(shapes, onp.cumsum([0] + sizes[:-1])):
+    start = int(start)
+    part = xops.Slice(packed, [start], [start + prod(shape)], [1])
+    outs.append(xops.Reshape(part, shape))
+  built_c = c.Build(xops.Tuple(c, outs))
+  compiled = _compile_on_device(built_c, device)
+  return lambda buf: compiled.Execute([buf])
+
+def device_get_many(xs: Sequence[Any]) -> List[Any]:
+  """Like `[x.copy() for x in xs]` for DeviceArrays, in fewer transfers.
+
+  Small arrays on the same device and of the same dtype are concatenated by one
+  computation on the device, transferred as one buffer, and split into separate
+  arrays again on the host. Tracers and Python scalars are returned unchanged.
+  """
+  return start_device_get_many(xs)()
+
+def start_device_get_many(xs: Sequence[Any]) -> Callable[[], List[Any]]:
+  """Starts `device_get_many(xs)`, returning a function that finishes it.
+
+  Everything that dispatches work to a device, i.e. packing small arrays and
+  forcing lazy ones, is done before returning and the transfers to the host are
+  started; the returned function only waits for them, so it can be called from
+  another thread.
+  """
+  xs = list(xs)
+  groups = defaultdict(list)
+  for i, x in enumerate(xs):
+    if (type(x) is DeviceArray and x._npy_value is None and
+        not is_device_constant(x) and
+        x.size * x.dtype.itemsize <= _TRANSFER_BATCH_MAX_BYTES):
+      x._check_if_deleted()
+      groups[(x.device_buffer.device(), x.dtype)].append(i)
+
+  packed_groups = []
+  for (device, dtype), idxs in groups.items():
+    if len(idxs) < 2:
+      continue
+    shapes = tuple(xs[i].shape for i in idxs)
+    pack = _pack_computation(dtype, shapes, device)
+    packed_buf = pack([_force(xs[i]).device_buffer for i in idxs])
+    packed_buf.copy_to_host_async()
+    packed_groups.append((idxs, shapes, packed_buf))
+  packed_idxs = set(i for idxs, _, _ in packed_groups for i in idxs)
+  for i, x in enumerate(xs):
+    if i not in packed_idxs:
+      if (type(x) is DeviceArray and x._npy_value is None and
+          not is_device_constant(x)):
+        x._check_if_deleted()
+        xs[i] = x = _force(x)
+      try:
+        x.copy_to_host_async()
+      except AttributeError:
+        pass
+
+  def finish():
+    for idxs, shapes, packed_buf in packed_groups:
+      packed = packed_buf.to_py()
+      sizes = [prod(shape) for shape in shapes]
+      for i, shape, start in zip(idxs, shapes, onp.cumsum([0] + sizes[:-1])):
+        # Cache the values on the DeviceArrays, as `_value` would.
+        value = packed[start:start + prod(shape)].reshape(shape)
+        value.flags.writeable = False
+        xs[i]._npy_value = value
+    return [x.copy() if hasattr(x, 'copy') and not isinstance(x, core.Tracer)
+            else x for x in xs]
+  return finish
+
+_host_read_executor_: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+def host_read_executor() -> concurrent.futures.ThreadPoolExecutor:
+  """The thread pool waiting for the transfers of asynchronous host reads."""
+  global _host_read_executor_
+  if _host_read_executor_ is None:
+    _host_read_executor_ = concurrent.futures.ThreadPoolExecutor(
+        thread_name_prefix="jax_host_read")
+  return _host_read_executor_
+
+def _completed_future(value) -> concurrent.futures.Future:
+  future: concurrent.futures.Future = concurrent.futures.Future()
+  future.set_result(value)
+  return future
+
+@cache()
+def _pack_computation(dtype, shapes: Tuple[Tuple[int, ...], ...],
+                      device: Device) -> Callable[[List], PyLocalBuffer]:
+  c = xb.make_computation_builder("pack")
+  tuple_args = len(shapes) > 100  # pass long arg lists as tuple for TPU
+  args = _xla_callable_args(c, [ShapedArray(shape, dtype) for shape in shapes],
+                            tuple_args)
+  parts = [xops.Reshape(x, (prod(shape),)) for x, shape in zip(args, shapes)]
+  built_c = c.Build(xops.ConcatInDim(c, parts, 0))
+  compiled = _compile_on_device(built_c, device, tuple_args)
+  return lambda bufs: compiled.Execute(bufs)[0]
+
+def _compile_on_device(built_c, device: Device, tuple_args: bool = False):
+  options = xb.get_compile_options(
+      num_replicas=1,
+      num_partitions=1,
+      device_assignment=(device.id,))
+  options.tuple_arguments = tuple_args
+  return xb.get_device_backend(device).compile(built_c, compile_options=options)
+
+
 def _remat_translation_rule(c, axis_env, in_nodes,
                             name_stack, backend, name, call_jaxpr,
                             device=None, concrete=None):
@@ -45,6 +45,7 @@ from ..interpreters import xla
 from ..interpreters import pxla
 from ..interpreters import ad
 from ..interpreters import batching
+from ..interpreters import cost
 from ..interpreters import masking
 from ..util import curry, cache, safe_zip, unzip2, prod
 from ..tree_util import build_tree, tree_unflatten, tree_map
@@ -1735,6 +1736,7 @@ def unop(result_dtype, accepted_dtypes, name, translation_rule=None):
                             translation_rule=translation_rule)
   batching.defvectorized(prim)
   masking.defvectorized(prim)
+  cost.defelementwise(prim)
   return prim
 standard_unop = partial(unop, _identity)
 _attrgetter = lambda name: lambda x, **kwargs: getattr(x, name)
@@ -1776,6 +1778,7 @@ def naryop(result_dtype, accepted_dtypes, name, translation_rule=None):
                             translation_rule=translation_rule)
   batching.defbroadcasting(prim)
   masking.defnaryop(prim)
+  cost.defelementwise(prim)
   return prim
 standard_naryop = partial(naryop, _input_dtype)
 
@@ -2159,11 +2162,23 @@ def _convert_element_type_transpose_rule(t, *, new_dtype, old_dtype):
   return [convert_element_type_p.bind(t, new_dtype=old_dtype,
                                       old_dtype=new_dtype)]
 
+def _convert_element_type_impl(operand, *, new_dtype, old_dtype):
+  if type(operand) is xla.DeviceArray:
+    lazy_expr = lazy.convert_element_type(operand._lazy_expr, old_dtype,
+                                          new_dtype)
+    aval = ShapedArray(operand.shape, new_dtype)
+    return xla.lazy_view(aval, operand, lazy_expr)
+  else:
+    return xla.apply_primitive(convert_element_type_p, operand,
+                               new_dtype=new_dtype, old_dtype=old_dtype)
+
 convert_element_type_p = standard_primitive(
     _convert_element_type_shape_rule, _convert_element_type_dtype_rule,
     'convert_element_type', _convert_element_type_translation_rule)
+convert_element_type_p.def_impl(_convert_element_type_impl)
 ad.deflinear(convert_element_type_p, _convert_element_type_transpose_rule)
 batching.defvectorized(convert_element_type_p)
+cost.defelementwise(convert_element_type_p)
 masking.defvectorized(convert_element_type_p)
 
 
@@ -2182,6 +2197,7 @@ bitcast_convert_type_p = standard_primitive(
     'bitcast_convert_type', _bitcast_convert_type_translation_rule)
 ad.defjvp_zero(bitcast_convert_type_p)
 batching.defvectorized(bitcast_convert_type_p)
+cost.defnoop(bitcast_convert_type_p)
 masking.defvectorized(bitcast_convert_type_p)
 
 
@@ -2439,6 +2455,16 @@ ad.defbilinear(conv_general_dilated_p,
 batching.primitive_batchers[conv_general_dilated_p] = \
     _conv_general_dilated_batch_rule
 
+def _conv_general_dilated_cost_rule(in_avals, out_avals, *, dimension_numbers,
+                                    **unused_kwargs):
+  # Each output element is a dot product over one kernel's worth of
+  # input-feature and spatial elements; padding is counted as real work.
+  _, rhs = in_avals
+  out, = out_avals
+  kernel_size = prod(rhs.shape) // rhs.shape[dimension_numbers.rhs_spec[0]]
+  return cost.memory_cost(in_avals, out_avals, 2 * prod(out.shape) * kernel_size)
+cost.cost_rules[conv_general_dilated_p] = _conv_general_dilated_cost_rule
+
 
 def _reshape_axis_into(src, dst, x):
   perm = [i for i in range(x.ndim) if i != src]
@@ -2614,6 +2640,16 @@ ad.defbilinear(dot_general_p,
 batching.primitive_batchers[dot_general_p] = _dot_general_batch_rule
 masking.masking_rules[dot_general_p] = _dot_general_masking_rule
 
+def _dot_general_cost_rule(in_avals, out_avals, *, dimension_numbers,
+                           precision):
+  lhs, _ = in_avals
+  out, = out_avals
+  (lhs_contract, _), _ = dimension_numbers
+  contracted_size = prod(onp.take(lhs.shape, lhs_contract))
+  return cost.memory_cost(in_avals, out_avals,
+                          2 * prod(out.shape) * contracted_size)
+cost.cost_rules[dot_general_p] = _dot_general_cost_rule
+
 
 def _broadcast_shape_rule(operand, sizes):
   _check_shapelike('broadcast', 'sizes', sizes)
@@ -2629,6 +2665,7 @@ broadcast_p = standard_primitive(
     _broadcast_shape_rule, _input_dtype, 'broadcast')
 ad.deflinear(broadcast_p, lambda t, sizes: [_reduce_sum(t, range(len(sizes)))])
 batching.primitive_batchers[broadcast_p] = _broadcast_batch_rule
+cost.defmemory(broadcast_p)
 
 def _broadcast_in_dim_impl(operand, *, shape, broadcast_dimensions):
   if type(operand) is xla.DeviceArray:
@@ -2692,6 +2729,7 @@ broadcast_in_dim_p = standard_primitive(
 broadcast_in_dim_p.def_impl(_broadcast_in_dim_impl)
 ad.deflinear(broadcast_in_dim_p, _broadcast_in_dim_transpose_rule)
 batching.primitive_batchers[broadcast_in_dim_p] = _broadcast_in_dim_batch_rule
+cost.defmemory(broadcast_in_dim_p)
 
 
 def _clamp_shape_rule(min, operand, max):
@@ -2716,6 +2754,7 @@ ad.defjvp(clamp_p,
                  g, _zeros(operand)),
           lambda g, min, operand, max:
           select(lt(max, operand), _brcast(g, operand), _zeros(operand)))
+cost.defelementwise(clamp_p, 2)
 
 
 def _concatenate_shape_rule(*operands, **kwargs):
@@ -2783,6 +2822,7 @@ concatenate_p = standard_primitive(
 ad.deflinear(concatenate_p, _concatenate_transpose_rule)
 ad.primitive_transposes[concatenate_p] = _concatenate_transpose_rule
 batching.primitive_batchers[concatenate_p] = _concatenate_batch_rule
+cost.defmemory(concatenate_p)
 
 
 def _pad_dtype_rule(operand, padding_value, *, padding_config):
@@ -2836,6 +2876,7 @@ pad_p = standard_primitive(_pad_shape_rule, _pad_dtype_rule, 'pad',
 ad.deflinear(pad_p, _pad_transpose)
 ad.primitive_transposes[pad_p] = _pad_transpose
 batching.primitive_batchers[pad_p] = _pad_batch_rule
+cost.defmemory(pad_p)
 
 
 # We have a nonstandard reshape impl so that we can be lazy about data movement.
@@ -2847,6 +2888,10 @@ def _reshape_impl(operand, *, new_sizes, dimensions):
       aval = ShapedArray(new_sizes, operand.dtype)
       lazy_expr = lazy.broadcast(operand._lazy_expr, new_sizes, bcast_dims)
       return xla.DeviceArray(aval, operand._device, lazy_expr, operand.device_buffer)
+    _reshape_shape_rule(operand, new_sizes=new_sizes, dimensions=dimensions)
+    lazy_expr = lazy.reshape(operand._lazy_expr, new_sizes)
+    aval = ShapedArray(lazy_expr.shape, operand.dtype)
+    return xla.lazy_view(aval, operand, lazy_expr)
 
   if type(operand) is pxla.ShardedDeviceArray and dimensions is None:
     array = _reshape_sharded_device_array(operand, new_sizes, old_sizes)
@@ -2972,6 +3017,7 @@ reshape_p = standard_primitive(_reshape_shape_rule, _reshape_dtype_rule,
 reshape_p.def_impl(_reshape_impl)
 ad.deflinear2(reshape_p, _reshape_transpose_rule)
 batching.primitive_batchers[reshape_p] = _reshape_batch_rule
+cost.defmemory(reshape_p)
 
 
 def _rev_shape_rule(operand, *, dimensions):
@@ -2991,9 +3037,20 @@ def _rev_batch_rule(batched_args, batch_dims, *, dimensions):
   new_dimensions = [i + 1 if i >= bdim else i for i in dimensions]
   return rev(operand, new_dimensions), bdim
 
+def _rev_impl(operand, *, dimensions):
+  if type(operand) is xla.DeviceArray:
+    _rev_shape_rule(operand, dimensions=dimensions)
+    lazy_expr = lazy.rev(operand._lazy_expr, dimensions)
+    aval = ShapedArray(operand.shape, operand.dtype)
+    return xla.lazy_view(aval, operand, lazy_expr)
+  else:
+    return xla.apply_primitive(rev_p, operand, dimensions=dimensions)
+
 rev_p = standard_primitive(_rev_shape_rule, _input_dtype, 'rev')
+rev_p.def_impl(_rev_impl)
 ad.deflinear(rev_p, lambda t, dimensions: [rev(t, dimensions)])
 batching.primitive_batchers[rev_p] = _rev_batch_rule
+cost.defmemory(rev_p)
 
 
 def _transpose_impl(operand, *, permutation):
@@ -3026,6 +3083,7 @@ transpose_p.def_impl(_transpose_impl)
 ad.deflinear(transpose_p,
              lambda t, permutation: [transpose(t, onp.argsort(permutation))])
 batching.primitive_batchers[transpose_p] = _transpose_batch_rule
+cost.defmemory(transpose_p)
 
 
 def _select_shape_rule(pred, on_true, on_false):
@@ -3101,6 +3159,7 @@ ad.defjvp(select_p,
           lambda g, b, x, y: select(b, _zeros(g), g))
 ad.primitive_transposes[select_p] = _select_transpose_rule
 batching.primitive_batchers[select_p] = _select_batch_rule
+cost.defelementwise(select_p)
 
 
 def _slice_shape_rule(operand, *, start_indices, limit_indices, strides):
@@ -3182,10 +3241,24 @@ def _slice_batching_rule(batched_args, batch_dims, *, start_indices,
   out = slice(operand, new_start_indices, new_limit_indices, new_strides)
   return out, bdim
 
+def _slice_impl(operand, *, start_indices, limit_indices, strides):
+  if type(operand) is xla.DeviceArray:
+    _slice_shape_rule(operand, start_indices=start_indices,
+                      limit_indices=limit_indices, strides=strides)
+    lazy_expr = lazy.slice(operand._lazy_expr, start_indices, limit_indices,
+                           strides or (1,) * len(start_indices))
+    aval = ShapedArray(lazy_expr.shape, operand.dtype)
+    return xla.lazy_view(aval, operand, lazy_expr)
+  else:
+    return xla.apply_primitive(slice_p, operand, start_indices=start_indices,
+                               limit_indices=limit_indices, strides=strides)
+
 slice_p = standard_primitive(_slice_shape_rule, _input_dtype, 'slice',
                              _slice_translation_rule)
+slice_p.def_impl(_slice_impl)
 ad.deflinear2(slice_p, _slice_transpose_rule)
 batching.primitive_batchers[slice_p] = _slice_batching_rule
+cost.defmemory(slice_p)
 
 
 def _dynamic_slice_shape_rule(operand, *start_indices, slice_sizes):
@@ -3267,6 +3340,7 @@ dynamic_slice_p = standard_primitive(
 ad.primitive_jvps[dynamic_slice_p] = _dynamic_slice_jvp  # TODO
 ad.primitive_transposes[dynamic_slice_p] = _dynamic_slice_transpose_rule
 batching.primitive_batchers[dynamic_slice_p] = _dynamic_slice_batching_rule
+cost.defmemory(dynamic_slice_p)
 
 
 def _dynamic_update_slice_shape_rule(operand, update, *start_indices):
@@ -3349,6 +3423,7 @@ ad.primitive_transposes[dynamic_update_slice_p] = \
     _dynamic_update_slice_transpose_rule
 batching.primitive_batchers[dynamic_update_slice_p] = \
     _dynamic_update_slice_batching_rule
+cost.defmemory(dynamic_update_slice_p)
 
 
 def _gather_dimensions_proto(indices_shape, dimension_numbers):
@@ -3464,6 +3539,7 @@ ad.defjvp(gather_p, _gather_jvp_rule, None)
 
 ad.primitive_transposes[gather_p] = _gather_transpose_rule
 batching.primitive_batchers[gather_p] = _gather_batching_rule
+cost.defmemory(gather_p)
 
 
 def _scatter_dimensions_proto(indices_shape, dimension_numbers):
@@ -3632,6 +3708,14 @@ ad.primitive_transposes[scatter_add_p] = _scatter_add_transpose_rule
 batching.primitive_batchers[scatter_add_p] = (
   partial(_scatter_batching_rule, scatter_add))
 
+def _scatter_combiner_cost_rule(in_avals, out_avals, **params):
+  # One combiner application per update element; XLA updates in place, so the
+  # untouched part of the operand is not counted as traffic.
+  _, indices, updates = in_avals
+  return cost.memory_cost([indices, updates, updates], [updates],
+                          prod(updates.shape))
+cost.cost_rules[scatter_add_p] = _scatter_combiner_cost_rule
+
 
 scatter_mul_p = standard_primitive(
     _scatter_shape_rule, _scatter_dtype_rule, 'scatter-mul',
@@ -3648,6 +3732,7 @@ ad.defjvp(scatter_mul_p,
 ad.primitive_transposes[scatter_mul_p] = _scatter_mul_transpose_rule
 batching.primitive_batchers[scatter_mul_p] = (
   partial(_scatter_batching_rule, scatter_mul))
+cost.cost_rules[scatter_mul_p] = _scatter_combiner_cost_rule
 
 # TODO(jlebar): Add derivatives.
 scatter_min_p = standard_primitive(
@@ -3655,6 +3740,7 @@ scatter_min_p = standard_primitive(
     _scatter_translation_rule)
 batching.primitive_batchers[scatter_min_p] = (
   partial(_scatter_batching_rule, scatter_min))
+cost.cost_rules[scatter_min_p] = _scatter_combiner_cost_rule
 
 # TODO(jlebar): Add derivatives.
 scatter_max_p = standard_primitive(
@@ -3662,6 +3748,7 @@ scatter_max_p = standard_primitive(
     _scatter_translation_rule)
 batching.primitive_batchers[scatter_max_p] = (
   partial(_scatter_batching_rule, scatter_max))
+cost.cost_rules[scatter_max_p] = _scatter_combiner_cost_rule
 
 
 def _scatter_jvp(primals, tangents, *, update_jaxpr, update_consts,
@@ -3764,6 +3851,7 @@ scatter_p = standard_primitive(
 ad.primitive_jvps[scatter_p] = _scatter_jvp
 batching.primitive_batchers[scatter_p] = (
   partial(_scatter_batching_rule, scatter))
+cost.cost_rules[scatter_p] = _scatter_combiner_cost_rule
 
 
 def _reduce_shape_rule(operand, init_value, *, computation, jaxpr, consts,
@@ -3812,6 +3900,7 @@ def _reducer_masking_rule(prim, identity, padded_vals, logical_shapes,
 reduce_p = standard_primitive(_reduce_shape_rule, _input_dtype, 'reduce',
                                         _reduce_translation_rule)
 batching.primitive_batchers[reduce_p] = _reduce_batch_rule
+cost.defreduction(reduce_p)
 
 
 def _reduce_number_dtype_rule(name, operand, *args, **kw):
@@ -3843,6 +3932,7 @@ reduce_sum_p = standard_primitive(
   'reduce_sum', _reduce_sum_translation_rule)
 ad.deflinear2(reduce_sum_p, _reduce_sum_transpose_rule)
 batching.defreducer(reduce_sum_p)
+cost.defreduction(reduce_sum_p)
 _masking_defreducer(reduce_sum_p,
                     lambda shape, dtype: onp.broadcast_to(onp.array(0, dtype), shape))
 
@@ -3895,6 +3985,7 @@ reduce_prod_p = standard_primitive(
   'reduce_prod', _reduce_prod_translation_rule)
 ad.primitive_jvps[reduce_prod_p] = _reduce_prod_jvp_rule
 batching.defreducer(reduce_prod_p)
+cost.defreduction(reduce_prod_p)
 
 
 def _reduce_chooser_shape_rule(operand, *, axes):
@@ -3922,6 +4013,7 @@ reduce_max_p = standard_primitive(_reduce_op_shape_rule, _input_dtype,
                                   'reduce_max', _reduce_max_translation_rule)
 ad.defjvp2(reduce_max_p, _reduce_chooser_jvp_rule)
 batching.defreducer(reduce_max_p)
+cost.defreduction(reduce_max_p)
 
 
 _reduce_min_translation_rule = partial(
@@ -3930,6 +4022,7 @@ reduce_min_p = standard_primitive(_reduce_op_shape_rule, _input_dtype,
                                   'reduce_min', _reduce_min_translation_rule)
 ad.defjvp2(reduce_min_p, _reduce_chooser_jvp_rule)
 batching.defreducer(reduce_min_p)
+cost.defreduction(reduce_min_p)
 
 
 def _reduce_logical_shape_rule(operand, *, axes):
@@ -3948,6 +4041,7 @@ _reduce_or_translation_rule = partial(_reduce_logical_translation_rule,
 reduce_or_p = standard_primitive(_reduce_logical_shape_rule, _fixed_dtype(onp.bool_),
                                  'reduce_or', _reduce_or_translation_rule)
 batching.defreducer(reduce_or_p)
+cost.defreduction(reduce_or_p)
 
 
 _reduce_and_translation_rule = partial(_reduce_logical_translation_rule,
@@ -3955,6 +4049,7 @@ _reduce_and_translation_rule = partial(_reduce_logical_translation_rule,
 reduce_and_p = standard_primitive(_reduce_logical_shape_rule, _fixed_dtype(onp.bool_),
                                  'reduce_and', _reduce_and_translation_rule)
 batching.defreducer(reduce_and_p)
+cost.defreduction(reduce_and_p)
 
 def _reduce_window_shape_rule(operand, init_value, *, jaxpr, consts,
                               window_dimensions, window_strides, padding):
@@ -3997,6 +4092,14 @@ reduce_window_p = standard_primitive(
     _reduce_window_translation_rule)
 batching.primitive_batchers[reduce_window_p] = _generic_reduce_window_batch_rule
 
+def _windowed_cost_rule(in_avals, out_avals, *, window_dimensions, **params):
+  # One reduction step per window element for every window position, i.e. for
+  # every element of the output.
+  num_windows = cost.aval_size(out_avals[0])
+  return cost.memory_cost(in_avals, out_avals,
+                          num_windows * prod(window_dimensions))
+cost.cost_rules[reduce_window_p] = _windowed_cost_rule
+
 
 def _reduce_window_sum_shape_rule(operand, *, window_dimensions, window_strides,
                                   padding):
@@ -4057,6 +4160,7 @@ reduce_window_sum_p = standard_primitive(
 ad.deflinear2(reduce_window_sum_p, _reduce_window_sum_transpose_rule)
 batching.primitive_batchers[reduce_window_sum_p] = partial(
   _reduce_window_batch_rule, _reduce_window_sum)
+cost.cost_rules[reduce_window_sum_p] = _windowed_cost_rule
 
 def _reduce_window_chooser_translation_rule(
     prim, identity, c, operand, *, window_dimensions, window_strides, padding):
@@ -4110,6 +4214,7 @@ reduce_window_max_p = standard_primitive(
 ad.defjvp(reduce_window_max_p, partial(_reduce_window_chooser_jvp_rule, max_p))
 batching.primitive_batchers[reduce_window_max_p] = partial(
   _reduce_window_batch_rule, _reduce_window_max)
+cost.cost_rules[reduce_window_max_p] = _windowed_cost_rule
 
 _reduce_window_min_translation_rule = partial(
     _reduce_window_chooser_translation_rule, min_p, _get_min_identity)
@@ -4122,6 +4227,7 @@ _reduce_window_min_batch_rule = partial(_reduce_window_batch_rule,
                                         _reduce_window_min)
 batching.primitive_batchers[reduce_window_min_p] = partial(
   _reduce_window_batch_rule, _reduce_window_min)
+cost.cost_rules[reduce_window_min_p] = _windowed_cost_rule
 
 
 def _select_and_scatter_shape_rule(
@@ -4236,6 +4342,16 @@ ad.primitive_jvps[select_and_scatter_add_p] = _select_and_scatter_add_jvp
 batching.primitive_batchers[select_and_scatter_add_p] = \
     _select_and_scatter_add_batch_rule
 
+def _select_and_windowed_cost_rule(in_avals, out_avals, *, window_dimensions,
+                                   **params):
+  # One selection step per window element for every window position. There's
+  # one window position per element of the smallest array: the source of
+  # select_and_scatter_add, and the output of select_and_gather_add.
+  num_windows = builtins.min(map(cost.aval_size, in_avals + out_avals))
+  return cost.memory_cost(in_avals, out_avals,
+                          num_windows * prod(window_dimensions))
+cost.cost_rules[select_and_scatter_add_p] = _select_and_windowed_cost_rule
+
 def _select_and_gather_add_shape_rule(
     tangents, operand, *, select_prim, window_dimensions, window_strides,
     padding):
@@ -4402,6 +4518,7 @@ ad.primitive_transposes[select_and_gather_add_p] = \
   _select_and_gather_add_transpose
 batching.primitive_batchers[select_and_gather_add_p] = \
   _select_and_gather_add_batching_rule
+cost.cost_rules[select_and_gather_add_p] = _select_and_windowed_cost_rule
 xla.backend_specific_translations['tpu'][select_and_gather_add_p] = partial(
   _select_and_gather_add_translation,
   max_bits=32)
@@ -4508,6 +4625,7 @@ xla.backend_specific_translations['tpu'][cumsum_p] = xla.lower_fun(
   partial(_cumred_tpu_translation_rule, _reduce_window_sum, 0),
   multiple_results=False)
 batching.primitive_batchers[cumsum_p] = partial(_cumred_batch_rule, cumsum_p)
+cost.defreduction(cumsum_p)
 
 
 cumprod_p = standard_primitive(
@@ -4518,6 +4636,7 @@ xla.backend_specific_translations['tpu'][cumprod_p] = xla.lower_fun(
   partial(_cumred_tpu_translation_rule, _reduce_window_prod, 1),
   multiple_results=False)
 batching.primitive_batchers[cumprod_p] = partial(_cumred_batch_rule, cumprod_p)
+cost.defreduction(cumprod_p)
 
 sort_shape = lambda operand, dimension: operand.shape
 
@@ -4540,6 +4659,14 @@ sort_p = standard_primitive(sort_shape, _input_dtype, 'sort',
 ad.defjvp(sort_p, _sort_jvp_rule)
 batching.primitive_batchers[sort_p] = _sort_batch_rule
 
+def _sort_cost_rule(in_avals, out_avals, *, dimension):
+  # A comparison sort does O(n log n) comparisons along the sorted dimension.
+  keys = in_avals[0]
+  n = keys.shape[dimension] if keys.shape else 1
+  return cost.memory_cost(in_avals, out_avals,
+                          prod(keys.shape) * _max(1, int(onp.ceil(onp.log2(n)))))
+cost.cost_rules[sort_p] = _sort_cost_rule
+
 def _sort_key_val_abstract_eval(keys, values, *, dimension):
   return raise_to_shaped(keys), raise_to_shaped(values)
 
@@ -4613,6 +4740,7 @@ xla.translations[sort_key_val_p] = _sort_key_val_translation_rule
 ad.primitive_jvps[sort_key_val_p] = _sort_key_val_jvp
 ad.primitive_transposes[sort_key_val_p] = _sort_key_val_transpose_rule
 batching.primitive_batchers[sort_key_val_p] = _sort_key_val_batch_rule
+cost.cost_rules[sort_key_val_p] = _sort_cost_rule
 
 def _top_k_abstract_eval(operand, *, k):
   if k < 0:
@@ -4676,6 +4804,12 @@ xla.translations[top_k_p] = partial(standard_translate, 'top_k')
 ad.primitive_jvps[top_k_p] = _top_k_jvp
 batching.primitive_batchers[top_k_p] = _top_k_batch_rule
 
+def _top_k_cost_rule(in_avals, out_avals, *, k):
+  operand, = in_avals
+  return cost.memory_cost(in_avals, out_avals,
+                          prod(operand.shape) * _max(1, int(onp.ceil(onp.log2(k)))))
+cost.cost_rules[top_k_p] = _top_k_cost_rule
+
 def _tie_in_transpose_rule(t):
   return [ad_util.zero, t]
 
@@ -4690,6 +4824,7 @@ tie_in_p.def_abstract_eval(lambda x, y: raise_to_shaped(y))
 xla.translations[tie_in_p] = lambda c, x, y: y
 ad.deflinear(tie_in_p, _tie_in_transpose_rule)
 batching.primitive_batchers[tie_in_p] = _tie_in_batch_rule
+cost.defnoop(tie_in_p)
 masking.masking_rules[tie_in_p] = lambda vals, logical_shapes: vals[1]
 
 
@@ -4706,6 +4841,7 @@ def _stop_gradient_batch_rule(batched_args, batch_dims):
 xla.translations[ad_util.stop_gradient_p] = lambda c, x: x
 ad.primitive_jvps[ad_util.stop_gradient_p] = _stop_gradient_jvp_rule
 batching.primitive_batchers[ad_util.stop_gradient_p] = _stop_gradient_batch_rule
+cost.defnoop(ad_util.stop_gradient_p)
 
 
 def create_token(x):
@@ -21,6 +21,7 @@ import collections
 import functools
 import itertools
 import operator
+import os
 import threading
 from typing import Callable, Sequence
 
@@ -29,6 +30,7 @@ import numpy as onp
 import jax
 from jax import core
 from jax import dtypes
+from jax.config import flags
 from jax.lax import lax
 from jax import linear_util as lu
 from jax.abstract_arrays import ShapedArray, raise_to_shaped
@@ -38,6 +40,7 @@ from jax.interpreters import ad
 from jax.interpreters import partial_eval as pe
 from jax.interpreters import xla
 from jax.interpreters import batching
+from jax.interpreters import cost
 from jax.interpreters import masking
 from jax.lib import xla_bridge as xb
 from jax.lib import xla_client
@@ -54,6 +57,29 @@ _map = safe_map
 zip = safe_zip
 _reduce = functools.reduce
 
+FLAGS = flags.FLAGS
+flags.DEFINE_enum(
+    'jax_cond_batching', os.getenv('JAX_COND_BATCHING', 'select'),
+    enum_values=['select', 'predicated', 'auto'],
+    help='How vmap handles a cond or while_loop with a batched predicate. '
+         '"select" (the default) runs both branches of a cond on every lane '
+         'and selects between the results, and runs a while_loop body on every '
+         'lane until all predicates are false. "predicated" gathers the lanes '
+         'taking each branch (or still running the loop) into compact chunks '
+         'and only runs the branch on those, at the cost of a sort and some '
+         'gathers and scatters. "auto" picks "predicated" for large batches of '
+         'expensive branches.')
+flags.DEFINE_integer(
+    'jax_predicated_batching_chunks',
+    int(os.getenv('JAX_PREDICATED_BATCHING_CHUNKS', '8')),
+    help='The number of chunks a batch is split into by the "predicated" '
+         'strategy of jax_cond_batching. Each branch runs on at most one more '
+         'chunk than it needs, one chunk at a time.')
+
+# Below these sizes the "auto" strategy of jax_cond_batching uses selects.
+_PREDICATED_MIN_BATCH_SIZE = 64
+_PREDICATED_MIN_FLOPS_PER_LANE = 4096
+
 
 @cache()
 def _initial_style_jaxpr(fun: Callable, in_tree, in_avals):
@@ -96,12 +122,21 @@ def _fori_cond_fun(loop_carry):
   return lax.lt(i, upper)
 
 @cache()
-def _fori_body_fun(body_fun):
+def _fori_body_fun(body_fun, unroll=1):
   def while_body_fun(loop_carry):
     i, upper, x = loop_carry
-    return lax.add(i, lax._const(i, 1)), upper, body_fun(i, x)
+    for _ in range(unroll):
+      x = body_fun(i, x)
+      i = lax.add(i, lax._const(i, 1))
+    return i, upper, x
   return while_body_fun
 
+def _fori_unrolled_cond_fun(unroll):
+  def cond_fun(loop_carry):
+    i, upper, _ = loop_carry
+    return lax.le(lax.add(i, lax._const(i, unroll)), upper)
+  return cond_fun
+
 @cache()
 def _fori_scan_body_fun(body_fun):
   def scanned_fun(loop_carry, _):
@@ -109,7 +144,7 @@ def _fori_scan_body_fun(body_fun):
     return (lax.add(i, lax._const(i, 1)), upper, body_fun(i, x)), None
   return scanned_fun
 
-def fori_loop(lower, upper, body_fun, init_val):
+def fori_loop(lower, upper, body_fun, init_val, unroll=1):
   """Loop from ``lower`` to ``upper`` by reduction to ``while_loop``.
 
   The type signature in brief is
@@ -142,6 +177,9 @@ def fori_loop(lower, upper, body_fun, init_val):
     upper: an integer representing the loop index upper bound (exclusive)
     body_fun: function of type ``(int, a) -> a``.
     init_val: initial loop carry value of type ``a``.
+    unroll: optional positive integer specifying how many calls of
+      ``body_fun`` each iteration of the underlying loop makes (default 1).
+      Any remaining iterations run in a second loop.
 
   Returns:
     Loop value from the final iteration, of type ``a``.
@@ -164,15 +202,27 @@ def fori_loop(lower, upper, body_fun, init_val):
   else:
     use_scan = False  # TODO(mattjj): re-enable this
 
+  unroll = _check_unroll("fori_loop", unroll)
   if use_scan:
     (_, _, result), _ = scan(_fori_scan_body_fun(body_fun),
                              (lower, upper, init_val), None,
-                             length=upper_ - lower_)
+                             length=upper_ - lower_, unroll=unroll)
   else:
-    _, _, result = while_loop(_fori_cond_fun, _fori_body_fun(body_fun),
-                              (lower, upper, init_val))
+    carry = (lower, upper, init_val)
+    if unroll > 1:
+      carry = while_loop(_fori_unrolled_cond_fun(unroll),
+                         _fori_body_fun(body_fun, unroll), carry)
+    _, _, result = while_loop(_fori_cond_fun, _fori_body_fun(body_fun), carry)
   return result
 
+def _check_unroll(name, unroll):
+  unroll = core.concrete_or_error(int, unroll, "in {} argument `unroll`"
+                                  .format(name))
+  if unroll < 1:
+    raise ValueError("{} got `unroll` argument of {}, but it must be a "
+                     "positive integer.".format(name, unroll))
+  return unroll
+
 
 def while_loop(cond_fun, body_fun, init_val):
   """Call ``body_fun`` repeatedly in a loop while ``cond_fun`` is True.
@@ -305,6 +355,67 @@ def _pred_bcast_select(c, pred, x, y):
   bcast_pred = xops.BroadcastInDim(pred, x_shape, list(range(len(pred_shape))))
   return xops.Select(bcast_pred, x, y)
 
+def _use_predicated_batching(size, *jaxprs):
+  """Whether vmap should run the batched `jaxprs` only on the lanes needing them.
+
+  `jaxprs` are the branches (or loop body) batched to `size` lanes.
+  """
+  strategy = FLAGS.jax_cond_batching
+  if strategy != 'auto':
+    return strategy == 'predicated'
+  if size < _PREDICATED_MIN_BATCH_SIZE:
+    return False
+  flops = max(cost.subjaxpr_cost(jaxpr).flops for jaxpr in jaxprs)
+  return flops >= _PREDICATED_MIN_FLOPS_PER_LANE * size
+
+def _predicated_chunk_size(size):
+  num_chunks = max(1, min(size, FLAGS.jax_predicated_batching_chunks))
+  return -(-size // num_chunks)
+
+def _predicated_apply(fun, chunk_size, mask, args, args_bat, outs):
+  """Applies `fun` to the lanes of `args` set in `mask`, updating `outs`.
+
+  `fun` is batched over `chunk_size` lanes along axis 0 of the `args` for which
+  `args_bat` is True, and returns values batched along axis 0 like `outs`. The
+  lanes set in `mask` are gathered into compact chunks, `fun` is applied to only
+  as many chunks as they fill, and its results are scattered into their lanes
+  of `outs`. The other lanes of `outs` are left unchanged.
+  """
+  size = mask.shape[0]
+  num_chunks = -(-size // chunk_size)
+  chunk_iota = lax.iota(onp.int32, chunk_size)
+  # Put the lanes set in `mask` first.
+  _, lanes = lax.sort_key_val(
+      lax.convert_element_type(lax.bitwise_not(mask), onp.int32),
+      lax.iota(onp.int32, size))
+  count = lax.reduce(lax.convert_element_type(mask, onp.int32), onp.int32(0),
+                     lax.add, (0,))
+  is_unit = [core.get_aval(x) is core.abstract_unit for x in outs]
+
+  def apply_chunk(i, outs):
+    # The last chunk is shifted back to stay in bounds, so it can overlap the
+    # previous one and run lanes not set in `mask`; those results are dropped.
+    start = lax.min(i * chunk_size, onp.int32(size - chunk_size))
+    chunk = lax.dynamic_slice_in_dim(lanes, start, chunk_size)
+    valid = lax.lt(lax.add(chunk_iota, start), count)
+    chunk_args = [jax.numpy.take(x, chunk, axis=0) if b else x
+                  for x, b in zip(args, args_bat)]
+    chunk_outs = [y for y, u in zip(fun(*chunk_args), is_unit) if not u]
+    return [jax.ops.index_update(x, chunk, _cond_pred_bcast_select(
+                valid, y, jax.numpy.take(x, chunk, axis=0)))
+            for x, y in zip(outs, chunk_outs)]
+
+  # A scan over chunks with a cond skipping the empty ones, rather than a
+  # while_loop, so that the result can be differentiated in reverse mode.
+  def body_fun(outs, i):
+    outs = cond(lax.lt(i * chunk_size, count), (i, outs),
+                lambda args: apply_chunk(*args), outs, lambda outs: outs)
+    return outs, ()
+
+  outs_iter = iter(scan(body_fun, [x for x, u in zip(outs, is_unit) if not u],
+                        lax.iota(onp.int32, num_chunks))[0])
+  return [core.unit if u else next(outs_iter) for u in is_unit]
+
 def _while_loop_batching_rule(args, dims, cond_nconsts, cond_jaxpr,
                               body_nconsts, body_jaxpr):
   size, = {x.shape[d] for x, d in zip(args, dims) if d is not batching.not_mapped}
@@ -319,10 +430,11 @@ def _while_loop_batching_rule(args, dims, cond_nconsts, cond_jaxpr,
   carry_bat = init_bat
   for _ in range(1 + len(carry_bat)):
     batched = bconst_bat + carry_bat
-    body_jaxpr_batched, carry_bat_out = batching.batch_jaxpr(
-        body_jaxpr, size, batched, instantiate=carry_bat)
-    cond_jaxpr_batched, (pred_bat,) = batching.batch_jaxpr(
-        cond_jaxpr, size, cconst_bat + carry_bat, instantiate=False)
+    with batching.deferred_diagnostics() as diagnostics:
+      body_jaxpr_batched, carry_bat_out = batching.batch_jaxpr(
+          body_jaxpr, size, batched, instantiate=carry_bat)
+      cond_jaxpr_batched, (pred_bat,) = batching.batch_jaxpr(
+          cond_jaxpr, size, cconst_bat + carry_bat, instantiate=False)
     carry_bat_out = _map(partial(operator.or_, pred_bat), carry_bat_out)
     if carry_bat_out == carry_bat:
       break
@@ -330,6 +442,18 @@ def _while_loop_batching_rule(args, dims, cond_nconsts, cond_jaxpr,
       carry_bat = _map(operator.or_, carry_bat, carry_bat_out)
   else:
     assert False, "Fixpoint not reached"
+  batching.commit_diagnostics(diagnostics)
+  if pred_bat and _use_predicated_batching(size, body_jaxpr_batched):
+    return _while_loop_predicated_batching_rule(
+        args, dims, size, cond_nconsts, cond_jaxpr_batched, body_nconsts,
+        body_jaxpr, bconst_bat)
+  if pred_bat and batching.diagnostics_enabled():
+    # Every lane runs the body until all predicates are false, and the new
+    # carry is selected against the old one on each iteration.
+    for aval in body_jaxpr_batched.out_avals:
+      if aval is not core.abstract_unit:
+        batching.record_fallback('select', aval, aval.size,
+                                 3 * aval.size * aval.dtype.itemsize)
 
   consts, init = split_list(args, [cond_nconsts + body_nconsts])
   const_dims, init_dims = split_list(dims, [cond_nconsts + body_nconsts])
@@ -345,6 +469,36 @@ def _while_loop_batching_rule(args, dims, cond_nconsts, cond_jaxpr,
   out_bdims = [0 if b else batching.not_mapped for b in carry_bat]
   return outs, out_bdims
 
+def _while_loop_predicated_batching_rule(args, dims, size, cond_nconsts,
+                                         cond_jaxpr_batched, body_nconsts,
+                                         body_jaxpr, bconst_bat):
+  """Batches a while_loop by only running the body on lanes still looping."""
+  args = [batching.moveaxis(x, d, 0) if d is not batching.not_mapped and d != 0
+          else x for x, d in zip(args, dims)]
+  cconsts, bconsts, init = split_list(args, [cond_nconsts, body_nconsts])
+  init = [batching.broadcast(x, size, 0) if d is batching.not_mapped else x
+          for x, d in zip(init, dims[cond_nconsts + body_nconsts:])]
+  chunk_size = _predicated_chunk_size(size)
+  carry_bat = [True] * len(init)
+  body_jaxpr_chunk, _ = batching.batch_jaxpr(
+      body_jaxpr, chunk_size, bconst_bat + carry_bat, instantiate=carry_bat)
+  body_chunk_fun = core.jaxpr_as_fun(body_jaxpr_chunk)
+  pred_fun = lambda carry: core.jaxpr_as_fun(cond_jaxpr_batched)(
+      *(cconsts + carry))[0]
+
+  def cond_fun(carry):
+    running, _ = carry
+    return lax.reduce(running, onp.bool_(False), lax.bitwise_or, (0,))
+
+  def body_fun(carry):
+    running, carry = carry
+    carry = _predicated_apply(body_chunk_fun, chunk_size, running,
+                              bconsts + carry, bconst_bat + carry_bat, carry)
+    return pred_fun(carry), carry
+
+  _, outs = while_loop(cond_fun, body_fun, (pred_fun(init), init))
+  return outs, [0] * len(outs)
+
 def _while_loop_jvp(primals, tangents, cond_nconsts, cond_jaxpr, body_nconsts,
                     body_jaxpr):
   nonzeros = [t is not ad_util.zero for t in tangents]
@@ -492,6 +646,14 @@ xla.initial_style_translations[while_p] = _while_loop_translation_rule
 ad.primitive_transposes[while_p] = _while_transpose_error
 batching.primitive_batchers[while_p] = _while_loop_batching_rule
 
+def _while_loop_cost_rule(in_avals, out_avals, *, cond_jaxpr, body_jaxpr,
+                          **params):
+  # The trip count isn't known statically, so this is the cost of a single
+  # iteration, i.e. a lower bound for any loop that runs at least once.
+  return (cost.memory_cost(in_avals, out_avals) +
+          cost.subjaxpr_cost(cond_jaxpr) + cost.subjaxpr_cost(body_jaxpr))
+cost.cost_rules[while_p] = _while_loop_cost_rule
+
 
 ### cond
 
@@ -590,20 +752,50 @@ def _cond_batching_rule(args, dims, true_jaxpr, false_jaxpr, linear):
   (pred,), true_ops, false_ops = split_list(args, [1, len(true_jaxpr.in_avals)])
   (pred_bat,), t_bat, f_bat = split_list(orig_bat, [1, len(true_jaxpr.in_avals)])
 
-  _, true_out_bat = batching.batch_jaxpr(true_jaxpr, size, t_bat, False)
-  _, false_out_bat = batching.batch_jaxpr(false_jaxpr, size, f_bat, False)
+  with batching.deferred_diagnostics():
+    _, true_out_bat = batching.batch_jaxpr(true_jaxpr, size, t_bat, False)
+    _, false_out_bat = batching.batch_jaxpr(false_jaxpr, size, f_bat, False)
   out_bat = [a or b for a, b in zip(true_out_bat, false_out_bat)]
 
   true_jaxpr_batched, _ = batching.batch_jaxpr(true_jaxpr, size, t_bat, out_bat)
   false_jaxpr_batched, _ = batching.batch_jaxpr(false_jaxpr, size, f_bat, out_bat)
 
-  if pred_bat:
+  if pred_bat and _use_predicated_batching(size, true_jaxpr_batched,
+                                            false_jaxpr_batched):
+    chunk_size = _predicated_chunk_size(size)
+    true_jaxpr_chunk, _ = batching.batch_jaxpr(true_jaxpr, chunk_size, t_bat,
+                                               instantiate=True)
+    false_jaxpr_chunk, _ = batching.batch_jaxpr(false_jaxpr, chunk_size, f_bat,
+                                                instantiate=True)
+    outs = [core.unit if aval is core.abstract_unit else
+            lax.full((size,) + aval.shape, 0, aval.dtype)
+            for aval in true_jaxpr.out_avals]
+    outs = _predicated_apply(core.jaxpr_as_fun(true_jaxpr_chunk), chunk_size,
+                             pred, true_ops, t_bat, outs)
+    outs = _predicated_apply(core.jaxpr_as_fun(false_jaxpr_chunk), chunk_size,
+                             lax.bitwise_not(pred), false_ops, f_bat, outs)
+    return outs, [batching.not_mapped if aval is core.abstract_unit else 0
+                  for aval in true_jaxpr.out_avals]
+  elif pred_bat:
     true_out = core.jaxpr_as_fun(true_jaxpr_batched)(*true_ops)
     false_out = core.jaxpr_as_fun(false_jaxpr_batched)(*false_ops)
     true_out = [batching.broadcast(x, size, 0) if not b else x
                 for x, b in zip(true_out, out_bat)]
     false_out = [batching.broadcast(x, size, 0) if not b else x
                  for x, b in zip(false_out, out_bat)]
+    if batching.diagnostics_enabled():
+      # Each lane now also pays for the branch it would not have taken.
+      true_cost = cost.subjaxpr_cost(true_jaxpr_batched)
+      false_cost = cost.subjaxpr_cost(false_jaxpr_batched)
+      batching.record_fallback(
+          'both_branches', raise_to_shaped(core.get_aval(pred)),
+          min(true_cost.flops, false_cost.flops),
+          min(true_cost.bytes_read + true_cost.bytes_written,
+              false_cost.bytes_read + false_cost.bytes_written))
+      for aval in true_jaxpr_batched.out_avals:
+        if aval is not core.abstract_unit:
+          batching.record_fallback('select', aval, aval.size,
+                                   3 * aval.size * aval.dtype.itemsize)
     return [_cond_pred_bcast_select(pred, t, f)
             for t, f in zip(true_out, false_out)], [0] * len(true_out)
   else:
@@ -820,10 +1012,19 @@ pe.custom_partial_eval_rules[cond_p] = _cond_partial_eval
 batching.primitive_batchers[cond_p] = _cond_batching_rule
 xla.initial_style_translations[cond_p] = _cond_translation_rule
 
+def _cond_cost_rule(in_avals, out_avals, *, true_jaxpr, false_jaxpr, linear):
+  # Only one branch is executed; report the more expensive one.
+  true_cost = cost.subjaxpr_cost(true_jaxpr)
+  false_cost = cost.subjaxpr_cost(false_jaxpr)
+  branch_cost = max(true_cost, false_cost, key=lambda c: c.flops)
+  return cost.memory_cost(in_avals[:1], out_avals) + branch_cost
+cost.cost_rules[cond_p] = _cond_cost_rule
+
 
 ### scan
 
-def scan(f, init, xs, length=None, reverse=False):
+def scan(f, init, xs, length=None, reverse=False, unroll=1,
+         checkpoint_levels=0):
   """Scan a function over leading array axes while carrying along state.
 
   The type signature in brief is
@@ -886,6 +1087,21 @@ def scan(f, init, xs, length=None, reverse=False):
     reverse: optional boolean specifying whether to run the scan iteration
       forward (the default) or in reverse, equivalent to reversing the leading
       axes of the arrays in both ``xs`` and in ``ys``.
+    unroll: optional positive integer specifying how many iterations of the
+      scan each iteration of the underlying XLA While loop performs (default
+      1). Unrolling lets XLA fuse operations across iterations and reduces loop
+      overhead for small bodies, at the cost of compile time. The remaining
+      ``length % unroll`` iterations are unrolled after the loop.
+    checkpoint_levels: optional non-negative integer controlling how much
+      memory reverse-mode differentiation of the scan uses (default 0). With
+      the default, the residuals of every iteration are stored, so memory grows
+      linearly in ``length``. With ``k > 0`` the scan is split into about
+      ``length ** (1 / (k + 1))`` segments, each recursively scanned with
+      ``k - 1`` levels, and only the carries at segment boundaries are stored;
+      the forward pass of each segment is recomputed during the backward pass.
+      ``k = 1`` is the classic sqrt(length) checkpointing. Memory then grows
+      like ``(k + 1) * length ** (1 / (k + 1))``, at the cost of ``k`` extra
+      forward passes.
 
   Returns:
     A pair of type ``(c, [b])`` where the first element represents the final
@@ -921,6 +1137,13 @@ def scan(f, init, xs, length=None, reverse=False):
     else:
       length, = unique_lengths
 
+  unroll = _check_unroll("scan", unroll)
+  checkpoint_levels = core.concrete_or_error(
+      int, checkpoint_levels, "in scan argument `checkpoint_levels`")
+  if checkpoint_levels < 0:
+    raise ValueError("scan got `checkpoint_levels` argument of {}, but it must "
+                     "be a non-negative integer.".format(checkpoint_levels))
+
   if jax.api._jit_is_disabled():
     carry = init
     ys = []
@@ -934,6 +1157,10 @@ def scan(f, init, xs, length=None, reverse=False):
     ys = tree_multimap(stack, *maybe_reversed(ys))
     return carry, ys
 
+  if checkpoint_levels > 0 and length > 1:
+    return _checkpointed_scan(f, init, xs, length, reverse, unroll,
+                              checkpoint_levels)
+
   carry_avals = tuple(_map(_abstractify, init_flat))
   x_shapes = [masking.padded_shape_as_value(x.shape[1:]) for x in xs_flat]
   x_dtypes = [x.dtype for x in xs_flat]
@@ -951,34 +1178,84 @@ def scan(f, init, xs, length=None, reverse=False):
   out = scan_p.bind(*itertools.chain(consts, in_flat),
                     reverse=reverse, length=length, jaxpr=jaxpr,
                     num_consts=len(consts), num_carry=len(init_flat),
-                    linear=(False,) * (len(consts) + len(in_flat)))
+                    linear=(False,) * (len(consts) + len(in_flat)),
+                    unroll=unroll)
   return tree_unflatten(out_tree, out)
 
-def _scan_impl(*args, reverse, length, num_consts, num_carry, jaxpr, linear):
+def _checkpointed_scan(f, init, xs, length, reverse, unroll, levels):
+  """Scans over segments of `xs` with each segment under `jax.checkpoint`.
+
+  The outer scan only saves the carries (and `xs` slices) entering each
+  segment as residuals; the residuals of the iterations inside a segment are
+  recomputed, one segment at a time, during the backward pass.
+  """
+  segment_length = max(1, int(round(length ** (levels / (levels + 1)))))
+  num_segments, rem = divmod(length, segment_length)
+  split = num_segments * segment_length
+
+  def segment(n):
+    def scan_segment(carry, xs):
+      return scan(f, carry, xs, length=n, reverse=reverse, unroll=unroll,
+                  checkpoint_levels=levels - 1)
+    return jax.api.checkpoint(scan_segment)
+
+  def scan_segments(carry):
+    xs_segments = tree_map(
+        lambda x: lax.reshape(lax.slice_in_dim(x, 0, split),
+                              (num_segments, segment_length) + x.shape[1:]),
+        xs)
+    carry, ys = scan(segment(segment_length), carry, xs_segments,
+                     length=num_segments, reverse=reverse)
+    return carry, tree_map(lambda y: lax.reshape(y, (split,) + y.shape[2:]), ys)
+
+  if rem == 0:
+    return scan_segments(init)
+  xs_tail = tree_map(lambda x: lax.slice_in_dim(x, split, length), xs)
+  scan_tail = lambda carry: segment(rem)(carry, xs_tail)
+  if reverse:
+    carry, ys_tail = scan_tail(init)
+    carry, ys = scan_segments(carry)
+  else:
+    carry, ys = scan_segments(init)
+    carry, ys_tail = scan_tail(carry)
+  ys = tree_multimap(lambda y, y_tail: lax.concatenate([y, y_tail], 0),
+                     ys, ys_tail)
+  return carry, ys
+
+def _scan_impl(*args, reverse, length, num_consts, num_carry, jaxpr, linear,
+               unroll):
   consts, init, xs = split_list(args, [num_consts, num_carry])
   _, _, x_avals = split_list(jaxpr.in_avals, [num_consts, num_carry])
   _, y_avals = split_list(jaxpr.out_avals, [num_carry])
+  num_blocks, rem = divmod(length, unroll)
 
-  def cond_fun(vals):
-    i, *_ = vals
-    return i < length
-
-  def body_fun(vals):
-    [i], carry, ys = split_list(vals, [1, num_carry])
+  def step(i, carry, ys):
     i_ = length - i - 1 if reverse else i
     x = _map(partial(_index_array, i_), x_avals, xs)
     out_flat = core.jaxpr_as_fun(jaxpr)(*(consts + carry + x))
     carry_out, y_updates = split_list(out_flat, [num_carry])
     ys_out = _map(partial(_update_array, i_), y_avals, ys, y_updates)
-    return [i + 1] + carry_out + ys_out
+    return carry_out, ys_out
 
-  ys_init = _map(partial(_empty_array, length), y_avals)
-  if length == 0:
-    return init + ys_init
-  else:
-    init_val = [lax._const(length, 0)] + init + ys_init
+  def cond_fun(vals):
+    i, *_ = vals
+    return i < num_blocks * unroll
+
+  def body_fun(vals):
+    [i], carry, ys = split_list(vals, [1, num_carry])
+    for j in range(unroll):
+      carry, ys = step(i + j if j else i, carry, ys)
+    return [i + unroll] + carry + ys
+
+  carry = init
+  ys = _map(partial(_empty_array, length), y_avals)
+  if num_blocks:
+    init_val = [lax._const(length, 0)] + carry + ys
     _, *outs = while_loop(cond_fun, body_fun, init_val)
-    return outs
+    carry, ys = split_list(outs, [num_carry])
+  for i in range(num_blocks * unroll, length):
+    carry, ys = step(lax._const(length, i), carry, ys)
+  return carry + ys
 
 def _index_array(i, aval, x):
   if aval is core.abstract_unit:
@@ -998,14 +1275,15 @@ def _update_array(i, aval, xs, x):
   else:
     return lax.dynamic_update_index_in_dim(xs, x, i, 0)
 
-def _scan_abstract_eval(*args, reverse, length, num_consts, num_carry, jaxpr, linear):
+def _scan_abstract_eval(*args, reverse, length, num_consts, num_carry, jaxpr,
+                        linear, unroll):
   carry_avals, y_avals = split_list(jaxpr.out_avals, [num_carry])
   ys_avals = [ShapedArray((length,) + aval.shape, aval.dtype)
               if aval is not core.abstract_unit else aval for aval in y_avals]
   return carry_avals + ys_avals
 
 def _scan_jvp(primals, tangents, reverse, length, jaxpr, num_consts, num_carry,
-              linear):
+              linear, unroll):
   num_xs = len(jaxpr.in_avals) - num_carry - num_consts
   num_ys = len(jaxpr.out_avals) - num_carry
   nonzeros = [t is not ad_util.zero for t in tangents]
@@ -1050,7 +1328,7 @@ def _scan_jvp(primals, tangents, reverse, length, jaxpr, num_consts, num_carry,
       *(consts + consts_dot + init + init_dot + xs + xs_dot),
       reverse=reverse, length=length, jaxpr=jaxpr_jvp_rearranged,
       num_consts=num_consts+len(consts_dot), num_carry=num_carry+len(init_dot),
-      linear=jaxpr_jvp_linear)
+      linear=jaxpr_jvp_linear, unroll=unroll)
 
   carry, carry_dot, ys, ys_dot = split_list(out_flat, [num_carry, len(init_dot), num_ys])
   primals_out = carry + ys
@@ -1063,10 +1341,11 @@ def _prune_zeros(ts):
   return [t for t in ts if t is not ad_util.zero]
 
 def _scan_partial_eval(trace, *tracers, reverse, length, num_consts, num_carry,
-                       jaxpr, linear):
+                       jaxpr, linear, unroll):
   if trace.master.trace_type is pe.StagingJaxprTrace:
     params = {"reverse": reverse, "length": length, "num_consts": num_consts,
-              "num_carry": num_carry, "jaxpr": jaxpr, "linear": linear}
+              "num_carry": num_carry, "jaxpr": jaxpr, "linear": linear,
+              "unroll": unroll}
     return trace.default_process_primitive(scan_p, tracers, params)
 
   num_xs = len(jaxpr.in_avals) - num_carry - num_consts
@@ -1132,7 +1411,8 @@ def _scan_partial_eval(trace, *tracers, reverse, length, num_consts, num_carry,
                in zip(unknowns[num_consts:], linear[num_consts:])])
   out_flat = scan_p.bind(
       *in_consts, reverse=reverse, length=length, jaxpr=jaxpr_1_opt,
-      num_consts=num_consts_1, num_carry=num_carry, linear=tuple(linear_1))
+      num_consts=num_consts_1, num_carry=num_carry, linear=tuple(linear_1),
+      unroll=unroll)
   out_carry, ys, res_and_units = split_list(out_flat, [num_carry, num_ys])
   extensive_residuals = [r for r, (pv, _) in zip(res_and_units, res_pvals) if pv is not None]
 
@@ -1155,7 +1435,8 @@ def _scan_partial_eval(trace, *tracers, reverse, length, num_consts, num_carry,
                           out_tracers, scan_p,
                           dict(reverse=reverse, length=length, jaxpr=jaxpr_2_opt,
                                num_consts=num_consts_2,
-                               num_carry=num_carry, linear=tuple(linear_2)))
+                               num_carry=num_carry, linear=tuple(linear_2),
+                               unroll=unroll))
   for t in out_tracers: t.recipe = eqn
   return out_tracers
 
@@ -1165,7 +1446,8 @@ def _promote_aval_rank(sz, aval):
   else:
     return ShapedArray((sz,) + aval.shape, aval.dtype)
 
-def _scan_transpose(cts, *args, reverse, length, num_consts, num_carry, jaxpr, linear):
+def _scan_transpose(cts, *args, reverse, length, num_consts, num_carry, jaxpr,
+                    linear, unroll):
   # we've only implemented transposing scans with specific lin/nonlin patterns
   consts_lin, init_lin, xs_lin = split_list(linear, [num_consts, num_carry])
   num_ires = len(consts_lin) - sum(consts_lin)
@@ -1201,7 +1483,8 @@ def _scan_transpose(cts, *args, reverse, length, num_consts, num_carry, jaxpr, l
   outs = scan_p.bind(
       *(ires + ct_consts + ct_carry + ct_ys + eres), reverse=not reverse,
       length=length, jaxpr=jaxpr_trans, num_consts=num_ires,
-      num_carry=num_consts-num_ires+num_carry, linear=tuple(linear_trans))
+      num_carry=num_consts-num_ires+num_carry, linear=tuple(linear_trans),
+      unroll=unroll)
   ct_consts, ct_init, ct_xs = split_list(outs, [num_consts - num_ires, num_carry])
   return [None] * num_ires + ct_consts + ct_init + ct_xs + [None] * num_eres
 
@@ -1237,7 +1520,7 @@ def _make_typed_jaxpr(traceable: lu.WrappedFun, in_avals: Sequence[core.Abstract
 
 
 def _scan_batching_rule(args, dims, reverse, length, jaxpr, num_consts,
-                        num_carry, linear):
+                        num_carry, linear, unroll):
   num_ys = len(jaxpr.out_avals) - num_carry
   size, = {x.shape[d] for x, d in zip(args, dims) if d is not batching.not_mapped}
   orig_batched = [d is not batching.not_mapped for d in dims]
@@ -1274,22 +1557,23 @@ def _scan_batching_rule(args, dims, reverse, length, jaxpr, num_consts,
   new_args = new_consts + new_init + new_xs
 
   outs = scan_p.bind(*new_args, reverse=reverse, length=length, jaxpr=jaxpr_batched,
-                     num_consts=num_consts, num_carry=num_carry, linear=linear)
+                     num_consts=num_consts, num_carry=num_carry, linear=linear,
+                     unroll=unroll)
   carry_bdims = [0 if b else batching.not_mapped for b in carry_batched]
   ys_bdims = [1 if b else batching.not_mapped for b in ys_batched]
   return outs, carry_bdims + ys_bdims
 
 def _scan_shape_rule(shapes, reverse, length, jaxpr,
-                     num_consts, num_carry, linear):
+                     num_consts, num_carry, linear, unroll):
   const_shexprs, init_shexprs, xs_shexprs = split_list(shapes, [num_consts, num_carry])
   _, y_avals = split_list(jaxpr.out_avals, [num_carry])
   ys_shapes = [(length,) + tuple(y_aval.shape) for y_aval in y_avals]
   return init_shexprs + ys_shapes
 
 def _scan_masking_rule(shape_envs, padded_vals, shape_exprs, reverse, length,
-                       jaxpr, num_consts, num_carry, linear):
+                       jaxpr, num_consts, num_carry, linear, unroll):
   out_shape = _scan_shape_rule(shape_exprs, reverse, length, jaxpr,
-                               num_consts, num_carry, linear)
+                               num_consts, num_carry, linear, unroll)
   dynamic_length = length.evaluate(shape_envs.logical)
   masked_jaxpr = _masked_scan_jaxpr(jaxpr, num_consts, num_carry)
   consts, init, xs = split_list(padded_vals, [num_consts, num_carry])
@@ -1299,7 +1583,8 @@ def _scan_masking_rule(shape_envs, padded_vals, shape_exprs, reverse, length,
       *itertools.chain([dynamic_length] + consts, [0], init, xs),
       reverse=reverse, length=max_length, jaxpr=masked_jaxpr,
       num_consts=1 + num_consts, num_carry=1 + num_carry,
-      linear=tuple([False] + const_linear + [False] + init_linear + xs_linear))
+      linear=tuple([False] + const_linear + [False] + init_linear + xs_linear),
+      unroll=unroll)
   return out_vals[1:], out_shape
 
 def _masked_scan_jaxpr(jaxpr, num_consts, num_carry):
@@ -1319,7 +1604,8 @@ def _masked_scan_jaxpr(jaxpr, num_consts, num_carry):
   const_avals, carry_avals, x_avals = split_list(jaxpr.in_avals, [num_consts, num_carry])
   return _make_typed_jaxpr(masked, [aval] + const_avals + [aval] + carry_avals + x_avals)
 
-def scan_bind(*args, reverse, length, num_consts, num_carry, jaxpr, linear):
+def scan_bind(*args, reverse, length, num_consts, num_carry, jaxpr, linear,
+              unroll=1):
   if not core.skip_checks:
     assert len(linear) == len(args)
     consts, init, xs = split_list(args, [num_consts, num_carry])
@@ -1333,7 +1619,7 @@ def scan_bind(*args, reverse, length, num_consts, num_carry, jaxpr, linear):
     core.check_jaxpr(jaxpr.jaxpr)
   return core.Primitive.bind(scan_p, *args, reverse=reverse, length=length,
                              jaxpr=jaxpr, num_consts=num_consts,
-                             num_carry=num_carry, linear=linear)
+                             num_carry=num_carry, linear=linear, unroll=unroll)
 
 scan_p = core.Primitive("scan")
 scan_p.multiple_results = True
@@ -1349,6 +1635,11 @@ xla.initial_style_translations[scan_p] = \
 batching.primitive_batchers[scan_p] = _scan_batching_rule
 masking.shape_parameterized_primitive_rules[scan_p] = _scan_masking_rule
 
+def _scan_cost_rule(in_avals, out_avals, *, length, jaxpr, **params):
+  return (cost.memory_cost(in_avals, out_avals) +
+          cost.subjaxpr_cost(jaxpr, length))
+cost.cost_rules[scan_p] = _scan_cost_rule
+
 
 def map(f, xs):
   """Map a function over leading array axes.
@@ -1381,6 +1672,100 @@ def map(f, xs):
   return ys
 
 
+def associative_scan(fn, elems, reverse=False):
+  """Performs a scan with an associative binary operation, in parallel.
+
+  For an associative ``fn`` and an array ``elems`` of length ``n``,
+  ``associative_scan`` computes the inclusive prefix reductions::
+
+    [elems[0], fn(elems[0], elems[1]), fn(fn(elems[0], elems[1]), elems[2]), ...]
+
+  Unlike ``scan``, which applies its body ``n`` times in sequence, this uses
+  the work-efficient parallel prefix algorithm of Blelloch (1990): it applies
+  ``fn`` ``O(n)`` times in total, over ``O(log n)`` rounds, each of which
+  combines many pairs of elements at once. That makes it a good fit for long
+  linear recurrences such as ``h[t] = a[t] * h[t-1] + b[t]``, whose steps
+  compose associatively as ``(a1, b1), (a2, b2) -> (a1 * a2, a2 * b1 + b2)``.
+
+  Since it is implemented in terms of ``lax`` slicing and padding operations,
+  ``associative_scan`` can be differentiated and batched whenever ``fn`` can.
+
+  Args:
+    fn: a Python function computing an associative binary operation. It is
+      called with two pytrees with the structure of ``elems``, whose leaves
+      share a leading axis of the same (arbitrary) size, and must combine them
+      elementwise along that axis, returning a pytree of the same structure.
+      Only associativity is required, not commutativity.
+    elems: an array or pytree of arrays with a common leading axis size to scan
+      along.
+    reverse: optional boolean specifying whether to scan from the end of the
+      leading axis to the start instead (default False).
+
+  Returns:
+    A pytree with the structure of ``elems`` holding the prefix reductions of
+    ``elems`` by ``fn`` along the leading axis.
+  """
+  elems_flat, tree = tree_flatten(elems)
+  if not elems_flat:
+    return elems
+  if any(onp.ndim(x) == 0 for x in elems_flat):
+    msg = "associative_scan got value with no leading axis to scan over: {}."
+    raise ValueError(msg.format(', '.join(str(x) for x in elems_flat
+                                          if onp.ndim(x) == 0)))
+  if len(set(onp.shape(x)[0] for x in elems_flat)) > 1:
+    msg = "associative_scan got values with different leading axis sizes: {}."
+    raise ValueError(msg.format(', '.join(str(onp.shape(x)[0])
+                                          for x in elems_flat)))
+
+  def combine(a_flat, b_flat):
+    out = fn(tree_unflatten(tree, a_flat), tree_unflatten(tree, b_flat))
+    out_flat, out_tree = tree_flatten(out)
+    _check_tree("associative_scan", "elems", out_tree, tree)
+    return out_flat
+
+  def prefix_scan(elems):
+    n = elems[0].shape[0]
+    if n < 2:
+      return elems
+    # Combine adjacent pairs, then scan the half-length sequence of pairs to get
+    # the odd-indexed results. The even-indexed ones each need one more
+    # application of `fn`.
+    evens = [lax.slice_in_dim(x, 0, None, stride=2) for x in elems]
+    odds = [lax.slice_in_dim(x, 1, None, stride=2) for x in elems]
+    odd_scans = prefix_scan(
+        combine([lax.slice_in_dim(x, 0, n // 2) for x in evens], odds))
+    if n % 2 == 0:
+      odd_scans_head = [lax.slice_in_dim(x, 0, -1) for x in odd_scans]
+    else:
+      odd_scans_head = odd_scans
+    even_scans = combine(odd_scans_head,
+                         [lax.slice_in_dim(x, 1, None) for x in evens])
+    even_scans = [lax.concatenate([lax.slice_in_dim(x, 0, 1), y], 0)
+                  for x, y in zip(evens, even_scans)]
+    return _map(_interleave, even_scans, odd_scans)
+
+  if reverse:
+    elems_flat = [lax.rev(x, (0,)) for x in elems_flat]
+  scans = prefix_scan(elems_flat)
+  if reverse:
+    scans = [lax.rev(x, (0,)) for x in scans]
+  return tree_unflatten(tree, scans)
+
+def _interleave(a, b):
+  """Interleaves `a` and `b` along axis 0, starting with `a`.
+
+  `a` must be as long as `b` or one element longer.
+  """
+  def spread(x, low, high):
+    padding = [(low, high, 1)] + [(0, 0, 0)] * (x.ndim - 1)
+    return lax.pad(x, lax._const(x, 0), padding)
+  odd = a.shape[0] != b.shape[0]
+  a, b = spread(a, 0, 0 if odd else 1), spread(b, 1, 1 if odd else 0)
+  if a.dtype == onp.bool_:
+    return lax.bitwise_or(a, b)
+  return lax.add(a, b)
+
+
 def _concat_masking_rule(padded_vals, logical_shapes, dimension):
   result = lax.concatenate(padded_vals, dimension)  # fragmented
   offset = 0
@@ -1814,3 +2199,7 @@ xla.initial_style_translations[linear_solve_p] = \
     xla.lower_fun_initial_style(_custom_linear_solve_impl)
 ad.primitive_transposes[linear_solve_p] = _linear_solve_transpose_rule
 batching.primitive_batchers[linear_solve_p] = _linear_solve_batching_rule
+
+def _linear_solve_cost_rule(in_avals, out_avals, *, jaxprs, **params):
+  return cost.memory_cost(in_avals, out_avals) + cost.subjaxpr_cost(jaxprs.solve)
+cost.cost_rules[linear_solve_p] = _linear_solve_cost_rule
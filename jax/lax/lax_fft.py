@@ -26,6 +26,7 @@ from . import dtypes, lax
 from ..lib import xla_client
 from ..interpreters import ad
 from ..interpreters import batching
+from ..interpreters import cost
 
 xops = xla_client.ops
 
@@ -143,3 +144,12 @@ xla.translations[fft_p] = fft_translation_rule
 ad.deflinear(fft_p, fft_transpose_rule)
 batching.primitive_batchers[fft_p] = fft_batching_rule
 
+def fft_cost_rule(in_avals, out_avals, fft_type, fft_lengths):
+  # The usual 5 N log2(N) estimate for each length-N transform.
+  x, = in_avals
+  n = prod(fft_lengths)
+  num_transforms = prod(x.shape) // n if n else 0
+  flops = num_transforms * 5 * n * onp.log2(n) if n > 1 else 0
+  return cost.memory_cost(in_avals, out_avals, flops)
+cost.cost_rules[fft_p] = fft_cost_rule
+
@@ -26,6 +26,7 @@ from jax import dtypes
 from jax.interpreters import xla
 from jax.interpreters import ad
 from jax.interpreters import batching
+from jax.interpreters import cost
 from jax.util import partial, prod
 from jax.abstract_arrays import ShapedArray
 from jax.core import Primitive
@@ -128,9 +129,20 @@ def cholesky_batching_rule(batched_args, batch_dims):
   x = batching.moveaxis(x, bd, 0)
   return cholesky(x), 0
 
+def _matrix_cost_rule(flops_fn, in_avals, out_avals, **params):
+  # `flops_fn(m, n)` is the (leading-order) FLOP count of the decomposition of
+  # a single m x n matrix; leading dimensions are batch dimensions.
+  operand = in_avals[0]
+  *batch_dims, m, n = operand.shape
+  return cost.memory_cost(in_avals, out_avals, prod(batch_dims) * flops_fn(m, n))
+
+def _defmatrixcost(prim, flops_fn):
+  cost.cost_rules[prim] = partial(_matrix_cost_rule, flops_fn)
+
 cholesky_p = standard_unop(_float | _complex, 'cholesky')
 ad.primitive_jvps[cholesky_p] = cholesky_jvp_rule
 batching.primitive_batchers[cholesky_p] = cholesky_batching_rule
+_defmatrixcost(cholesky_p, lambda m, n: n ** 3 / 3)
 
 def _nan_like(c, operand):
   shape = c.GetShape(operand)
@@ -210,6 +222,7 @@ eig_p.def_abstract_eval(eig_abstract_eval)
 xla.translations[eig_p] = eig_translation_rule
 xla.backend_specific_translations['cpu'][eig_p] = eig_cpu_translation_rule
 batching.primitive_batchers[eig_p] = eig_batching_rule
+_defmatrixcost(eig_p, lambda m, n: 25 * n ** 3)
 
 
 # Symmetric/Hermitian eigendecomposition
@@ -294,6 +307,7 @@ eigh_p.def_abstract_eval(eigh_abstract_eval)
 xla.translations[eigh_p] = eigh_translation_rule
 ad.primitive_jvps[eigh_p] = eigh_jvp_rule
 batching.primitive_batchers[eigh_p] = eigh_batching_rule
+_defmatrixcost(eigh_p, lambda m, n: 9 * n ** 3)
 
 _cpu_syevd = lapack.syevd
 
@@ -425,6 +439,15 @@ ad.defjvp2(triangular_solve_p,
 ad.primitive_transposes[triangular_solve_p] = triangular_solve_transpose_rule
 batching.primitive_batchers[triangular_solve_p] = triangular_solve_batching_rule
 
+def _triangular_solve_cost_rule(in_avals, out_avals, *, left_side, **params):
+  # Each of the n (resp. m) right-hand sides is a triangular solve against an
+  # m x m (resp. n x n) matrix.
+  _, b = in_avals
+  *batch_dims, m, n = b.shape
+  flops = m * m * n if left_side else n * n * m
+  return cost.memory_cost(in_avals, out_avals, prod(batch_dims) * flops)
+cost.cost_rules[triangular_solve_p] = _triangular_solve_cost_rule
+
 
 def _triangular_solve_cpu_translation_rule(
     c, a, b, left_side, lower, transpose_a, conjugate_a, unit_diagonal):
@@ -650,6 +673,7 @@ lu_p.def_abstract_eval(_lu_abstract_eval)
 xla.translations[lu_p] = xla.lower_fun(_lu_python)
 ad.primitive_jvps[lu_p] = _lu_jvp_rule
 batching.primitive_batchers[lu_p] = _lu_batching_rule
+_defmatrixcost(lu_p, lambda m, n: m * n * min(m, n) - min(m, n) ** 3 / 3)
 
 xla.backend_specific_translations['cpu'][lu_p] = partial(
   _lu_cpu_gpu_translation_rule, lapack.getrf)
@@ -839,6 +863,7 @@ qr_p.def_abstract_eval(qr_abstract_eval)
 xla.translations[qr_p] = qr_translation_rule
 ad.primitive_jvps[qr_p] = qr_jvp_rule
 batching.primitive_batchers[qr_p] = qr_batching_rule
+_defmatrixcost(qr_p, lambda m, n: 2 * m * n * min(m, n) - 2 * min(m, n) ** 3 / 3)
 
 xla.backend_specific_translations['cpu'][qr_p] = partial(
   _qr_cpu_gpu_translation_rule, lapack.geqrf, lapack.orgqr)
@@ -931,6 +956,7 @@ svd_p.def_impl(svd_impl)
 svd_p.def_abstract_eval(svd_abstract_eval)
 ad.primitive_jvps[svd_p] = svd_jvp_rule
 batching.primitive_batchers[svd_p] = svd_batching_rule
+_defmatrixcost(svd_p, lambda m, n: 4 * max(m, n) * min(m, n) ** 2 + 22 * min(m, n) ** 3)
 xla.translations[svd_p] = svd_translation_rule
 
 xla.backend_specific_translations['cpu'][svd_p] = partial(
@@ -13,6 +13,7 @@
 # limitations under the License.
 
 
+import builtins
 from collections import namedtuple
 import functools
 import operator as op
@@ -20,7 +21,7 @@ from typing import Any, Callable, Optional, Sequence, Tuple
 
 import numpy as onp
 
-from .util import safe_map, safe_zip, unzip2, subvals
+from .util import safe_map, safe_zip, unzip2, subvals, prod
 from .lib import xla_bridge as xb
 from .lib import xla_client as xc
 
@@ -28,6 +29,7 @@ xops = xc.ops
 
 map = safe_map
 zip = safe_zip
+_slice = builtins.slice
 
 
 ### util
@@ -89,6 +91,24 @@ def taggedtuple(name, fields) -> Callable[..., Any]:
 #              [0., 1., 2.],
 #              [0., 1., 2.]], dtype=float32)
 #
+# An input can also be an operation applied to the value of another LazyExpr,
+# its operand, which lets reindexings nest. Slice, Rev and Reshape apply the
+# lax operations of the same name to the operand, and Convert applies
+# convert_element_type. These let eager slicing, reshaping and casting of a
+# DeviceArray build up a single lazy expression, like broadcasts and transposes
+# do, which is evaluated in one computation when it's forced or staged into a
+# consumer. For example, x[::2].T.astype(float32) for a float64 x of shape
+# (4, 3) is
+#
+# LazyExpr(input=Convert(operand=LazyExpr(input=Slice(operand=..., ...),
+#                                         shape=(3, 2), dims=(1, 0)),
+#                        old_dtype=dtype('float64'), new_dtype=dtype('float32')),
+#          shape=(3, 2), dims=(0, 1))
+#
+# where the innermost LazyExpr has an ArrayVar input. An operation applied
+# directly to one of the same kind is folded into it where that's exact, e.g. a
+# slice of a slice is one slice, so repeated eager ops don't nest ever deeper.
+#
 # For performance, some functions on lazy expressions accept None as an input to
 # stand for the identity lazy expression.
 #
@@ -107,8 +127,15 @@ Iota = taggedtuple('Iota', ['dtype', 'size'])           # like np.arange(N)
 Eye = taggedtuple('Eye', ['dtype', 'shape', 'offset'])  # like np.eye
 Tri = taggedtuple('Tri', ['dtype', 'shape', 'offset'])  # like np.tri
 Delta = taggedtuple('Delta', ['dtype', 'shape'])  # kronecker delta arrays
+Slice = taggedtuple('Slice', ['operand', 'start_indices', 'limit_indices',
+                              'strides'])
+Rev = taggedtuple('Rev', ['operand', 'dimensions'])
+Reshape = taggedtuple('Reshape', ['operand', 'new_sizes'])
+Convert = taggedtuple('Convert', ['operand', 'old_dtype', 'new_dtype'])
 # pytype: enable=wrong-arg-count
 
+_nested_inputs = (Slice, Rev, Reshape, Convert)
+
 def array(shape):
   return LazyExpr(ArrayVar(), shape, tuple(range(len(shape))))
 
@@ -137,14 +164,120 @@ def transpose(lexpr: LazyExpr, perm: Sequence[int]):
   new_dims = tuple(lexpr.dims[i] for i in perm)
   return LazyExpr(lexpr.input, new_shape, new_dims)
 
+def _wrap(input_, shape):
+  return LazyExpr(input_, tuple(shape), tuple(range(len(shape))))
+
+def _unwrap(lexpr: LazyExpr, input_type):
+  # The input of `lexpr` if it's of `input_type` and isn't reindexed, so that
+  # an operation applied to `lexpr` can be folded into it.
+  if (type(lexpr.input) is input_type and
+      lexpr.dims == tuple(range(len(lexpr.shape)))):
+    return lexpr.input
+  return None
+
+def slice(lexpr: LazyExpr, start_indices: Sequence[int],
+          limit_indices: Sequence[int], strides: Sequence[int]):
+  start_indices, limit_indices, strides = (
+      tuple(map(int, start_indices)), tuple(map(int, limit_indices)),
+      tuple(map(int, strides)))
+  shape = [(limit - start + stride - 1) // stride for start, limit, stride
+           in zip(start_indices, limit_indices, strides)]
+  inner = _unwrap(lexpr, Slice)
+  if inner is not None:
+    # A slice of a slice is a single slice of the inner operand.
+    starts = tuple(s0 + t0 * s if n else s0 for s0, t0, s, n
+                   in zip(inner.start_indices, inner.strides, start_indices,
+                          shape))
+    strides = tuple(t0 * t for t0, t in zip(inner.strides, strides))
+    limit_indices = tuple(start + stride * (n - 1) + 1 if n else start
+                          for start, stride, n in zip(starts, strides, shape))
+    lexpr, start_indices = inner.operand, starts
+  return _wrap(Slice(lexpr, start_indices, limit_indices, strides), shape)
+
+def rev(lexpr: LazyExpr, dimensions: Sequence[int]):
+  dimensions = tuple(map(int, dimensions))
+  inner = _unwrap(lexpr, Rev)
+  if inner is not None:
+    # Reversing a dimension twice leaves it as it was.
+    dimensions = tuple(sorted(set(inner.dimensions) ^ set(dimensions)))
+    lexpr = inner.operand
+    if not dimensions:
+      return lexpr
+  return _wrap(Rev(lexpr, dimensions), lexpr.shape)
+
+def reshape(lexpr: LazyExpr, new_sizes: Sequence[int]):
+  new_sizes = tuple(map(int, new_sizes))
+  inner = _unwrap(lexpr, Reshape)
+  if inner is not None:
+    lexpr = inner.operand
+  return _wrap(Reshape(lexpr, new_sizes), new_sizes)
+
+def convert_element_type(lexpr: LazyExpr, old_dtype, new_dtype):
+  inner = _unwrap(lexpr, Convert)
+  # Two conversions are one if the first is exact and the second either is
+  # exact too or converts back to the original dtype.
+  if (inner is not None and onp.can_cast(inner.old_dtype, old_dtype, 'safe') and
+      (onp.can_cast(old_dtype, new_dtype, 'safe') or
+       inner.old_dtype == new_dtype)):
+    lexpr, old_dtype = inner.operand, inner.old_dtype
+    if old_dtype == new_dtype:
+      return lexpr
+  return _wrap(Convert(lexpr, old_dtype, new_dtype), lexpr.shape)
+
+# Eager operations on DeviceArrays force their result into a buffer of its own,
+# rather than leave it lazy, if its expression nests more than
+# MAX_LAZY_NESTING operations, or if it would keep alive a buffer more than
+# MAX_LAZY_BASE_RATIO times the size of its value (e.g. big[::1000]).
+MAX_LAZY_NESTING = 16
+MAX_LAZY_BASE_RATIO = 8
+
+def nesting(lexpr: LazyExpr) -> int:
+  """The number of operations nested in a lazy expression."""
+  depth = 0
+  while type(lexpr.input) in _nested_inputs:
+    lexpr, depth = lexpr.input.operand, depth + 1
+  return depth
+
+def should_force(lexpr: LazyExpr) -> bool:
+  """Whether the value of `lexpr` is better kept in a buffer of its own."""
+  if type(lexpr.input) not in _nested_inputs:
+    return False
+  if nesting(lexpr) > MAX_LAZY_NESTING:
+    return True
+  return (not is_constant(lexpr) and
+          prod(array_var_shape(lexpr)) > MAX_LAZY_BASE_RATIO * prod(lexpr.shape))
+
+def _base(lexpr: LazyExpr) -> LazyExpr:
+  while type(lexpr.input) in _nested_inputs:
+    lexpr = lexpr.input.operand
+  return lexpr
+
 def is_constant(lexpr: Optional[LazyExpr]):
-  return lexpr is not None and type(lexpr.input) is not ArrayVar
+  return lexpr is not None and type(_base(lexpr).input) is not ArrayVar
 
 def is_trivial(lexpr: LazyExpr) -> bool:
   return (type(lexpr.input) is ArrayVar and
           lexpr.dims == tuple(range(len(lexpr.shape))))
 
 
+def array_var_shape(lexpr: LazyExpr) -> Tuple[int, ...]:
+  """The shape of the ArrayVar of a non-constant lazy expression."""
+  base = _base(lexpr)
+  shape = [None] * sum(d is not None for d in base.dims)
+  for d, size in zip(base.dims, base.shape):
+    if d is not None:
+      shape[d] = size
+  return tuple(shape)
+
+def array_var_dtype(lexpr: LazyExpr, dtype):
+  """The dtype of the ArrayVar of a lazy expression whose value has `dtype`."""
+  while type(lexpr.input) in _nested_inputs:
+    if type(lexpr.input) is Convert:
+      dtype = lexpr.input.old_dtype
+    lexpr = lexpr.input.operand
+  return dtype
+
+
 def eval_lexpr(lexpr, x):
   """Evaluate a lazy expression using NumPy.
   Args:
@@ -179,6 +312,22 @@ def eval_lexpr(lexpr, x):
              for i, d in enumerate(input_.shape)]
     eyes = [i1 == i2 for i1, i2 in zip(iotas[:-1], iotas[1:])]
     x = onp.asarray(functools.reduce(op.and_, eyes), input_.dtype)
+  elif t is Slice:
+    x = eval_lexpr(input_.operand, x)
+    x = x[tuple(map(_slice, input_.start_indices, input_.limit_indices,
+                    input_.strides))]
+  elif t is Rev:
+    x = eval_lexpr(input_.operand, x)
+    if input_.dimensions:
+      x = onp.flip(x, input_.dimensions)
+  elif t is Reshape:
+    x = onp.reshape(eval_lexpr(input_.operand, x), input_.new_sizes)
+  elif t is Convert:
+    x = eval_lexpr(input_.operand, x)
+    if (onp.issubdtype(input_.old_dtype, onp.complexfloating) and
+        not onp.issubdtype(input_.new_dtype, onp.complexfloating)):
+      x = onp.real(x)
+    x = onp.asarray(x, input_.new_dtype)
   else:
     assert False
 
@@ -238,6 +387,19 @@ def stage_lexpr(c, lexpr: Optional[LazyExpr], x):
              for i in range(len(input_.shape))]
     eyes = [xops.Eq(i1, i2) for i1, i2 in zip(iotas[:-1], iotas[1:])]
     x = xops.ConvertElementType(functools.reduce(xops.And, eyes), etype)
+  elif t is Slice:
+    x = xops.Slice(stage_lexpr(c, input_.operand, x), input_.start_indices,
+                   input_.limit_indices, input_.strides)
+  elif t is Rev:
+    x = xops.Rev(stage_lexpr(c, input_.operand, x), input_.dimensions)
+  elif t is Reshape:
+    x = xops.Reshape(stage_lexpr(c, input_.operand, x), input_.new_sizes)
+  elif t is Convert:
+    x = stage_lexpr(c, input_.operand, x)
+    if (onp.issubdtype(input_.old_dtype, onp.complexfloating) and
+        not onp.issubdtype(input_.new_dtype, onp.complexfloating)):
+      x = xops.Real(x)
+    x = xops.ConvertElementType(x, xb.dtype_to_etype(input_.new_dtype))
   else:
     assert False
 
@@ -78,6 +78,7 @@ _max = builtins.max
 _min = builtins.min
 _sum = builtins.sum
 _divmod = builtins.divmod
+_map = builtins.map
 
 # NumPy constants
 
@@ -2055,7 +2056,18 @@ def array(object, dtype=None, copy=True, order="K", ndmin=0):
     # this case is for duck-typed handling of objects that implement `__array__`
     out = array(object.__array__(), dtype and dtypes.canonicalize_dtype(dtype))
   elif isinstance(object, (list, tuple)):
-    if object:
+    leaves = _nested_sequence_leaves(object) if object else None
+    if leaves is not None:
+      # Nothing needs tracing, so build the whole array on the host in one pass
+      # and transfer it once, rather than stacking each element on the device.
+      if dtype:
+        to_dtype = dtypes.canonicalize_dtype(dtype)
+      elif leaves:
+        to_dtype = dtypes.result_type(*_map(_canonical_leaf_dtype, leaves))
+      else:
+        to_dtype = dtypes.canonicalize_dtype(float_)
+      out = device_put(onp.array(object, dtype=to_dtype))
+    elif object:
       out = stack([array(elt, dtype=dtype) for elt in object])
     else:
       out = onp.array([], dtype or float_)
@@ -2073,6 +2085,32 @@ def array(object, dtype=None, copy=True, order="K", ndmin=0):
     out = lax.reshape(out, (1,) * (ndmin - ndim(out)) + shape(out))
   return out
 
+def _nested_sequence_leaves(object):
+  """The leaves of nested lists and tuples, if they are all concrete values.
+
+  Returns None if any leaf is a tracer or another value that `array` can't
+  convert with `onp.array`, such as an object defining `__array__`.
+  """
+  leaves = []
+  def visit(x):
+    if isinstance(x, (list, tuple)):
+      return _all(visit(y) for y in x)
+    if (type(x) in dtypes.python_scalar_dtypes or
+        isinstance(x, (onp.ndarray, onp.generic, DeviceArray))):
+      leaves.append(x)
+      return True
+    return False
+  return leaves if visit(object) else None
+
+def _canonical_leaf_dtype(x):
+  """The dtype (or weakly-typed value) `array(x)` would promote with `stack`."""
+  if type(x) in dtypes.python_scalar_dtypes:
+    return dtypes.canonicalize_dtype(dtypes.python_scalar_dtypes[type(x)])
+  elif isinstance(x, DeviceArray):
+    return x
+  else:
+    return dtypes.canonicalize_dtype(x.dtype)
+
 @_wraps(onp.asarray)
 def asarray(a, dtype=None, order=None):
   lax._check_user_dtype_supported(dtype, "asarray")
@@ -3205,9 +3243,47 @@ def _rewriting_take(arr, idx):
   # All supported cases of indexing can be implemented as an XLA gather,
   # followed by an optional reverse and a reshape.
   arr = asarray(arr)
+  if type(arr) is DeviceArray:
+    result = _lazy_strided_take(arr, idx)
+    if result is not None:
+      return result
   treedef, static_idx, dynamic_idx = _split_index_for_jit(idx)
   return _gather(arr, treedef, static_idx, dynamic_idx)
 
+def _lazy_strided_take(arr, idx):
+  # Computes arr[idx] as a lazy DeviceArray expression, if idx only strides or
+  # reverses whole axes (e.g. x[::2], x[:, ::-1, None]). Returns None otherwise.
+  # Indices with ints or slice bounds go through gather instead, so that eager
+  # loops over them don't compile a computation per index.
+  idx = _eliminate_deprecated_list_indexing(idx)
+  for i in idx:
+    if not (i is None or i is Ellipsis or
+            type(i) is slice and i.start is None and i.stop is None and
+            (i.step is None or type(i.step) is int and i.step != 0)):
+      return None
+  start, limit, strides, reversed_dims, out_shape = [], [], [], [], []
+  for i in _canonicalize_tuple_index(arr.ndim, idx):
+    if i is None:
+      out_shape.append(1)
+      continue
+    first, last, step = i.indices(arr.shape[len(start)])
+    size = len(range(first, last, step))
+    if size == 0:
+      return None
+    if step < 0:
+      first, step = first + (size - 1) * step, -step
+      reversed_dims.append(len(start))
+    start.append(first)
+    limit.append(first + (size - 1) * step + 1)
+    strides.append(step)
+    out_shape.append(size)
+  y = arr
+  if _any(s != 1 for s in strides):
+    y = lax.slice(y, start, limit, strides)
+  if reversed_dims:
+    y = lax.rev(y, reversed_dims)
+  return lax.reshape(y, tuple(out_shape))
+
 # TODO(phawkins): re-enable jit after fixing excessive recompilation for
 # slice indexes (e.g., slice(0, 5, None), slice(10, 15, None), etc.).
 # @partial(jit, static_argnums=(1, 2))
@@ -12,8 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from collections import defaultdict
+from contextlib import contextmanager
 from functools import wraps
-from typing import Callable
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Tuple
 
 from .lib import xla_client
 
@@ -86,3 +92,154 @@ def trace_function(func: Callable, name: str = None, **kwargs):
       return func(*args, **kwargs)
     return wrapper
   return wrapper
+
+
+# -------------------- dispatch phase instrumentation --------------------
+
+PHASES = ("trace", "lower", "compile", "transfer", "execute", "result")
+
+class PhaseEvent(NamedTuple):
+  """A timed phase of compiling or dispatching a computation.
+
+  Attributes:
+    phase: one of `PHASES`: tracing a Python function to a jaxpr, lowering a
+      jaxpr or primitive to an XLA computation, compiling it, transferring
+      arguments to devices, launching the executable, and wrapping its results.
+      Execution is asynchronous on most backends, so "execute" measures the
+      time to launch the computation rather than to run it.
+    name: the name of the jitted or pmapped function, or of the primitive.
+    start: the value of `time.perf_counter()` when the phase started.
+    duration: the length of the phase in seconds.
+    thread_id: the id of the thread the phase ran on.
+  """
+  phase: str
+  name: str
+  start: float
+  duration: float
+  thread_id: int
+
+_listeners: List[Callable[[PhaseEvent], None]] = []
+
+def add_listener(listener: Callable[[PhaseEvent], None]):
+  """Calls `listener` with a `PhaseEvent` at the end of each dispatch phase.
+
+  Listeners may be called from any thread that dispatches JAX computations.
+  While no listeners are registered, instrumentation costs a single check per
+  phase.
+  """
+  _listeners.append(listener)
+
+def remove_listener(listener: Callable[[PhaseEvent], None]):
+  _listeners.remove(listener)
+
+@contextmanager
+def listen(listener: Callable[[PhaseEvent], None]):
+  """Context manager that registers `listener` for the duration of its body.
+
+  For example:
+
+  >>> counters = jax.profiler.PhaseCounters()
+  >>> with jax.profiler.listen(counters):
+  ...   f(x).block_until_ready()
+  >>> print(counters.to_prometheus())
+  """
+  add_listener(listener)
+  try:
+    yield listener
+  finally:
+    remove_listener(listener)
+
+
+class _Phase(object):
+  __slots__ = ["phase", "name", "start"]
+
+  def __init__(self, phase, name):
+    self.phase = phase
+    self.name = name
+
+  def __enter__(self):
+    self.start = time.perf_counter()
+
+  def __exit__(self, *exc_info):
+    duration = time.perf_counter() - self.start
+    event = PhaseEvent(self.phase, self.name, self.start, duration,
+                       threading.get_ident())
+    for listener in list(_listeners):
+      listener(event)
+
+class _NoPhase(object):
+  __slots__ = []
+  def __enter__(self): pass
+  def __exit__(self, *exc_info): pass
+
+_no_phase = _NoPhase()
+
+def phase(phase: str, name: str):
+  """Context manager timing a dispatch phase, used internally by JAX."""
+  return _Phase(phase, name) if _listeners else _no_phase
+
+
+class PhaseCounters(object):
+  """Listener counting the number of and the time spent in each phase.
+
+  The counts are keyed on `(phase, name)` and can be exported in the
+  Prometheus text exposition format with `to_prometheus`.
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.counts: Dict[Tuple[str, str], int] = defaultdict(int)
+    self.seconds: Dict[Tuple[str, str], float] = defaultdict(float)
+
+  def __call__(self, event: PhaseEvent):
+    key = event.phase, event.name
+    with self._lock:
+      self.counts[key] += 1
+      self.seconds[key] += event.duration
+
+  def to_prometheus(self, prefix: str = "jax") -> str:
+    with self._lock:
+      items = sorted(self.counts.items())
+      seconds = dict(self.seconds)
+    lines = ["# TYPE {}_phase_calls_total counter".format(prefix)]
+    lines.extend('{}_phase_calls_total{} {}'.format(prefix, _labels(*key), count)
+                 for key, count in items)
+    lines.append("# TYPE {}_phase_seconds_total counter".format(prefix))
+    lines.extend('{}_phase_seconds_total{} {!r}'.format(prefix, _labels(*key),
+                                                       seconds[key])
+                 for key, _ in items)
+    return "\n".join(lines) + "\n"
+
+def _labels(phase, name):
+  escape = lambda s: (s.replace("\\", "\\\\").replace('"', '\\"')
+                      .replace("\n", "\\n"))
+  return '{{phase="{}",name="{}"}}'.format(escape(phase), escape(name))
+
+
+class ChromeTrace(object):
+  """Listener recording phases in the Chrome trace event format.
+
+  The output of `save` can be opened in chrome://tracing or Perfetto.
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.events: List[PhaseEvent] = []
+
+  def __call__(self, event: PhaseEvent):
+    with self._lock:
+      self.events.append(event)
+
+  def to_json(self) -> dict:
+    pid = os.getpid()
+    with self._lock:
+      events = list(self.events)
+    return {"traceEvents": [
+        {"name": "{} {}".format(e.phase, e.name), "cat": e.phase, "ph": "X",
+         "ts": e.start * 1e6, "dur": e.duration * 1e6, "pid": pid,
+         "tid": e.thread_id}
+        for e in events]}
+
+  def save(self, path: str):
+    with open(path, "w") as f:
+      json.dump(self.to_json(), f)
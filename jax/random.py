@@ -22,13 +22,15 @@ https://github.com/google/jax/blob/master/design_notes/prng.md
 
 
 from functools import partial
-from typing import Optional, Sequence, Union
+import os
+from typing import Callable, Dict, NamedTuple, Optional, Sequence, Tuple, Union
 import warnings
 
 import numpy as onp
 
 from . import lax
 from . import numpy as np
+from . import ops
 from . import dtypes
 from .api import jit, vmap
 from .numpy.lax_numpy import _constant_like, asarray
@@ -41,21 +43,40 @@ from jax.numpy.linalg import cholesky
 from jax.scipy.special import logit
 from jax.interpreters import ad
 from jax.interpreters import batching
+from jax.interpreters import cost
 from jax.interpreters import xla
 from jax.util import prod
+from jax.config import flags
 
+FLAGS = flags.FLAGS
+flags.DEFINE_string(
+    'jax_prng_impl', os.getenv('JAX_PRNG_IMPL', 'threefry2x32'),
+    help='The PRNG implementation used by PRNGKey when none is given: '
+         '"threefry2x32" (the default), "philox4x32", "unsafe_philox4x32", or '
+         'the name of an implementation added with register_prng_impl.')
 
-def PRNGKey(seed: int) -> np.ndarray:
+
+def PRNGKey(seed: int, impl: Optional[Union[str, 'PRNGImpl']] = None
+            ) -> np.ndarray:
   """Create a pseudo-random number generator (PRNG) key given an integer seed.
 
   Args:
     seed: a 64- or 32-bit integer used as the value of the key.
+    impl: optional, the PRNG implementation to use, either a `PRNGImpl` or the
+      name of a registered one (default given by the `jax_prng_impl` flag).
+      All functions consuming the key, including `split` and `fold_in`, use the
+      same implementation.
 
   Returns:
-    A PRNG key, which is modeled as an array of shape (2,) and dtype uint32. The
-    key is constructed from a 64-bit seed by effectively bit-casting to a pair
-    of uint32 values (or from a 32-bit seed by first padding out with zeros).
+    A PRNG key, which is modeled as a uint32 array whose shape depends on the
+    implementation; it is (2,) for the default "threefry2x32". The first two
+    words are constructed from a 64-bit seed by effectively bit-casting to a
+    pair of uint32 values (or from a 32-bit seed by first padding out with
+    zeros).
   """
+  return _prng_impl(impl).seed(seed)
+
+def _threefry_seed(seed):
   if onp.shape(seed):
     raise TypeError("PRNGKey seed must be a scalar.")
   convert = lambda k: lax.reshape(lax.convert_element_type(k, onp.uint32), [1])
@@ -68,13 +89,85 @@ def PRNGKey(seed: int) -> np.ndarray:
   k2 = convert(np.bitwise_and(seed, 0xFFFFFFFF))
   return lax.concatenate([k1, k2], 0)
 
-def _is_prng_key(key: np.ndarray) -> bool:
+def _is_prng_key(key: np.ndarray, batch_ndim: int = 0) -> bool:
   try:
-    return key.shape == (2,) and key.dtype == onp.uint32
+    return (key.ndim >= batch_ndim and
+            key.shape[batch_ndim:] in _prng_impls_by_shape and
+            key.dtype == onp.uint32)
   except AttributeError:
     return False
 
 
+### PRNG implementations
+
+
+class PRNGImpl(NamedTuple):
+  """A pseudo-random number generator implementation.
+
+  Keys of an implementation are uint32 arrays of shape `key_shape`. Functions
+  taking a key select the implementation by the shape of the key, which is
+  static under `jit` and `vmap`, so registered implementations must have
+  distinct key shapes.
+
+  Attributes:
+    name: the name the implementation is registered under.
+    key_shape: the shape of the keys of the implementation.
+    seed: maps an integer seed to a key.
+    split: maps a key and a static positive integer `num` to an array of `num`
+      stacked keys.
+    fold_in: maps a key and a 32-bit integer to a new key.
+    random_bits: maps a key and a static nonnegative integer `count` to a
+      vector of `count` random uint32 values.
+    batched: whether `split`, `fold_in` and `random_bits` also accept arrays of
+      keys with leading batch dimensions, and `fold_in` data broadcasting
+      against them, mapping over the keys. If not, they are mapped with `vmap`
+      by the `batch_*` functions.
+  """
+  name: str
+  key_shape: Tuple[int, ...]
+  seed: Callable
+  split: Callable
+  fold_in: Callable
+  random_bits: Callable
+  batched: bool = False
+
+_prng_impls: Dict[str, PRNGImpl] = {}
+_prng_impls_by_shape: Dict[Tuple[int, ...], PRNGImpl] = {}
+
+def register_prng_impl(impl: PRNGImpl) -> None:
+  """Makes `impl` selectable by name in `PRNGKey` and the `jax_prng_impl` flag."""
+  other = _prng_impls_by_shape.get(impl.key_shape)
+  if other is not None and other.name != impl.name:
+    raise ValueError("PRNG implementation {} has the same key shape {} as {}."
+                     .format(impl.name, impl.key_shape, other.name))
+  _prng_impls[impl.name] = impl
+  _prng_impls_by_shape[impl.key_shape] = impl
+
+def _prng_impl(impl) -> PRNGImpl:
+  if isinstance(impl, PRNGImpl):
+    return impl
+  name = FLAGS.jax_prng_impl if impl is None else impl
+  try:
+    return _prng_impls[name]
+  except KeyError:
+    raise ValueError("Unknown PRNG implementation {}; expected one of {}."
+                     .format(name, sorted(_prng_impls))) from None
+
+def _key_impl(key, batch_ndim: int = 0) -> PRNGImpl:
+  try:
+    return _prng_impls_by_shape[np.shape(key)[batch_ndim:]]
+  except KeyError:
+    if batch_ndim:
+      raise TypeError("Expected an array of PRNG keys with {} leading axes and "
+                      "trailing shape one of {}, got an array of shape {}."
+                      .format(batch_ndim, sorted(_prng_impls_by_shape),
+                              np.shape(key))) from None
+    raise TypeError("Expected a PRNG key with one of the shapes {}, got an "
+                    "array of shape {}."
+                    .format(sorted(_prng_impls_by_shape), np.shape(key))
+                    ) from None
+
+
 ### utilities
 
 
@@ -193,6 +286,9 @@ threefry2x32_p.multiple_results = True
 threefry2x32_p.def_impl(partial(xla.apply_primitive, threefry2x32_p))
 threefry2x32_p.def_abstract_eval(_threefry2x32_abstract_eval)
 batching.defbroadcasting(threefry2x32_p)
+# 20 rounds of an add, a rotate (two shifts and an or) and an xor, plus five key
+# injections of two adds each, for every pair of output words.
+cost.defelementwise(threefry2x32_p, (20 * 5 + 5 * 2) // 2)
 xla.translations[threefry2x32_p] = xla.lower_fun(
     partial(_threefry2x32_lowering, use_rolled_loops=False))
 xla.backend_specific_translations['cpu'][threefry2x32_p] = xla.lower_fun(
@@ -229,42 +325,214 @@ def threefry_2x32(keypair, count):
   return lax.reshape(out[:-1] if odd_size else out, count.shape)
 
 
+def _threefry_iota(key, count: int):
+  """Computes ``threefry_2x32(key, lax.iota(onp.uint32, count))``.
+
+  The two halves of the counter array are generated directly as iotas that XLA
+  can fuse into the hash, instead of being materialized, split, and padded with
+  a zero when `count` is odd.
+
+  `key` may also be an array of keys with leading batch dimensions, in which
+  case the results for all of them are computed by a single hash.
+  """
+  batch_shape = np.shape(key)[:-1]
+  axis = len(batch_shape)
+  half = (count + 1) // 2
+  x0 = lax.tie_in(key, lax.broadcasted_iota(onp.uint32, batch_shape + (half,),
+                                            axis))
+  x1 = lax.add(x0, onp.uint32(half))
+  if count % 2:
+    # The padding counter that completes the last pair is zero, not `count`.
+    x1 = lax.rem(x1, onp.uint32(count))
+  k0, k1 = key[..., 0], key[..., 1]
+  if batch_shape:
+    dims = tuple(range(axis))
+    k0 = lax.broadcast_in_dim(k0, x0.shape, dims)
+    k1 = lax.broadcast_in_dim(k1, x0.shape, dims)
+  y0, y1 = threefry2x32_p.bind(k0, k1, x0, x1)
+  return lax.concatenate(
+      [y0, lax.slice_in_dim(y1, 0, count - half, axis=axis)], axis)
+
+
 def split(key: np.ndarray, num: int = 2) -> np.ndarray:
   """Splits a PRNG key into `num` new keys by adding a leading axis.
 
   Args:
-    key: a PRNGKey (an array with shape (2,) and dtype uint32).
+    key: a PRNGKey (an array with shape (2,) and dtype uint32 for the default
+      implementation).
     num: optional, a positive integer indicating the number of keys to produce
       (default 2).
 
   Returns:
-    An array with shape (num, 2) and dtype uint32 representing `num` new keys.
+    An array with shape (num, 2) and dtype uint32 representing `num` new keys,
+    or shape (num,) + key.shape for other implementations.
   """
-  return _split(key, num)
+  return _key_impl(key).split(key, num)
 
 @partial(jit, static_argnums=(1,))
 def _split(key, num):
-  counts = lax.tie_in(key, lax.iota(onp.uint32, num * 2))
-  return lax.reshape(threefry_2x32(key, counts), (num, 2))
+  batch_shape = np.shape(key)[:-1]
+  return lax.reshape(_threefry_iota(key, num * 2), batch_shape + (num, 2))
 
 
 def fold_in(key, data):
   """Folds in data to a PRNG key to form a new PRNG key.
 
   Args:
-    key: a PRNGKey (an array with shape (2,) and dtype uint32).
+    key: a PRNGKey (an array with shape (2,) and dtype uint32 for the default
+      implementation).
     data: a 32bit integer representing data to be folded in to the key.
 
   Returns:
     A new PRNGKey that is a deterministic function of the inputs and is
-    statistically safe for producing a stream of new pseudo-random values.
+    statistically safe for producing a stream of new pseudo-random values
+    (except with the "unsafe_philox4x32" implementation).
   """
-  return _fold_in(key, data)
+  return _key_impl(key).fold_in(key, data)
 
 @jit
 def _fold_in(key, data):
-  key2 = lax.tie_in(key, PRNGKey(data))
-  return threefry_2x32(key, key2)
+  # Hashes the counter pair `_threefry_seed(data)`, elementwise over data that
+  # broadcasts against the leading dimensions of `key`.
+  shape = np.shape(key)[:-1] + (1,)
+  data = lax.tie_in(key, np.reshape(np.broadcast_to(data, shape[:-1]), shape))
+  hi = lax.shift_right_logical(data, lax._const(data, 32))
+  lo = np.bitwise_and(data, 0xFFFFFFFF)
+  dims = tuple(range(len(shape)))
+  k0, k1 = (lax.broadcast_in_dim(key[..., i], shape, dims[:-1]) for i in (0, 1))
+  y0, y1 = threefry2x32_p.bind(k0, k1, lax.convert_element_type(hi, onp.uint32),
+                               lax.convert_element_type(lo, onp.uint32))
+  return lax.concatenate([y0, y1], len(shape) - 1)
+
+
+_MAX_COUNT_PER_KEY = int(onp.iinfo(onp.uint32).max)
+
+def _threefry_random_bits(key, count):
+  if count < _MAX_COUNT_PER_KEY:
+    return _threefry_iota(key, count)
+  # Counters are 32 bits wide, so larger requests are split into equal blocks
+  # of counters, each hashed with its own subkey, in a single batched call.
+  batch_shape = np.shape(key)[:-1]
+  num_blocks = -(-count // (_MAX_COUNT_PER_KEY - 1))
+  block_size = -(-count // num_blocks)
+  bits = _threefry_iota(_split(key, num_blocks), block_size)
+  bits = lax.reshape(bits, batch_shape + (num_blocks * block_size,))
+  return lax.slice_in_dim(bits, 0, count, axis=len(batch_shape))
+
+register_prng_impl(PRNGImpl(
+    "threefry2x32", (2,), _threefry_seed, _split, _fold_in,
+    _threefry_random_bits, batched=True))
+
+
+_PHILOX_M0, _PHILOX_M1 = 0xD2511F53, 0xCD9E8D57
+_PHILOX_W0, _PHILOX_W1 = 0x9E3779B9, 0xBB67AE85
+
+def _mulhilo32(a, b: int):
+  """Returns the high and low words of the 64-bit product of `a` and `b`.
+
+  Only 32-bit arithmetic is used, since uint64 is unavailable unless
+  jax_enable_x64 is set.
+  """
+  lo = a * onp.uint32(b)
+  mask = onp.uint32(0xFFFF)
+  shift = lambda x: lax.shift_right_logical(x, lax._const(x, 16))
+  a_lo, a_hi = a & mask, shift(a)
+  b_lo, b_hi = onp.uint32(b & 0xFFFF), onp.uint32(b >> 16)
+  lo_lo, lo_hi, hi_lo = a_lo * b_lo, a_lo * b_hi, a_hi * b_lo
+  mid = shift(lo_lo) + (lo_hi & mask) + (hi_lo & mask)
+  hi = a_hi * b_hi + shift(lo_hi) + shift(hi_lo) + shift(mid)
+  return hi, lo
+
+def philox_4x32(keypair, counters, rounds: int = 10):
+  """Apply the Philox 4x32 bijection.
+
+  Args:
+    keypair: a pair of 32bit unsigned integers used for the key.
+    counters: four arrays of dtype uint32 with broadcast-compatible shapes
+      holding the words of the counters.
+    rounds: optional, the number of rounds (default 10, the recommended
+      number; 7 is the smallest that passes the BigCrush test suite).
+
+  Returns:
+    Four arrays of dtype uint32 holding the words of the outputs.
+  """
+  k0, k1 = (np.asarray(k, onp.uint32) for k in keypair)
+  c0, c1, c2, c3 = (np.asarray(c, onp.uint32) for c in counters)
+  for i in range(rounds):
+    if i:
+      k0, k1 = k0 + onp.uint32(_PHILOX_W0), k1 + onp.uint32(_PHILOX_W1)
+    hi0, lo0 = _mulhilo32(c0, _PHILOX_M0)
+    hi1, lo1 = _mulhilo32(c2, _PHILOX_M1)
+    c0, c1, c2, c3 = hi1 ^ c1 ^ k0, lo1, hi0 ^ c3 ^ k1, lo0
+  return c0, c1, c2, c3
+
+def _philox_bits(key, count, stream, rounds):
+  # The low two counter words enumerate the outputs, the high two identify the
+  # stream. Counts that don't fit in the lowest word also use the second.
+  num_counters = -(-count // 4)
+  rows = max(1, -(-num_counters // (_MAX_COUNT_PER_KEY - 1)))
+  shape = (rows, -(-num_counters // rows))
+  lo = lax.tie_in(key, lax.broadcasted_iota(onp.uint32, shape, 1))
+  hi = lax.tie_in(key, lax.broadcasted_iota(onp.uint32, shape, 0))
+  s0, s1 = (lax.broadcast(s, shape) for s in stream)
+  bits = np.stack(philox_4x32((key[0], key[1]), (lo, hi, s0, s1), rounds), -1)
+  return lax.slice(lax.reshape(bits, (4 * prod(shape),)), (0,), (count,))
+
+# Keys of "philox4x32" hold the two key words and the two high counter words.
+
+def _philox_seed(seed):
+  return lax.concatenate([_threefry_seed(seed), onp.zeros(2, onp.uint32)], 0)
+
+@partial(jit, static_argnums=(1,))
+def _philox_split(key, num):
+  lo = lax.tie_in(key, lax.iota(onp.uint32, num))
+  hi = lax.full((num,), onp.uint32(0xFFFFFFFE))  # reserved for split
+  s0, s1 = lax.broadcast(key[2], (num,)), lax.broadcast(key[3], (num,))
+  return np.stack(philox_4x32((key[0], key[1]), (lo, hi, s0, s1)), 1)
+
+@jit
+def _philox_fold_in(key, data):
+  lo = lax.convert_element_type(data, onp.uint32)
+  hi = onp.uint32(0xFFFFFFFF)  # reserved for fold_in
+  return np.stack(philox_4x32((key[0], key[1]), (lo, hi, key[2], key[3])))
+
+def _philox_random_bits(key, count):
+  return _philox_bits(key, count, (key[2], key[3]), rounds=10)
+
+register_prng_impl(PRNGImpl(
+    "philox4x32", (4,), _philox_seed, _philox_split, _philox_fold_in,
+    _philox_random_bits))
+
+# Keys of "unsafe_philox4x32" hold the two key words and a stream word. It uses
+# the reduced-round Philox4x32-7 to generate bits, and `split` and `fold_in`
+# just step the stream word along a Weyl sequence rather than hashing. Keys
+# derived along different paths (e.g. `split(split(k)[0])[1]` and
+# `split(k)[1]`) can therefore coincide, so it is only meant for uses such as
+# dropout, where a root key is folded with a step number once.
+
+def _unsafe_philox_seed(seed):
+  return lax.concatenate([_threefry_seed(seed), onp.zeros(1, onp.uint32)], 0)
+
+def _weyl_step(stream, n):
+  return stream + (n + onp.uint32(1)) * onp.uint32(_PHILOX_W0)
+
+@partial(jit, static_argnums=(1,))
+def _unsafe_philox_split(key, num):
+  streams = _weyl_step(key[2], lax.tie_in(key, lax.iota(onp.uint32, num)))
+  return np.stack([lax.broadcast(key[0], (num,)),
+                   lax.broadcast(key[1], (num,)), streams], 1)
+
+@jit
+def _unsafe_philox_fold_in(key, data):
+  stream = _weyl_step(key[2], lax.convert_element_type(data, onp.uint32))
+  return np.stack([key[0], key[1], stream])
+
+def _unsafe_philox_random_bits(key, count):
+  return _philox_bits(key, count, (key[2], onp.uint32(0)), rounds=7)
+
+register_prng_impl(PRNGImpl(
+    "unsafe_philox4x32", (3,), _unsafe_philox_seed, _unsafe_philox_split,
+    _unsafe_philox_fold_in, _unsafe_philox_random_bits))
 
 
 def _random_bits(key, bit_width, shape):
@@ -273,17 +541,36 @@ def _random_bits(key, bit_width, shape):
     raise TypeError("_random_bits got invalid prng key.")
   if bit_width not in (32, 64):
     raise TypeError("requires 32- or 64-bit field width.")
-  max_count = (bit_width // 32) * onp.prod(shape)
-  if max_count >= np.iinfo(onp.uint32).max:
-    # TODO(mattjj): just split the key here
-    raise TypeError("requesting more random bits than a single call provides.")
+  max_count = (bit_width // 32) * prod(shape)
+  bits = _key_impl(key).random_bits(key, max_count)
+  return lax.reshape(_combine_bits(bits, bit_width), shape)
+
+def _batch_random_bits(keys, bit_width, shape):
+  """Sample random bits of given width and shape for each of an array of keys."""
+  if not _is_prng_key(keys, batch_ndim=1) or keys.ndim != 2:
+    raise TypeError("_batch_random_bits got invalid array of prng keys.")
+  if bit_width not in (32, 64):
+    raise TypeError("requires 32- or 64-bit field width.")
+  max_count = (bit_width // 32) * prod(shape)
+  impl = _key_impl(keys, 1)
+  if impl.batched:
+    bits = impl.random_bits(keys, max_count)
+  else:
+    bits = vmap(partial(impl.random_bits, count=max_count))(keys)
+  return lax.reshape(_combine_bits(bits, bit_width),
+                     keys.shape[:1] + tuple(shape))
 
-  counts = lax.tie_in(key, lax.iota(onp.uint32, max_count))
-  bits = threefry_2x32(key, counts)
+def _combine_bits(bits, bit_width):
+  # 64-bit values take their high and low words from the first and second
+  # halves of the trailing axis of `bits`.
   if bit_width == 64:
-    bits = [lax.convert_element_type(x, onp.uint64) for x in np.split(bits, 2)]
-    bits = lax.shift_left(bits[0], onp.uint64(32)) | bits[1]
-  return lax.reshape(bits, shape)
+    axis = np.ndim(bits) - 1
+    half = np.shape(bits)[axis] // 2
+    hi = lax.slice_in_dim(bits, 0, half, axis=axis)
+    lo = lax.slice_in_dim(bits, half, 2 * half, axis=axis)
+    hi, lo = (lax.convert_element_type(x, onp.uint64) for x in (hi, lo))
+    bits = lax.shift_left(hi, onp.uint64(32)) | lo
+  return bits
 
 
 ### random samplers
@@ -327,19 +614,23 @@ def uniform(key: np.ndarray,
 @partial(jit, static_argnums=(1, 2))
 def _uniform(key, shape, dtype, minval, maxval):
   _check_shape("uniform", shape)
+  bits = _random_bits(key, _uniform_bit_width(dtype), shape)
+  return _uniform_from_bits(bits, shape, dtype, minval, maxval)
+
+def _uniform_bit_width(dtype):
   if not np.issubdtype(dtype, onp.floating):
     raise TypeError("uniform only accepts floating point dtypes.")
+  nbits = np.finfo(dtype).bits
+  if nbits not in (32, 64):
+    raise TypeError("uniform only accepts 32- or 64-bit dtypes.")
+  return nbits
 
+def _uniform_from_bits(bits, shape, dtype, minval, maxval):
   minval = lax.convert_element_type(minval, dtype)
   maxval = lax.convert_element_type(maxval, dtype)
   finfo = np.finfo(dtype)
   nbits, nmant = finfo.bits, finfo.nmant
 
-  if nbits not in (32, 64):
-    raise TypeError("uniform only accepts 32- or 64-bit dtypes.")
-
-  bits = _random_bits(key, nbits, shape)
-
   # The strategy here is to randomize only the mantissa bits with an exponent of
   # 1 (after applying the bias), then shift and scale to the desired range. The
   # bit-level transformation we use relies on Numpy and XLA having bit-for-bit
@@ -435,6 +726,10 @@ def shuffle(key: np.ndarray, x: np.ndarray, axis: int = 0) -> np.ndarray:
   return _shuffle(key, x, axis)
 
 
+# Permutations of at least this many elements are computed elementwise with
+# `permutation_index` rather than by sorting.
+_MIN_INDEX_PERMUTATION_SIZE = 2 ** 20
+
 def permutation(key, x):
   """
   Permute elements of an array along its first axis or return a permuted range.
@@ -442,6 +737,10 @@ def permutation(key, x):
   If `x` is a multi-dimensional array, it is only shuffled along its
   first index.
 
+  Permutations of fewer than 2 ** 20 elements are sampled by repeatedly sorting
+  by random keys. Larger ones are computed in linear time, without sorting, as
+  ``permutation_index(key, np.arange(n), n)`` for the length `n` of the axis.
+
   Args:n
     key: a PRNGKey used as the random key.
     x: the array or integer range to be shuffled.
@@ -454,7 +753,11 @@ def permutation(key, x):
     if not onp.issubdtype(lax.dtype(x), onp.integer):
       raise TypeError("x must be an integer or at least 1-dimensional")
     x = int(x)
+    if x >= _MIN_INDEX_PERMUTATION_SIZE:
+      return _index_permutation(key, x)
     return _shuffle(key, np.arange(x), 0)
+  elif x.shape[0] >= _MIN_INDEX_PERMUTATION_SIZE:
+    return np.asarray(x)[_index_permutation(key, x.shape[0])]
   elif onp.ndim(x) == 1:
     return _shuffle(key, x, 0)
   else:
@@ -462,6 +765,112 @@ def permutation(key, x):
     return x[ind]
 
 
+def permutation_index(key: np.ndarray, index: np.ndarray, n: int) -> np.ndarray:
+  """Computes elements of a random permutation of ``range(n)`` on the fly.
+
+  The permutation is determined by `key` and `n` alone, so a streaming data
+  loader can map the i-th step of an epoch to ``permutation_index(key, i, n)``
+  without materializing the whole permutation. Each element costs a small
+  constant number of hashes on average.
+
+  The permutation is a keyed Feistel network on the smallest domain of
+  ``2 ** b >= n`` integers (with b at least 2), restricted to ``range(n)`` by
+  cycle walking: outputs of at least `n` are permuted again until they fall in
+  the range.
+
+  Args:
+    key: a PRNGKey used as the random key.
+    index: an integer or array of integers in ``range(n)``.
+    n: a concrete positive integer, the size of the permutation. It can be at
+      most ``2 ** 32`` if ``jax_enable_x64`` is set, and ``2 ** 31`` otherwise,
+      so that the elements fit in the default integer dtype.
+
+  Returns:
+    An array of the same shape as `index` holding the elements of the
+    permutation at positions `index`, of the default integer dtype.
+  """
+  n = core.concrete_or_error(int, n, "in jax.random.permutation_index")
+  return _permutation_index(key, index, n)
+
+_FEISTEL_ROUNDS = 6
+
+@partial(jit, static_argnums=(2,))
+def _permutation_index(key, index, n):
+  out_dtype = dtypes.canonicalize_dtype(onp.int64)
+  max_n = min(2 ** 32, onp.iinfo(out_dtype).max + 1)
+  if not 0 < n <= max_n:
+    raise ValueError("permutation_index requires 0 < n <= {}, got {}."
+                     .format(max_n, n))
+  nbits = max(2, (n - 1).bit_length())
+  round_keys = _random_bits(key, 32, (_FEISTEL_ROUNDS, 2))
+
+  def feistel(x):
+    # An unbalanced Feistel network on `nbits`-bit integers: each round swaps
+    # the high and low parts and mixes a hash of the low part into the high.
+    hi_bits, lo_bits = nbits // 2, nbits - nbits // 2
+    for i in range(_FEISTEL_ROUNDS):
+      hi = lax.shift_right_logical(x, lax._const(x, lo_bits))
+      lo = x & onp.uint32((1 << lo_bits) - 1)
+      f, _ = threefry2x32_p.bind(round_keys[i, 0], round_keys[i, 1], lo,
+                                 lax.full_like(lo, 0))
+      hi = hi ^ (f & onp.uint32((1 << hi_bits) - 1))
+      x = (lo << onp.uint32(hi_bits)) | hi
+      hi_bits, lo_bits = lo_bits, hi_bits
+    return x
+
+  x = feistel(lax.convert_element_type(index, onp.uint32))
+  if n < 2 ** nbits:
+    x = _cycle_walk(feistel, x, n, 1 - n / 2 ** nbits)
+  return lax.convert_element_type(x, out_dtype)
+
+def _cycle_walk(step, x, n, p):
+  """Applies `step` to each element of `x` until it's less than `n`.
+
+  `step` is a bijection of which a fraction `p` of the outputs are at least
+  `n`, so each element takes a geometrically distributed number of steps, on
+  average at most ``1 / (1 - p)``. Stepping the whole of `x` until its slowest
+  element is done would take O(log x.size) steps, so instead the elements still
+  out of range are gathered into buffers of decreasing capacity, each a little
+  more than `p` times the previous one, and only those are stepped. That keeps
+  the total work linear in the size of `x`.
+  """
+  out_of_range = lambda v: v >= onp.uint32(n)
+  walk = lambda v: lax.while_loop(
+      lambda v: np.any(out_of_range(v)),
+      lambda v: np.where(out_of_range(v), step(v), v), v)
+  shape, x = x.shape, np.ravel(x)
+  size = capacity = x.shape[0]
+  vals, slots = x, lax.tie_in(x, lax.iota(onp.int32, size))
+  # The extra slot `size` absorbs the writes of unused buffer entries.
+  out = np.concatenate([x, np.zeros(1, x.dtype)])
+  staged = False
+  while True:
+    # Overflowing a buffer is at least 4 standard deviations away.
+    next_capacity = int(p * capacity + 4 * onp.sqrt(capacity)) + 8
+    if 4 * next_capacity > 3 * capacity:
+      break
+    pending = out_of_range(vals)
+    pos = np.cumsum(pending) - 1
+    dest = np.where(pending & (pos < next_capacity), pos, next_capacity)
+    vals = ops.index_update(np.zeros(next_capacity + 1, vals.dtype),
+                            dest, vals)[:-1]
+    slots = ops.index_update(np.full(next_capacity + 1, size, slots.dtype),
+                             dest, slots)[:-1]
+    vals = step(vals)
+    out = ops.index_update(out, slots, vals)
+    capacity, staged = next_capacity, True
+  if not staged:
+    return np.reshape(walk(x), shape)
+  out = ops.index_update(out, slots, walk(vals))[:size]
+  # Finishes any elements that didn't fit in a buffer, which is unlikely.
+  return np.reshape(walk(out), shape)
+
+@partial(jit, static_argnums=(1,))
+def _index_permutation(key, n):
+  index = lax.tie_in(key, lax.iota(onp.uint32, n))
+  return _permutation_index(key, index, n)
+
+
 @partial(jit, static_argnums=(2,))
 def _shuffle(key, x, axis):
   # On parallel architectures, Fisher-Yates is more expensive than doing
@@ -689,11 +1098,10 @@ def _beta(key, a, b, shape, dtype):
 
   a = lax.convert_element_type(a, dtype)
   b = lax.convert_element_type(b, dtype)
-  key_a, key_b = split(key)
   a = np.broadcast_to(a, shape)
   b = np.broadcast_to(b, shape)
-  gamma_a = gamma(key_a, a, shape, dtype)
-  gamma_b = gamma(key_b, b, shape, dtype)
+  # Both gamma variates are drawn by a single call to the sampler.
+  gamma_a, gamma_b = gamma(key, np.stack([a, b]), (2,) + shape, dtype)
   return gamma_a / (gamma_a + gamma_b)
 
 
@@ -788,60 +1196,60 @@ def _exponential(key, shape, dtype):
   return lax.neg(lax.log1p(lax.neg(u)))
 
 
-def _gamma_one(key, alpha):
+# Each round of the gamma sampler draws this many candidates for every element
+# and keeps the first accepted one. Since each candidate is accepted with
+# probability over 0.95, a single round almost always suffices, and the number
+# of rounds is bounded to keep the latency predictable.
+_GAMMA_CANDIDATES = 4
+_GAMMA_MAX_ROUNDS = 16
+
+def _gamma_batched(keys, alpha):
   # Ref: A simple method for generating gamma variables, George Marsaglia and Wai Wan Tsang
   # The algorithm can also be founded in:
   # https://en.wikipedia.org/wiki/Gamma_distribution#Generating_gamma-distributed_random_variables
-  zero = _constant_like(alpha, 0)
+  # Samples Gamma(alpha[i, j]) with keys[i], vectorized over all elements.
+  dtype = lax.dtype(alpha)
+  num = np.shape(alpha)[1]
   one = _constant_like(alpha, 1)
-  minus_one = _constant_like(alpha, -1)
   one_over_two = _constant_like(alpha, 0.5)
   one_over_three = _constant_like(alpha, 1. / 3.)
   squeeze_const = _constant_like(alpha, 0.0331)
-  dtype = lax.dtype(alpha)
 
-  key, subkey = split(key)
+  boost_keys, keys = np.moveaxis(batch_split(keys), 1, 0)
   # for alpha < 1, we boost alpha to alpha + 1 and get a sample according to
   # Gamma(alpha) ~ Gamma(alpha+1) * Uniform()^(1 / alpha)
-  boost = lax.select(lax.ge(alpha, one),
-                     one,
-                     lax.pow(uniform(subkey, (), dtype=dtype), lax.div(one, alpha)))
-  alpha = lax.select(lax.ge(alpha, one), alpha, lax.add(alpha, one))
-
-  d = lax.sub(alpha, one_over_three)
-  c = lax.div(one_over_three, lax.pow(d, one_over_two))
-
-  def _cond_fn(kXVU):
-    _, X, V, U = kXVU
-    # TODO: use lax.cond when its batching rule is supported
-    # The reason is to avoid evaluating second condition which involves log+log
-    # if the first condition is satisfied
-    cond = lax.bitwise_and(lax.ge(U, lax.sub(one, lax.mul(squeeze_const, lax.mul(X, X)))),
-                           lax.ge(lax.log(U), lax.add(lax.mul(X, one_over_two),
-                                                      lax.mul(d, lax.add(lax.sub(one, V),
-                                                                         lax.log(V))))))
-    return cond
-
-  def _body_fn(kXVU):
-    def _next_kxv(kxv):
-      key = kxv[0]
-      key, subkey = split(key)
-      x = normal(subkey, (), dtype=dtype)
-      v = lax.add(one, lax.mul(x, c))
-      return key, x, v
-
-    key = kXVU[0]
-    key, x_key, U_key = split(key, 3)
-    _, x, v = lax.while_loop(lambda kxv: lax.le(kxv[2], zero), _next_kxv, (x_key, zero, minus_one))
-    X = lax.mul(x, x)
-    V = lax.mul(lax.mul(v, v), v)
-    U = uniform(U_key, (), dtype=dtype)
-    return key, X, V, U
-
-  # initial state is chosen such that _cond_fn will return True
-  _, _, V, _ = lax.while_loop(_cond_fn, _body_fn, (key, zero, one, _constant_like(alpha, 2)))
-  z = lax.mul(lax.mul(d, V), boost)
-  return lax.select(lax.eq(z, zero), np.finfo(z.dtype).tiny, z)
+  boost = np.where(alpha >= one, one,
+                   lax.pow(batch_uniform(boost_keys, (num,), dtype), one / alpha))
+  alpha = np.where(alpha >= one, alpha, alpha + one)
+
+  d = alpha - one_over_three
+  c = one_over_three / lax.sqrt(d)
+  d_c, c_c = np.expand_dims(d, 1), np.expand_dims(c, 1)
+
+  def _body_fn(carry):
+    i, done, V = carry
+    x_keys, u_keys = np.moveaxis(batch_split(batch_fold_in(keys, i)), 1, 0)
+    x = batch_normal(x_keys, (_GAMMA_CANDIDATES, num), dtype)
+    U = batch_uniform(u_keys, (_GAMMA_CANDIDATES, num), dtype)
+    v = one + x * c_c
+    v = v * v * v
+    X = x * x
+    accept = (v > 0) & ((U < one - squeeze_const * X * X) |
+                        (np.log(U) < X * one_over_two +
+                         d_c * (one - v + np.log(v))))
+    first = accept & (np.cumsum(accept, axis=1) == 1)
+    found = np.any(accept, axis=1)
+    V = np.where(done | ~found, V, np.sum(np.where(first, v, 0), axis=1))
+    return i + 1, done | found, V
+
+  def _cond_fn(carry):
+    i, done, _ = carry
+    return (i < _GAMMA_MAX_ROUNDS) & ~np.all(done)
+
+  done = lax.full_like(alpha, False, onp.bool_)
+  _, _, V = lax.while_loop(_cond_fn, _body_fn, (0, done, np.ones_like(alpha)))
+  z = d * V * boost
+  return np.where(z == 0, np.finfo(dtype).tiny, z)
 
 _bivariate_coef = [[0.16009398, -0.094634816, 0.025146379, -0.0030648348,
                     1, 0.3266811, 0.10406087, 0.0014179033],
@@ -956,16 +1364,11 @@ def _gamma_grad(sample, a):
 
 def _gamma_impl(key, a):
   a_shape = np.shape(a)
-  # split key to match the shape of a
+  # Any leading dimensions of the key are batch dimensions shared with `a`.
   key_ndim = np.ndim(key) - 1
-  key = np.reshape(key, (-1, 2))
-  key = vmap(split, in_axes=(0, None))(key, prod(a_shape[key_ndim:]))
-  keys = np.reshape(key, (-1, 2))
-  alphas = np.reshape(a, -1)
-  if xla_bridge.get_backend().platform == 'cpu':
-    samples = lax.map(lambda args: _gamma_one(*args), (keys, alphas))
-  else:
-    samples = vmap(_gamma_one)(keys, alphas)
+  keys = np.reshape(key, (-1, np.shape(key)[-1]))
+  alphas = np.reshape(a, (keys.shape[0], prod(a_shape[key_ndim:])))
+  samples = _gamma_batched(keys, alphas)
   return np.reshape(samples, a_shape),
 
 def _gamma_batching_rule(batched_args, batch_dims):
@@ -1020,27 +1423,38 @@ def _gamma(key, a, shape, dtype):
 
 
 @partial(jit, static_argnums=(2, 3, 4))
-def _poisson_knuth(key, lam, shape, dtype, max_iters):
-  # Knuth's algorithm for generating Poisson random variates.
+def _poisson_inversion(key, lam, shape, dtype, max_iters):
+  # Sequential search of the cumulative distribution function for a single
+  # uniform variate per element, which unlike Knuth's algorithm only draws
+  # random values once.
   # Reference:
   # https://en.wikipedia.org/wiki/Poisson_distribution#Generating_Poisson-distributed_random_variables
+  u = uniform(key, shape, lam.dtype)
+  eps = np.finfo(lam.dtype).eps
+
+  def searching(i, p, cdf):
+    # Past the mode, stop once the remaining terms are lost to rounding.
+    return (u >= cdf) & ((i < lam) | (p > eps))
 
   def body_fn(carry):
-    i, k, rng, log_prod = carry
-    rng, subkey = split(rng)
-    k = lax.select(log_prod > -lam, k + 1, k)
-    u = uniform(subkey, shape, onp.float32)
-    return i + 1, k, rng, log_prod + np.log(u)
+    i, k, p, cdf = carry
+    k = k + searching(i, p, cdf).astype(k.dtype)
+    i = i + 1
+    p = p * lam / lax.convert_element_type(i, lam.dtype)
+    return i, k, p, cdf + p
 
   def cond_fn(carry):
-    i, log_prod = carry[0], carry[3]
-    return (log_prod > -lam).any() & (i < max_iters)
+    i, _, p, cdf = carry
+    return searching(i, p, cdf).any() & (i < max_iters)
 
   k_init = lax.full_like(lam, 0, dtype, shape)
-  log_rate_init = lax.full_like(lam, 0, onp.float32, shape)
-  k = lax.while_loop(cond_fn, body_fn, (0, k_init, key, log_rate_init))[1]
-  return (k - 1).astype(dtype)
+  p = np.exp(-lam)
+  return lax.while_loop(cond_fn, body_fn, (0, k_init, p, p))[1]
+
 
+# Each round of the rejection sampler draws this many candidates for every
+# element and keeps the first accepted one.
+_POISSON_CANDIDATES = 4
 
 @partial(jit, static_argnums=(2, 3, 4))
 def _poisson_rejection(key, lam, shape, dtype, max_iters):
@@ -1052,13 +1466,14 @@ def _poisson_rejection(key, lam, shape, dtype, max_iters):
   a = -0.059 + 0.02483 * b
   inv_alpha = 1.1239 + 1.1328 / (b - 3.4)
   v_r = 0.9277 - 3.6224 / (b - 2)
+  candidates_shape = (_POISSON_CANDIDATES,) + shape
 
   def body_fn(carry):
     i, k_out, accepted, key = carry
     key, subkey_0, subkey_1 = split(key, 3)
 
-    u = uniform(subkey_0, shape, lam.dtype) - 0.5
-    v = uniform(subkey_1, shape, lam.dtype)
+    u = uniform(subkey_0, candidates_shape, lam.dtype) - 0.5
+    v = uniform(subkey_1, candidates_shape, lam.dtype)
     u_shifted = 0.5 - abs(u)
 
     k = lax.floor((2 * a / u_shifted + b) * u + lam + 0.43)
@@ -1070,7 +1485,11 @@ def _poisson_rejection(key, lam, shape, dtype, max_iters):
     accept2 = s <= t
     accept = accept1 | (~reject & accept2)
 
-    k_out = lax.select(accept, k, k_out)
+    first = accept & (np.cumsum(accept, axis=0) == 1)
+    k = np.sum(np.where(first, k, 0), axis=0)
+    accept = np.any(accept, axis=0)
+
+    k_out = lax.select(accept & ~accepted, k, k_out)
     accepted |= accept
 
     return i + 1, k_out, accepted, key
@@ -1087,21 +1506,23 @@ def _poisson_rejection(key, lam, shape, dtype, max_iters):
 
 @partial(jit, static_argnums=(2, 3))
 def _poisson(key, lam, shape, dtype):
-  # The implementation matches TensorFlow and NumPy:
+  # The implementation follows TensorFlow and NumPy:
   # https://github.com/tensorflow/tensorflow/blob/v2.2.0-rc3/tensorflow/core/kernels/random_poisson_op.cc
   # https://github.com/numpy/numpy/blob/v1.18.3/numpy/random/src/distributions/distributions.c#L574
-  # For lambda < 10, we use the Knuth algorithm; otherwise, we use transformed
-  # rejection sampling.
-  use_knuth = lam < 10
-  lam_knuth = lax.select(use_knuth, lam, lax.full_like(lam, 0.0))
+  # For lambda < 10, we invert the CDF; otherwise, we use transformed rejection
+  # sampling. Both have bounded iteration counts: the CDF terms beyond 64 are
+  # negligible for lambda < 10, and the rejection sampler accepts a candidate
+  # with probability of about 88%, so 8 rounds of candidates all fail with
+  # probability below 1e-25.
+  use_inversion = lam < 10
+  lam_inversion = lax.select(use_inversion, lam, lax.full_like(lam, 0.0))
   # The acceptance probability for rejection sampling maxes out at 89% as
   # λ -> ∞, so pick some arbitrary large value.
-  lam_rejection = lax.select(use_knuth, lax.full_like(lam, 1e5), lam)
-  max_iters = np.iinfo(dtype).max  # insanely conservative
+  lam_rejection = lax.select(use_inversion, lax.full_like(lam, 1e5), lam)
   return lax.select(
-      use_knuth,
-      _poisson_knuth(key, lam_knuth, shape, dtype, max_iters),
-      _poisson_rejection(key, lam_rejection, shape, dtype, max_iters),
+      use_inversion,
+      _poisson_inversion(key, lam_inversion, shape, dtype, 64),
+      _poisson_rejection(key, lam_rejection, shape, dtype, 8),
   )
 
 
@@ -1181,6 +1602,145 @@ def categorical(key, logits, axis=-1, shape=None):
   return np.argmax(gumbel(key, sample_shape + logits.shape, logits.dtype) + logits, axis=axis)
 
 
+def categorical_without_replacement(key, logits, k, axis=-1):
+  """Sample distinct values from categorical distributions.
+
+  Uses the Gumbel-top-k trick: the indices of the `k` largest logits after
+  adding independent Gumbel noise are an ordered sample without replacement.
+  Unlike drawing `k` samples with `categorical`, this only needs noise of the
+  shape of `logits`.
+
+  Args:
+    key: a PRNGKey used as the random key.
+    logits: Unnormalized log probabilities of the categorical distribution(s) to sample from,
+      so that `softmax(logits, axis)` gives the corresponding probabilities.
+    k: the number of distinct values to sample from each distribution, at most
+      ``logits.shape[axis]``.
+    axis: Axis along which logits belong to the same categorical distribution.
+
+  Returns:
+    A random array with int dtype and shape ``onp.delete(logits.shape, axis) +
+    (k,)``, holding the sampled values in the order they were drawn.
+  """
+  k = core.concrete_or_error(int, k, "in jax.random.categorical_without_replacement")
+  if not 0 <= k <= logits.shape[axis]:
+    raise ValueError("categorical_without_replacement requires 0 <= k <= {}, "
+                     "got k={}.".format(logits.shape[axis], k))
+  return _categorical_without_replacement(key, logits, k, axis)
+
+@partial(jit, static_argnums=(2, 3))
+def _categorical_without_replacement(key, logits, k, axis):
+  perturbed = gumbel(key, logits.shape, logits.dtype) + logits
+  _, indices = lax.top_k(np.moveaxis(perturbed, axis, -1), k)
+  return indices
+
+
+class AliasTable(NamedTuple):
+  """A table for sampling from a fixed categorical distribution in O(1) time.
+
+  Value `i` is sampled by drawing a column `j` uniformly, then `j` with
+  probability ``prob[j]`` and ``alias[j]`` otherwise.
+  """
+  prob: np.ndarray
+  alias: np.ndarray
+
+
+def alias_table(p) -> AliasTable:
+  """Builds an `AliasTable` for a categorical distribution with Vose's method.
+
+  Building the table takes time linear in the number of categories, after
+  which `alias_categorical` draws each sample in constant time and memory,
+  independent of the number of categories.
+
+  Args:
+    p: a vector of nonnegative floats, proportional to the probabilities of
+      the categories.
+
+  Returns:
+    An `AliasTable` for the distribution given by `p`.
+  """
+  if onp.ndim(p) != 1:
+    raise ValueError("alias_table requires a vector of probabilities, got an "
+                     "array of shape {}.".format(onp.shape(p)))
+  return _alias_table(p)
+
+@jit
+def _alias_table(p):
+  n = p.shape[0]
+  dtype = lax.dtype(p)
+  if not np.issubdtype(dtype, onp.floating):
+    dtype = dtypes.canonicalize_dtype(onp.float64)
+  q = lax.convert_element_type(p, dtype)
+  q = q * _constant_like(q, n) / np.sum(q)
+  # Stacks of the categories whose scaled probabilities are below and at least
+  # one. Both start from `order`, in which the small ones sort before the large
+  # ones: `small` holds its first num_small entries, and `large`, which is
+  # `order` reversed, its first n - num_small. Entries past a stack's size are
+  # unused.
+  order = np.argsort((q >= 1).astype(onp.int32))
+  num_small = np.sum(q < 1)
+
+  def index(x, i):
+    return lax.dynamic_index_in_dim(x, i, keepdims=False)
+
+  def update(x, i, v):
+    return lax.dynamic_update_index_in_dim(x, np.reshape(v, (1,)), i, 0)
+
+  def cond_fn(state):
+    num_small, num_large = state[:2]
+    return (num_small > 0) & (num_large > 0)
+
+  def body_fn(state):
+    num_small, num_large, small, large, q, prob, alias = state
+    num_small, num_large = num_small - 1, num_large - 1
+    l, g = index(small, num_small), index(large, num_large)
+    q_l = index(q, l)
+    prob, alias = update(prob, l, q_l), update(alias, l, g)
+    q_g = index(q, g) + q_l - _constant_like(q_l, 1)
+    q = update(q, g, q_g)
+    # Push `g` back on the stack it now belongs to, by rewriting the top of
+    # the other one with its current value.
+    is_small = q_g < 1
+    small = update(small, num_small, lax.select(is_small, g, index(small, num_small)))
+    large = update(large, num_large, lax.select(is_small, index(large, num_large), g))
+    num_small = num_small + is_small.astype(num_small.dtype)
+    num_large = num_large + (~is_small).astype(num_large.dtype)
+    return num_small, num_large, small, large, q, prob, alias
+
+  # Categories left on either stack when the other runs out are sampled with
+  # probability one, which is exact up to rounding.
+  prob = np.ones_like(q)
+  alias = lax.tie_in(q, lax.iota(order.dtype, n))
+  state = (num_small.astype(order.dtype), (n - num_small).astype(order.dtype),
+           order, order[::-1], q, prob, alias)
+  _, _, _, _, _, prob, alias = lax.while_loop(cond_fn, body_fn, state)
+  return AliasTable(prob, alias)
+
+
+def alias_categorical(key, table: AliasTable, shape=()):
+  """Sample from a categorical distribution given by an `AliasTable`.
+
+  Args:
+    key: a PRNGKey used as the random key.
+    table: an `AliasTable` built by `alias_table`.
+    shape: optional, a tuple of nonnegative integers representing the result
+      shape. Default ().
+
+  Returns:
+    A random array with int dtype and the specified shape.
+  """
+  shape = abstract_arrays.canonicalize_shape(shape)
+  return _alias_categorical(key, table, shape)
+
+@partial(jit, static_argnums=(2,))
+def _alias_categorical(key, table, shape):
+  prob, alias = table
+  key_column, key_coin = split(key)
+  column = randint(key_column, shape, 0, prob.shape[0], alias.dtype)
+  coin = uniform(key_coin, shape, prob.dtype)
+  return np.where(coin < prob[column], column, alias[column])
+
+
 def laplace(key, shape=(), dtype=onp.float64):
   """Sample Laplace random values with given shape and float dtype.
 
@@ -1298,3 +1858,248 @@ def _t(key, df, shape, dtype):
   half_df = lax.div(df, two)
   g = gamma(key_n, half_df, shape, dtype)
   return n * np.sqrt(half_df / g)
+
+
+### batched sampling over arrays of keys
+#
+# These take an array of keys of shape (num_keys,) + key_shape, such as the
+# result of `split`, and compute the same values as mapping the corresponding
+# functions over the keys with `vmap`, but generate the bits for all the keys
+# with a single call to the hash (for implementations that support it) without
+# tracing through vmap.
+
+
+def batch_split(keys: np.ndarray, num: int = 2) -> np.ndarray:
+  """Splits each of an array of PRNG keys into `num` new keys.
+
+  Args:
+    keys: an array of PRNG keys, with shape (num_keys, 2) for the default
+      implementation.
+    num: optional, a positive integer indicating the number of keys to produce
+      from each key (default 2).
+
+  Returns:
+    An array with shape (num_keys, num) + key shape holding the keys split from
+    each key, equal to ``vmap(split, (0, None))(keys, num)``.
+  """
+  impl = _key_impl(keys, 1)
+  if impl.batched:
+    return impl.split(keys, num)
+  return vmap(impl.split, (0, None))(keys, num)
+
+
+def batch_fold_in(keys: np.ndarray, data) -> np.ndarray:
+  """Folds in data to each of an array of PRNG keys.
+
+  Args:
+    keys: an array of PRNG keys, with shape (num_keys, 2) for the default
+      implementation.
+    data: a 32bit integer, or an array of them with shape (num_keys,), holding
+      the data to be folded in to each key.
+
+  Returns:
+    An array of new keys of the same shape as `keys`, equal to
+    ``vmap(fold_in)(keys, data)``.
+  """
+  impl = _key_impl(keys, 1)
+  if impl.batched:
+    return impl.fold_in(keys, data)
+  return vmap(impl.fold_in, (0, 0 if onp.ndim(data) else None))(keys, data)
+
+
+def batch_uniform(keys: np.ndarray,
+                  shape: Sequence[int] = (),
+                  dtype: onp.dtype = onp.float64,
+                  minval: Union[float, np.ndarray] = 0.,
+                  maxval: Union[float, np.ndarray] = 1.) -> np.ndarray:
+  """Sample uniform random values in [minval, maxval) for each of an array of keys.
+
+  Args:
+    keys: an array of PRNG keys, with shape (num_keys, 2) for the default
+      implementation.
+    shape: optional, a tuple of nonnegative integers representing the shape of
+      the samples for each key. Default ().
+    dtype: optional, a float dtype for the returned values (default float64 if
+      jax_enable_x64 is true, otherwise float32).
+    minval: optional, a minimum (inclusive) value for the range (default 0),
+      broadcast-compatible with ``shape``.
+    maxval: optional, a maximum (exclusive) value for the range (default 1),
+      broadcast-compatible with ``shape``.
+
+  Returns:
+    A random array with shape ``(num_keys,) + shape`` and the specified dtype,
+    whose i-th entry is ``uniform(keys[i], shape, dtype, minval, maxval)``.
+  """
+  dtype = dtypes.canonicalize_dtype(dtype)
+  shape = abstract_arrays.canonicalize_shape(shape)
+  return _batch_uniform(keys, shape, dtype, minval, maxval)
+
+@partial(jit, static_argnums=(1, 2))
+def _batch_uniform(keys, shape, dtype, minval, maxval):
+  _check_shape("batch_uniform", shape, onp.shape(minval), onp.shape(maxval))
+  out_shape = keys.shape[:1] + shape
+  bits = _batch_random_bits(keys, _uniform_bit_width(dtype), shape)
+  if onp.ndim(minval):
+    minval = np.broadcast_to(minval, out_shape)
+  if onp.ndim(maxval):
+    maxval = np.broadcast_to(maxval, out_shape)
+  return _uniform_from_bits(bits, out_shape, dtype, minval, maxval)
+
+
+def batch_normal(keys: np.ndarray,
+                 shape: Sequence[int] = (),
+                 dtype: onp.dtype = onp.float64) -> np.ndarray:
+  """Sample standard normal random values for each of an array of keys.
+
+  Args:
+    keys: an array of PRNG keys, with shape (num_keys, 2) for the default
+      implementation.
+    shape: optional, a tuple of nonnegative integers representing the shape of
+      the samples for each key. Default ().
+    dtype: optional, a float dtype for the returned values (default float64 if
+      jax_enable_x64 is true, otherwise float32).
+
+  Returns:
+    A random array with shape ``(num_keys,) + shape`` and the specified dtype,
+    whose i-th entry is ``normal(keys[i], shape, dtype)``.
+  """
+  dtype = dtypes.canonicalize_dtype(dtype)
+  shape = abstract_arrays.canonicalize_shape(shape)
+  return _batch_normal(keys, shape, dtype)
+
+@partial(jit, static_argnums=(1, 2))
+def _batch_normal(keys, shape, dtype):
+  _check_shape("batch_normal", shape)
+  lo = onp.nextafter(onp.array(-1., dtype), 0., dtype=dtype)
+  hi = onp.array(1., dtype)
+  u = _batch_uniform(keys, shape, dtype, lo, hi)
+  return onp.array(onp.sqrt(2), dtype) * lax.erf_inv(u)
+
+
+def batch_bernoulli(keys: np.ndarray,
+                    p: np.ndarray = onp.float32(0.5),
+                    shape: Optional[Sequence[int]] = None) -> np.ndarray:
+  """Sample Bernoulli random values for each of an array of keys.
+
+  Args:
+    keys: an array of PRNG keys, with shape (num_keys, 2) for the default
+      implementation.
+    p: optional, a float or array of floats for the mean of the random
+      variables. A scalar is shared by all keys; otherwise the leading axis of
+      `p` has size num_keys, and ``p[i]`` holds the means for ``keys[i]``.
+      Default 0.5.
+    shape: optional, a tuple of nonnegative integers representing the shape of
+      the samples for each key. Must be broadcast-compatible with
+      ``p.shape[1:]``. The default (None) produces samples of shape
+      ``p.shape[1:]``.
+
+  Returns:
+    A random array with boolean dtype and shape ``(num_keys,) + shape``, whose
+    i-th entry is ``bernoulli(keys[i], p[i], shape)``.
+  """
+  dtype = dtypes.canonicalize_dtype(lax.dtype(p))
+  if shape is not None:
+    shape = abstract_arrays.canonicalize_shape(shape)
+  if not np.issubdtype(dtype, onp.floating):
+    msg = "bernoulli probability `p` must have a floating dtype, got {}."
+    raise TypeError(msg.format(dtype))
+  p = lax.convert_element_type(p, dtype)
+  return _batch_bernoulli(keys, p, shape)
+
+@partial(jit, static_argnums=(2,))
+def _batch_bernoulli(keys, p, shape):
+  p_shape = onp.shape(p)[1:]
+  if shape is None:
+    shape = p_shape
+  else:
+    _check_shape("batch_bernoulli", shape, p_shape)
+  if onp.ndim(p):
+    p = np.reshape(p, (p.shape[0],) + (1,) * (len(shape) - len(p_shape)) +
+                   p_shape)
+  return _batch_uniform(keys, shape, lax.dtype(p), 0., 1.) < p
+
+
+def batch_categorical(keys: np.ndarray, logits: np.ndarray, axis: int = -1,
+                      shape: Optional[Sequence[int]] = None) -> np.ndarray:
+  """Sample from categorical distributions for each of an array of keys.
+
+  Args:
+    keys: an array of PRNG keys, with shape (num_keys, 2) for the default
+      implementation.
+    logits: Unnormalized log probabilities, whose leading axis has size
+      num_keys; ``logits[i]`` holds the logits of the categorical
+      distribution(s) to sample from with ``keys[i]``.
+    axis: Axis of ``logits[i]`` along which logits belong to the same
+      categorical distribution.
+    shape: Optional, a tuple of nonnegative integers representing the shape of
+      the samples for each key. Must be broadcast-compatible with
+      ``onp.delete(logits.shape[1:], axis)``. The default (None) produces
+      samples of shape ``onp.delete(logits.shape[1:], axis)``.
+
+  Returns:
+    A random array with int dtype and shape ``(num_keys,) + shape``, whose
+    i-th entry is ``categorical(keys[i], logits[i], axis, shape)``.
+  """
+  logits_shape = np.shape(logits)[1:]
+  if axis >= 0:
+    axis -= len(logits_shape)
+
+  batch_shape = tuple(onp.delete(logits_shape, axis))
+  if shape is None:
+    shape = batch_shape
+  else:
+    shape = abstract_arrays.canonicalize_shape(shape)
+    _check_shape("batch_categorical", shape, batch_shape)
+
+  sample_shape = shape[:len(shape)-len(batch_shape)]
+  logits = np.reshape(logits, logits.shape[:1] + (1,) * len(sample_shape) +
+                      logits_shape)
+  u = batch_uniform(keys, sample_shape + logits_shape, logits.dtype,
+                    minval=np.finfo(logits.dtype).eps, maxval=1.)
+  return np.argmax(-np.log(-np.log(u)) + logits, axis=axis)
+
+
+def batch_permutation(keys: np.ndarray, x) -> np.ndarray:
+  """Permute the elements of an array independently for each of an array of keys.
+
+  Args:
+    keys: an array of PRNG keys, with shape (num_keys, 2) for the default
+      implementation.
+    x: the array or integer range to be shuffled along its first axis.
+
+  Returns:
+    An array of shape ``(num_keys,) + x.shape`` (or ``(num_keys, x)`` for an
+    integer `x`) whose i-th entry is ``permutation(keys[i], x)``.
+  """
+  if not onp.ndim(x):
+    # scalar case, must be a concrete integer
+    if not onp.issubdtype(lax.dtype(x), onp.integer):
+      raise TypeError("x must be an integer or at least 1-dimensional")
+    x = int(x)
+    if x >= _MIN_INDEX_PERMUTATION_SIZE:
+      return vmap(lambda key: _index_permutation(key, x))(keys)
+    return _batch_shuffle(keys, np.arange(x))
+  elif x.shape[0] >= _MIN_INDEX_PERMUTATION_SIZE:
+    n = x.shape[0]
+    ind = vmap(lambda key: _index_permutation(key, n))(keys)
+    return np.asarray(x)[ind]
+  elif onp.ndim(x) == 1:
+    return _batch_shuffle(keys, x)
+  else:
+    ind = _batch_shuffle(keys, np.arange(x.shape[0]))
+    return np.asarray(x)[ind]
+
+@jit
+def _batch_shuffle(keys, x):
+  # The same rounds of sorts by random keys as `_shuffle`, for all keys at once.
+  exponent = 3
+  uint32max = np.iinfo(onp.uint32).max
+  num_rounds = int(onp.ceil(exponent * onp.log(x.size) / onp.log(uint32max)))
+
+  x = lax.broadcast(x, keys.shape[:1])
+  for _ in range(num_rounds):
+    keys, subkeys = np.moveaxis(batch_split(keys), 1, 0)
+    sort_keys = _batch_random_bits(subkeys, 32, x.shape[1:])
+    _, x = lax.sort_key_val(sort_keys, x, 1)
+
+  return x
@@ -278,22 +278,31 @@ def check_grads(f, args, order,
 @contextmanager
 def count_primitive_compiles():
   xla.xla_primitive_callable.cache_clear()
+  xla.xla_fused_primitive_callable.cache_clear()
 
   # We count how many times we call primitive_computation (which is called
   # inside xla_primitive_callable) instead of xla_primitive_callable so we don't
-  # count cache hits.
+  # count cache hits. Likewise for fused_primitive_computation, which compiles
+  # primitives applied to lazy arguments.
   primitive_computation = xla.primitive_computation
+  fused_primitive_computation = xla.fused_primitive_computation
   count = [0]
 
   def primitive_computation_and_count(*args, **kwargs):
     count[0] += 1
     return primitive_computation(*args, **kwargs)
 
+  def fused_primitive_computation_and_count(*args, **kwargs):
+    count[0] += 1
+    return fused_primitive_computation(*args, **kwargs)
+
   xla.primitive_computation = primitive_computation_and_count
+  xla.fused_primitive_computation = fused_primitive_computation_and_count
   try:
     yield count
   finally:
     xla.primitive_computation = primitive_computation
+    xla.fused_primitive_computation = fused_primitive_computation
 
 
 @contextmanager
@@ -776,10 +785,13 @@ class JaxTestCase(parameterized.TestCase):
     onp_shapes = tree_map(lambda x: onp.shape(onp.asarray(x)), python_ans)
     self.assertEqual(python_shapes, onp_shapes)
 
-    cache_misses = xla.xla_primitive_callable.cache_info().misses
+    primitive_cache_misses = lambda: (
+        xla.xla_primitive_callable.cache_info().misses +
+        xla.xla_fused_primitive_callable.cache_info().misses)
+    cache_misses = primitive_cache_misses()
     python_ans = fun(*args)
     self.assertEqual(
-        cache_misses, xla.xla_primitive_callable.cache_info().misses,
+        cache_misses, primitive_cache_misses(),
         "Compilation detected during second call of {} in op-by-op "
         "mode.".format(fun))
 
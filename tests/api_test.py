@@ -13,6 +13,7 @@
 # limitations under the License.
 
 
+import asyncio
 import collections
 from contextlib import contextmanager
 import copy
@@ -31,7 +32,7 @@ import concurrent.futures
 import jax
 import jax.numpy as np
 from jax import jit, grad, device_put, jacfwd, jacrev, hessian
-from jax import api, core, lax, lax_reference
+from jax import api, core, lax, lax_reference, lazy
 from jax.core import Primitive
 from jax.interpreters import ad
 from jax.interpreters import xla
@@ -309,6 +310,162 @@ class APITest(jtu.JaxTestCase):
     api.device_put(x)
     api.device_put(y)
 
+  def test_device_put_and_get_many_arrays(self):
+    rng = onp.random.RandomState(0)
+    tree = {"w": [rng.randn(3, 4).astype(onp.float32) for _ in range(50)],
+            "b": [rng.randn(4) for _ in range(20)],
+            "i": [onp.arange(5, dtype=onp.int8), onp.int32(3),
+                  onp.zeros((0, 2), onp.int8)],
+            "big": rng.randn(xla._TRANSFER_BATCH_MAX_BYTES // 4 + 1)
+                   .astype(onp.float32),
+            "scalar": 1.}
+    device_tree = api.device_put(tree)
+    leaves = tree_util.tree_leaves(tree)
+    device_leaves = tree_util.tree_leaves(device_tree)
+    self.assertEqual(tree_util.tree_structure(device_tree),
+                     tree_util.tree_structure(tree))
+    for x, dx in zip(leaves, device_leaves):
+      self.assertIsInstance(dx, xla.DeviceArray)
+      self.assertAllClose(dx, x, check_dtypes=True)
+
+    # Include a lazy array and one whose value is already on the host.
+    device_tree["lazy"] = np.arange(7)
+    device_tree["cached"] = np.ones(2) * 2
+    onp.asarray(device_tree["cached"])
+    host_tree = api.device_get(device_tree)
+    self.assertEqual(tree_util.tree_structure(host_tree),
+                     tree_util.tree_structure(device_tree))
+    for x, dx in zip(tree_util.tree_leaves(host_tree),
+                     tree_util.tree_leaves(device_tree)):
+      self.assertIsInstance(x, onp.ndarray)
+      self.assertAllClose(x, onp.asarray(dx), check_dtypes=True)
+
+  def test_to_host_future(self):
+    x = np.arange(6.).reshape(2, 3) * 2
+    for y in [x, x.T, np.ones(3), x[0] + 1]:
+      future = y.to_host_future()
+      self.assertIsInstance(future, concurrent.futures.Future)
+      value = future.result()
+      self.assertIsInstance(value, onp.ndarray)
+      self.assertAllClose(value, onp.asarray(y), check_dtypes=True)
+    # The value is cached, so reading it again needs no transfer.
+    self.assertTrue(x.to_host_future().done())
+
+    x.delete()
+    self.assertRaisesRegex(ValueError, "deleted", x.to_host_future)
+
+  def test_device_get_async(self):
+    x = np.arange(12.).reshape(3, 4) + 1
+    tree = {"a": [x, x.T, x * 2], "b": (np.zeros(2), 3.),
+            "big": np.ones(xla._TRANSFER_BATCH_MAX_BYTES // 4 + 1)}
+    future = api.device_get_async(tree)
+    self.assertIsInstance(future, concurrent.futures.Future)
+    host_tree = future.result()
+    self.assertEqual(tree_util.tree_structure(host_tree),
+                     tree_util.tree_structure(tree))
+    for x, dx in zip(tree_util.tree_leaves(host_tree),
+                     tree_util.tree_leaves(tree)):
+      self.assertAllClose(x, onp.asarray(dx), check_dtypes=True)
+
+  def test_device_get_async_with_asyncio(self):
+    async def fetch(xs):
+      return await asyncio.gather(
+          asyncio.wrap_future(xs[0].to_host_future()),
+          asyncio.wrap_future(api.device_get_async(xs[1:])))
+
+    xs = [np.arange(3) * i for i in range(4)]
+    loop = asyncio.new_event_loop()
+    try:
+      first, rest = loop.run_until_complete(fetch(xs))
+    finally:
+      loop.close()
+    self.assertAllClose(first, onp.zeros(3), check_dtypes=False)
+    self.assertAllClose(rest, [onp.arange(3) * i for i in range(1, 4)],
+                        check_dtypes=False)
+
+  def test_device_put_many_arrays_to_device(self):
+    device = api.devices()[-1]
+    xs = [onp.full((2, 3), i, onp.float32) for i in range(10)]
+    dxs = api.device_put(xs, device=device)
+    for x, dx in zip(xs, dxs):
+      self.assertEqual(dx.device_buffer.device(), device)
+      self.assertAllClose(dx, x, check_dtypes=True)
+    self.assertAllClose(api.jit(lambda xs: sum(xs))(dxs), sum(xs),
+                        check_dtypes=True)
+
+  def test_live_arrays_and_memory_stats(self):
+    device = api.devices()[0]
+    x = api.device_put(onp.ones((100, 101), onp.float32), device)
+    y = api.device_put(onp.arange(10, dtype=onp.int32), device)
+    xt = x.T  # shares x's buffer
+    z = np.zeros(1000)  # a lazy constant, which holds no buffer
+    live = api.live_arrays(device)
+    for a in [x, y, xt]:
+      self.assertTrue(any(b is a for b in live))
+    self.assertFalse(any(b is z for b in live))
+
+    before = api.memory_stats(device)
+    self.assertEqual(before.device, device)
+    self.assertGreaterEqual(before.bytes_by_dtype[onp.dtype(onp.float32)],
+                            100 * 101 * 4)
+    self.assertGreaterEqual(before.bytes_by_dtype[onp.dtype(onp.int32)], 40)
+    self.assertEqual(before.bytes_in_use, sum(before.bytes_by_dtype.values()))
+    largest = api.memory_stats(device, num_largest=1000).largest_arrays
+    self.assertIn(api.ArrayInfo((101, 100), onp.dtype(onp.float32), 40400,
+                                None), largest)
+    self.assertEqual(largest, sorted(largest, key=lambda info: -info.nbytes))
+
+    x.delete()  # also frees the buffer xt refers to
+    live = api.live_arrays(device)
+    self.assertFalse(any(b is x or b is xt for b in live))
+    self.assertTrue(any(b is y for b in live))
+    after = api.memory_stats(device)
+    self.assertLessEqual(after.num_buffers, before.num_buffers - 1)
+    self.assertLessEqual(after.bytes_in_use, before.bytes_in_use - 40400)
+
+  def test_array_creation_sites(self):
+    prev = FLAGS.jax_array_creation_sites
+    config.update("jax_array_creation_sites", True)
+    try:
+      x = np.arange(17.) * 2
+    finally:
+      config.update("jax_array_creation_sites", prev)
+    self.assertRegex(xla.creation_site(x),
+                     r"api_test.py:\d+ \(test_array_creation_sites\)")
+    infos = api.memory_stats(x.device_buffer.device(),
+                             num_largest=10000).largest_arrays
+    self.assertIn(xla.creation_site(x),
+                  [info.creation_site for info in infos if info.shape == (17,)])
+    self.assertIsNone(xla.creation_site(x + 1))
+
+  @jtu.skip_on_devices("gpu", "tpu")
+  def test_cpu_zero_copy(self):
+    x = onp.arange(4096, dtype=onp.float32)
+    if not hasattr(x, "__dlpack__"):
+      raise unittest.SkipTest("requires numpy arrays to support DLPack")
+    if x.ctypes.data % xla._CPU_MIN_ALIGNMENT:
+      raise unittest.SkipTest("numpy allocated an unaligned array")
+    prev = FLAGS.jax_cpu_zero_copy
+    config.update("jax_cpu_zero_copy", True)
+    try:
+      dx = api.device_put(x)
+      self.assertTrue(onp.shares_memory(onp.asarray(dx), x))
+      self.assertFalse(onp.asarray(dx).flags.writeable)
+      x[0] = 7.
+      self.assertEqual(api.jit(lambda y: y[0])(dx), 7.)
+      self.assertEqual(api.jit(lambda y: y[0])(x), 7.)
+
+      # Misaligned and non-contiguous arrays are copied.
+      for y in [x.view(onp.uint8)[1:1 + 4 * 100].view(onp.float32), x[::2]]:
+        dy = api.device_put(y)
+        self.assertFalse(onp.shares_memory(onp.asarray(dy), x))
+        self.assertAllClose(dy, y, check_dtypes=True)
+
+      out = api.jit(lambda y: y * 2)(dx)
+      self.assertAllClose(onp.asarray(out), x * 2, check_dtypes=True)
+    finally:
+      config.update("jax_cpu_zero_copy", prev)
+
   @jtu.skip_on_devices("cpu")
   def test_device_put_across_platforms(self):
     default_device = jax.devices()[0]
@@ -1807,7 +1964,8 @@ class JaxprTest(jtu.JaxTestCase):
                   linear=(False, False, False, False)
                   num_carry=1
                   num_consts=1
-                  reverse=False ] b 0.0 a c
+                  reverse=False
+                  unroll=1 ] b 0.0 a c
   in (d, e) }
                         """, str(jaxpr))
 
@@ -1866,6 +2024,50 @@ class JaxprTest(jtu.JaxTestCase):
     jaxpr = api.make_jaxpr(f, static_argnums=(1,))(2, 3)
     self.assertIn('3', str(jaxpr))
 
+  def test_cost_analysis_dot(self):
+    x = onp.ones((8, 4), onp.float32)
+    y = onp.ones((4, 3), onp.float32)
+    cost = api.cost_analysis(np.dot)(x, y)
+    self.assertEqual(cost.flops, 2 * 8 * 4 * 3)
+    self.assertEqual(cost.bytes_read, x.nbytes + y.nbytes)
+    self.assertEqual(cost.bytes_written, 8 * 3 * 4)
+    self.assertEqual(cost.peak_bytes, x.nbytes + y.nbytes + 8 * 3 * 4)
+
+  def test_cost_analysis_recurses_into_jit_and_scan(self):
+    x = onp.ones((5, 3), onp.float32)
+    body = lambda c, x: (c + x, c * x)
+    scan_cost = api.cost_analysis(lambda c, xs: lax.scan(body, c, xs))(x[0], x)
+    self.assertEqual(scan_cost.flops, 5 * 2 * 3)
+    jit_cost = api.cost_analysis(jit(lambda x: np.sin(x) * 2.))(x)
+    self.assertEqual(jit_cost.flops, 2 * 15)
+
+  def test_cost_analysis_strided_pooling(self):
+    x = onp.ones((8, 8), onp.float32)
+    max_pool = lambda x: lax.reduce_window(x, -np.inf, lax.max, (2, 2), (2, 2),
+                                           "VALID")
+    sum_pool = lambda x: lax.reduce_window(x, 0., lax.add, (2, 2), (2, 2),
+                                           "VALID")
+    # 4 x 4 window positions of 2 x 2 elements each.
+    self.assertEqual(api.cost_analysis(max_pool)(x).flops, 16 * 4)
+    self.assertEqual(api.cost_analysis(sum_pool)(x).flops, 16 * 4)
+    source = onp.ones((4, 4), onp.float32)
+    scatter = lambda s, x: lax._select_and_scatter_add(s, x, lax.ge_p, (2, 2),
+                                                       (2, 2), "VALID")
+    self.assertEqual(api.cost_analysis(scatter)(source, x).flops, 16 * 4)
+    gather = lambda t, x: lax._select_and_gather_add(t, x, lax.ge_p, (2, 2),
+                                                     (2, 2), "VALID")
+    self.assertEqual(api.cost_analysis(gather)(x, x).flops, 16 * 4)
+
+  def test_cost_analysis_peak_bytes_frees_dead_values(self):
+    def f(x):
+      for _ in range(10):
+        x = np.sin(x)
+      return x
+    x = onp.ones(100, onp.float32)
+    # At most the input, the value being read and the value being written are
+    # live at any point.
+    self.assertEqual(api.cost_analysis(f)(x).peak_bytes, 3 * x.nbytes)
+
 
 class LazyTest(jtu.JaxTestCase):
 
@@ -1947,7 +2149,8 @@ class LazyTest(jtu.JaxTestCase):
       return onp_x, jax_x
 
     def random_op(rng, shape):
-      kind = rng.choice(['transpose', 'broadcast', 'reshape'])
+      kind = rng.choice(['transpose', 'broadcast', 'reshape', 'slice', 'rev',
+                         'flatten', 'convert'])
       if kind == 'transpose':
         perm = tuple(rng.permutation(len(shape)))
         return Op(partial(onp.transpose, axes=perm),
@@ -1973,6 +2176,26 @@ class LazyTest(jtu.JaxTestCase):
         new_shape = tuple(new_shape)
         return Op(partial(onp.reshape, newshape=new_shape),
                   partial(lax.reshape, new_sizes=new_shape))
+      elif kind == 'slice':
+        start = [rng.randint(d + 1) for d in shape]
+        limit = [rng.randint(s, d + 1) for s, d in zip(start, shape)]
+        strides = list(rng.randint(1, 3, size=len(shape)))
+        idx = tuple(map(slice, start, limit, strides))
+        return Op(lambda x: x[idx],
+                  partial(lax.slice, start_indices=start, limit_indices=limit,
+                          strides=strides))
+      elif kind == 'rev':
+        dims = tuple(rng.permutation(len(shape))[:rng.randint(len(shape) + 1)])
+        return Op(partial(onp.flip, axis=dims),
+                  partial(lax.rev, dimensions=dims))
+      elif kind == 'flatten':
+        new_shape = (int(onp.prod(shape)),)
+        return Op(partial(onp.reshape, newshape=new_shape),
+                  partial(lax.reshape, new_sizes=new_shape))
+      elif kind == 'convert':
+        dtype = [onp.float32, onp.int32][rng.choice(2)]
+        return Op(lambda x: x.astype(dtype),
+                  partial(lax.convert_element_type, new_dtype=dtype))
       else:
         assert False
     Op = collections.namedtuple('Op', ['onp_fn', 'jax_fn'])
@@ -2022,6 +2245,63 @@ class LazyTest(jtu.JaxTestCase):
     jit_result = apply_ops_closure()
     self.assertAllClose(jit_result, onp_x, check_dtypes=False)
 
+  def test_lazy_strided_slice_transpose_convert(self):
+    onp_x = onp.arange(24., dtype=onp.float32).reshape(4, 6)
+    x = api.device_put(onp_x)
+    with jtu.count_primitive_compiles() as count:
+      y = x[::2, ::-1].T.astype(np.int32)
+    self.assertEqual(count[0], 0)
+    self.assertIs(y.device_buffer, x.device_buffer)
+    expected = onp_x[::2, ::-1].T.astype(onp.int32)
+    self.assertAllClose(y * 2, expected * 2, check_dtypes=True)
+    self.assertAllClose(y, expected, check_dtypes=True)
+
+  def test_lazy_reshape(self):
+    onp_x = onp.arange(12, dtype=onp.int32).reshape(3, 4)
+    x = api.device_put(onp_x)
+    with jtu.count_primitive_compiles() as count:
+      y = x.T.reshape(2, 6)[:, ::-3]
+    self.assertEqual(count[0], 0)
+    self.assertAllClose(y, onp_x.T.reshape(2, 6)[:, ::-3], check_dtypes=True)
+    self.assertAllClose(api.jit(lambda z: z + y)(0),
+                        onp_x.T.reshape(2, 6)[:, ::-3], check_dtypes=True)
+
+  def test_lazy_folding(self):
+    onp_x = onp.arange(24, dtype=onp.int8).reshape(4, 6)
+    x = api.device_put(onp_x)
+    y = x
+    for _ in range(3):
+      y = lax.rev(y, (1,))
+      y = lax.convert_element_type(y, onp.int32)
+      y = lax.convert_element_type(y, onp.int8)
+    self.assertEqual(lazy.nesting(y._lazy_expr), 1)
+    self.assertAllClose(y, onp_x[:, ::-1], check_dtypes=True)
+    self.assertTrue(lazy.is_trivial(lax.rev(y, (1,))._lazy_expr))
+
+    z = lax.slice(lax.slice(x, (1, 0), (4, 6), (1, 2)), (0, 1), (3, 3), (2, 1))
+    self.assertEqual(lazy.nesting(z._lazy_expr), 1)
+    self.assertIs(z.device_buffer, x.device_buffer)
+    self.assertAllClose(z, onp_x[1:, ::2][::2, 1:], check_dtypes=True)
+
+    w = lax.reshape(lax.reshape(lax.slice(x, (0, 0), (3, 3)), (9,)), (3, 3))
+    self.assertEqual(lazy.nesting(w._lazy_expr), 2)
+    self.assertAllClose(w, onp_x[:3, :3], check_dtypes=True)
+
+  def test_lazy_expressions_forced_when_costly(self):
+    onp_x = onp.arange(1000., dtype=onp.float32)
+    x = api.device_put(onp_x)
+    y = x[::100]  # keeping all of x alive for 10 elements isn't worth it
+    self.assertTrue(lazy.is_trivial(y._lazy_expr))
+    self.assertIsNot(y.device_buffer, x.device_buffer)
+    self.assertAllClose(y, onp_x[::100], check_dtypes=True)
+
+    expected = onp_x.reshape(10, 100)
+    y = x.reshape(10, 100)
+    for i in range(lazy.MAX_LAZY_NESTING + 1):
+      y, expected = np.flip(y.T, 0), onp.flip(expected.T, 0)
+      self.assertLessEqual(lazy.nesting(y._lazy_expr), lazy.MAX_LAZY_NESTING)
+    self.assertAllClose(y, expected, check_dtypes=True)
+
   def test_constant_forcing_computations_cached(self):
     # from https://github.com/google/jax/issues/1909
     xla._lazy_force_computation.cache_clear()  # clear force compile cache
@@ -24,7 +24,7 @@ from jax import lax
 from jax import lax_linalg
 from jax import random
 from jax.api import jit, grad, jvp, vjp, make_jaxpr, jacfwd, jacrev, hessian
-from jax.api import vmap
+from jax.api import vmap, vmap_report
 from jax.util import partial, curry
 import jax.ops
 
@@ -989,6 +989,46 @@ class BatchingTest(jtu.JaxTestCase):
     expected = g(onp.asarray([1]), onp.asarray([2]))
     self.assertAllClose(ans, expected, check_dtypes=True)
 
+  def testVmapReportEfficient(self):
+    report = vmap_report(lambda x, y: np.sin(x) * y)(onp.ones((4, 3)),
+                                                     onp.ones((4, 3)))
+    self.assertEqual({r.primitive for r in report.records}, {'sin', 'mul'})
+    self.assertEqual(report.fallbacks, [])
+    self.assertEqual(report.extra_bytes, 0)
+
+  def testVmapReportTranspose(self):
+    x = onp.ones((3, 4), onp.float32)
+    y = onp.ones((4, 3), onp.float32)
+    report = vmap_report(lambda x, y: x + y, in_axes=(1, 0))(x, y)
+    self.assertEqual([r.primitive for r in report.fallbacks], ['add'])
+    fallback, = report.fallbacks[0].fallbacks
+    self.assertEqual(fallback.kind, 'transpose')
+    self.assertEqual(fallback.extra_bytes, 2 * x.nbytes)
+
+  def testVmapReportCondBatchedPredicate(self):
+    f = lambda p, x: lax.cond(p, x, np.sin, x, np.cos)
+    report = vmap_report(f)(onp.array([True, False]), onp.ones((2, 3)))
+    cond_records = [r for r in report.records if r.primitive == 'cond']
+    self.assertLen(cond_records, 1)
+    kinds = [f.kind for f in cond_records[0].fallbacks]
+    self.assertIn('both_branches', kinds)
+    self.assertIn('select', kinds)
+    self.assertEqual(report.summary()["cond"]["extra_flops"], 12)
+
+    report = vmap_report(f, in_axes=(None, 0))(True, onp.ones((2, 3)))
+    self.assertEqual([r.primitive for r in report.fallbacks], [])
+
+  def testVmapReportWhileLoopRecordsFinalTraceOnce(self):
+    # The first carry only becomes batched on the second fixpoint iteration;
+    # the body should nonetheless be reported once.
+    def f(x):
+      return lax.while_loop(lambda c: c[1] < 10,
+                            lambda c: (c[0] + 1, c[1] + 1), (0, x))
+    report = vmap_report(f)(onp.arange(3))
+    self.assertEqual(report.summary()['add']['count'], 2)
+    self.assertEqual([r.primitive for r in report.fallbacks], ['while'])
+    kinds = {f.kind for f in report.fallbacks[0].fallbacks}
+    self.assertEqual(kinds, {'broadcast', 'select'})
 
 if __name__ == '__main__':
   absltest.main()
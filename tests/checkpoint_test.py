@@ -0,0 +1,145 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import os
+import tempfile
+
+from absl.testing import absltest
+
+import numpy as onp
+
+import jax
+from jax import test_util as jtu
+from jax import tree_util
+from jax.experimental import checkpoint
+from jax.interpreters import xla
+import jax.numpy as np
+
+from jax.config import config
+config.parse_flags_with_absl()
+
+
+Point = collections.namedtuple("Point", "x y")
+
+def _params():
+  rng = onp.random.RandomState(0)
+  return {
+      "layers": [{"w": rng.randn(3, 4).astype(onp.float32),
+                  "b": np.zeros(4)} for _ in range(3)],
+      "embedding": np.arange(12, dtype=np.int32).reshape(4, 3),
+      "step": 7,
+      "flags": (onp.array([True, False]), None, onp.zeros((0, 5), onp.int8)),
+  }
+
+
+class CheckpointTest(jtu.JaxTestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.tmpdir = tempfile.TemporaryDirectory()
+    self.path = os.path.join(self.tmpdir.name, "ckpt")
+
+  def tearDown(self):
+    self.tmpdir.cleanup()
+    super().tearDown()
+
+  def assertTreeAllClose(self, x, y):
+    self.assertEqual(tree_util.tree_structure(x), tree_util.tree_structure(y))
+    for a, b in zip(tree_util.tree_leaves(x), tree_util.tree_leaves(y)):
+      self.assertAllClose(a, b, check_dtypes=True)
+
+  def testSaveAndRestore(self):
+    params = _params()
+    checkpoint.save(self.path, params)
+    restored = checkpoint.restore(self.path)
+    self.assertTreeAllClose(restored, params)
+    for leaf in tree_util.tree_leaves(restored):
+      self.assertIsInstance(leaf, xla.DeviceArray)
+
+  def testRestoreAsNumpy(self):
+    params = _params()
+    checkpoint.save(self.path, params)
+    restored = checkpoint.restore(self.path, as_numpy=True)
+    self.assertTreeAllClose(restored, params)
+    w = restored["layers"][1]["w"]
+    self.assertIsInstance(w, onp.ndarray)
+    self.assertFalse(w.flags.writeable)
+
+  def testRestoreSubtree(self):
+    params = _params()
+    checkpoint.save(self.path, params)
+    self.assertTreeAllClose(
+        checkpoint.restore(self.path, subtree=("layers", -1)),
+        params["layers"][-1])
+    self.assertAllClose(checkpoint.restore(self.path, subtree=("layers", 0, "w")),
+                        params["layers"][0]["w"], check_dtypes=True)
+    with self.assertRaisesRegex(KeyError, "no entry 'bias'"):
+      checkpoint.restore(self.path, subtree=("layers", 0, "bias"))
+    with self.assertRaisesRegex(KeyError, "no entry 3"):
+      checkpoint.restore(self.path, subtree=("layers", 3))
+
+  def testRestoreWithTarget(self):
+    params = {"point": Point(onp.ones(3), onp.arange(2.)), "z": onp.ones(1)}
+    checkpoint.save(self.path, params)
+    with self.assertRaisesRegex(ValueError, "pass a `target`"):
+      checkpoint.restore(self.path)
+    self.assertTreeAllClose(checkpoint.restore(self.path, target=params),
+                            params)
+    self.assertTreeAllClose(
+        checkpoint.restore(self.path, target=params["point"],
+                           subtree=("point",)),
+        params["point"])
+    with self.assertRaisesRegex(ValueError, "target with 1 leaves"):
+      checkpoint.restore(self.path, target=[0])
+
+  def testOverwrite(self):
+    checkpoint.save(self.path, [onp.ones(2)])
+    with self.assertRaisesRegex(ValueError, "already exists"):
+      checkpoint.save(self.path, [onp.zeros(2)])
+    mapped = checkpoint.restore(self.path, as_numpy=True)
+    checkpoint.save(self.path, [onp.zeros(2)], overwrite=True)
+    self.assertAllClose(checkpoint.restore(self.path), [onp.zeros(2)],
+                        check_dtypes=True)
+    self.assertAllClose(mapped, [onp.ones(2)], check_dtypes=True)
+
+  def testInterruptedOverwrite(self):
+    class Unconvertible(object):
+      def __array__(self, dtype=None):
+        raise RuntimeError("interrupted")
+
+    checkpoint.save(self.path, [onp.ones(2), onp.arange(3)])
+    with self.assertRaisesRegex(RuntimeError, "interrupted"):
+      checkpoint.save(self.path, [onp.zeros(2), Unconvertible()],
+                      overwrite=True)
+    self.assertAllClose(checkpoint.restore(self.path),
+                        [onp.ones(2), onp.arange(3)], check_dtypes=True)
+
+  def testEmptyTree(self):
+    checkpoint.save(self.path, {"a": None, "b": []})
+    self.assertEqual(checkpoint.restore(self.path), {"a": None, "b": []})
+
+  def testSaveShardedDeviceArray(self):
+    n = jax.local_device_count()
+    x = jax.pmap(lambda x: x * 2)(onp.arange(n * 6.).reshape(n, 2, 3))
+    replicated = jax.pmap(lambda x: x, axis_name="i")(onp.ones((n, 4)))
+    checkpoint.save(self.path, {"x": x, "replicated": replicated})
+    restored = checkpoint.restore(self.path)
+    self.assertAllClose(restored["x"], onp.asarray(x), check_dtypes=True)
+    self.assertAllClose(restored["replicated"], onp.ones((n, 4)),
+                        check_dtypes=True)
+
+
+if __name__ == "__main__":
+  absltest.main()
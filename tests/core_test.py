@@ -25,7 +25,7 @@ from absl.testing import parameterized
 from jax import core
 from jax import numpy as np
 from jax import test_util as jtu
-from jax.api import jvp, linearize, vjp, jit
+from jax.api import jvp, linearize, vjp, jit, make_jaxpr
 from jax.lax import UnshapedArray, ShapedArray, ConcreteArray
 from jax.tree_util import tree_flatten, tree_unflatten, tree_multimap, tree_reduce, tree_leaves
 from jax.util import partial
@@ -175,6 +175,26 @@ class CoreTest(jtu.JaxTestCase):
   def test_jvp(self, f, args):
     jtu.check_jvp(f, partial(jvp, f), args, rtol={onp.float32: 3e-2})
 
+  @parameterized.parameters(test_specs)
+  def test_eval_prepared_jaxpr(self, f, args):
+    flat_args, in_tree = tree_flatten(args)
+    flat_f = lambda *flat_args: f(*tree_unflatten(in_tree, flat_args))
+    typed_jaxpr = make_jaxpr(flat_f)(*flat_args)
+    expected = core.eval_jaxpr(typed_jaxpr.jaxpr, typed_jaxpr.literals,
+                               *flat_args)
+    for _ in range(2):
+      ans = core.eval_prepared_jaxpr(typed_jaxpr.jaxpr, typed_jaxpr.literals,
+                                     *flat_args)
+      jtu.check_close(ans, expected)
+
+  def test_prepared_jaxpr_cache(self):
+    jaxpr = make_jaxpr(lambda x, y: (np.sin(x) * y, x))(1., 2.).jaxpr
+    prepared = core.prepare_jaxpr(jaxpr)
+    self.assertIs(core.prepare_jaxpr(jaxpr), prepared)
+    jaxpr.outvars = jaxpr.outvars[:1]
+    self.assertIsNot(core.prepare_jaxpr(jaxpr), prepared)
+    self.assertEqual(len(core.eval_prepared_jaxpr(jaxpr, (), 1., 2.)), 1)
+
   def test_jvp_zeros(self):
     def foo(x):
       def bar(y):
@@ -0,0 +1,124 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from absl.testing import absltest
+
+import numpy as onp
+
+import jax
+from jax import test_util as jtu
+from jax.experimental import host_offload
+from jax.interpreters import xla
+import jax.numpy as np
+
+from jax.config import config
+config.parse_flags_with_absl()
+
+
+class HostOffloadTest(jtu.JaxTestCase):
+
+  def setUp(self):
+    super().setUp()
+    host_offload.enable()
+
+  def tearDown(self):
+    host_offload.disable()
+    super().tearDown()
+
+  def testSpill(self):
+    x = jax.device_put(onp.arange(6.).reshape(2, 3))
+    host_offload.spill(x)
+    self.assertTrue(host_offload.is_spilled(x))
+    self.assertAllClose(x, onp.arange(6.).reshape(2, 3), check_dtypes=True)
+    self.assertTrue(host_offload.is_spilled(x))
+
+    y = x + 1
+    self.assertFalse(host_offload.is_spilled(x))
+    self.assertAllClose(y, onp.arange(1., 7.).reshape(2, 3), check_dtypes=True)
+
+  def testSpillSharedWithLazyView(self):
+    x = jax.device_put(onp.arange(6.).reshape(2, 3))
+    xt = x.T
+    host_offload.spill(x)
+    self.assertAllClose(xt * 2, onp.arange(6.).reshape(2, 3).T * 2,
+                        check_dtypes=True)
+    self.assertAllClose(x * 2, onp.arange(6.).reshape(2, 3) * 2,
+                        check_dtypes=True)
+
+  def testWatermark(self):
+    nbytes = 4 * onp.dtype(onp.float32).itemsize
+    host_offload.enable(watermark_bytes=3 * nbytes)
+    a = jax.device_put(onp.zeros(4, onp.float32))
+    b = jax.device_put(onp.ones(4, onp.float32))
+    s = np.sum(a)  # `a` is now more recently used than `b`
+    c = jax.device_put(onp.full(4, 2, onp.float32))
+    self.assertFalse(host_offload.is_spilled(a))
+    self.assertTrue(host_offload.is_spilled(b))
+    self.assertFalse(host_offload.is_spilled(c))
+    self.assertFalse(host_offload.is_spilled(s))
+
+    # Reloading `b` spills the least recently used of the others.
+    self.assertAllClose(b + 1, onp.full(4, 2, onp.float32), check_dtypes=True)
+    self.assertFalse(host_offload.is_spilled(b))
+    self.assertTrue(host_offload.is_spilled(a))
+
+  def testSharedBufferTrackedOnce(self):
+    nbytes = 4 * onp.dtype(onp.float32).itemsize
+    host_offload.enable(watermark_bytes=2 * nbytes)
+    a = jax.device_put(onp.zeros(4, onp.float32))
+    b = jax.device_put(a)  # shares a's buffer
+    self.assertIs(b.device_buffer, a.device_buffer)
+    c = jax.device_put(onp.ones(4, onp.float32))
+    device = a.device_buffer.device()
+    self.assertEqual(xla.memory_manager.resident_bytes[device], 2 * nbytes)
+    self.assertFalse(any(map(host_offload.is_spilled, [a, b, c])))
+
+    host_offload.spill(a)
+    self.assertTrue(host_offload.is_spilled(b))
+    self.assertEqual(xla.memory_manager.resident_bytes[device], nbytes)
+    self.assertAllClose(b + 1, onp.ones(4, onp.float32), check_dtypes=True)
+    self.assertFalse(host_offload.is_spilled(a))
+    self.assertIs(a.device_buffer, b.device_buffer)
+    self.assertEqual(xla.memory_manager.resident_bytes[device], 2 * nbytes)
+
+  def testRelievePressure(self):
+    calls = []
+    host_offload.add_pressure_callback(calls.append)
+    xs = [jax.device_put(onp.full(8, i, onp.float32)) for i in range(4)]
+    device = xs[0].device_buffer.device()
+    self.assertTrue(xla.memory_manager.relieve_pressure(device))
+    self.assertEqual(calls, [device])
+    self.assertEqual([host_offload.is_spilled(x) for x in xs],
+                     [True, True, False, False])
+    for i, x in enumerate(xs):
+      self.assertAllClose(x, onp.full(8, i, onp.float32), check_dtypes=True)
+
+  def testDeletedArraysAreNotSpilled(self):
+    x, y, z = [jax.device_put(onp.ones(8, onp.float32)) for _ in range(3)]
+    x.delete()
+    self.assertTrue(xla.memory_manager.relieve_pressure(
+        y.device_buffer.device()))
+    self.assertTrue(host_offload.is_spilled(y))
+    self.assertFalse(host_offload.is_spilled(z))
+
+  def testErrors(self):
+    with self.assertRaisesRegex(TypeError, "expects a DeviceArray"):
+      host_offload.spill(onp.ones(3))
+    host_offload.disable()
+    with self.assertRaisesRegex(RuntimeError, "enable"):
+      host_offload.add_pressure_callback(lambda device: None)
+
+
+if __name__ == "__main__":
+  absltest.main()
@@ -0,0 +1,148 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+
+from absl.testing import absltest
+from absl.testing import parameterized
+
+import numpy as onp
+
+import jax
+from jax import core
+from jax import grad, jit, lax, make_jaxpr
+from jax import test_util as jtu
+from jax.experimental import jaxpr_serialization
+import jax.numpy as np
+
+from jax.config import config
+config.parse_flags_with_absl()
+
+
+def _loop(x):
+  def body(c, x):
+    return c * x + 1., np.sin(c)
+  c, ys = lax.scan(body, x[0], x)
+  c = lax.fori_loop(0, 3, lambda i, c: c + i, c)
+  c = lax.cond(c > 0, c, np.cos, c, np.sin)
+  return c + np.sum(ys)
+
+def _dot_const(x):
+  w = onp.arange(12., dtype=onp.float32).reshape(3, 4)
+  return np.tanh(np.dot(x, w))
+
+def _gather(x):
+  return x[np.array([2, 0])].astype(np.int32)
+
+@jax.custom_jvp
+def _cube(x):
+  return x ** 3
+_cube.defjvp(lambda primals, tangents: (_cube(primals[0]),
+                                        2. * tangents[0]))
+
+
+class JaxprSerializationTest(jtu.JaxTestCase):
+
+  @parameterized.named_parameters(
+      {"testcase_name": "_{}".format(f.__name__), "f": f, "args": args}
+      for f, args in [
+          (_loop, (onp.arange(3, dtype=onp.float32),)),
+          (_dot_const, (onp.ones((2, 3), onp.float32),)),
+          (_gather, (onp.arange(4, dtype=onp.float32),)),
+          (jit(lambda x, y: x * y + 2), (3., onp.float32(2.))),
+          (_cube, (2.,)),
+      ])
+  def testRoundTrip(self, f, args):
+    typed_jaxpr = make_jaxpr(f)(*args)
+    loaded = jaxpr_serialization.loads(jaxpr_serialization.dumps(typed_jaxpr))
+    self.assertIsInstance(loaded, core.TypedJaxpr)
+    self.assertEqual([eqn.primitive for eqn in loaded.jaxpr.eqns],
+                     [eqn.primitive for eqn in typed_jaxpr.jaxpr.eqns])
+    self.assertAllClose(core.jaxpr_as_fun(loaded)(*args),
+                        core.jaxpr_as_fun(typed_jaxpr)(*args),
+                        check_dtypes=True)
+
+  def testDumpAndLoadFile(self):
+    typed_jaxpr = make_jaxpr(_dot_const)(onp.ones((2, 3), onp.float32))
+    f = io.BytesIO()
+    jaxpr_serialization.dump(typed_jaxpr.jaxpr, f)
+    f.seek(0)
+    loaded = jaxpr_serialization.load(f)
+    self.assertIsInstance(loaded, core.Jaxpr)
+    self.assertEqual(len(loaded.constvars), len(typed_jaxpr.jaxpr.constvars))
+    self.assertEqual([eqn.primitive for eqn in loaded.eqns],
+                     [eqn.primitive for eqn in typed_jaxpr.jaxpr.eqns])
+
+  def testSharedSubjaxprsStayShared(self):
+    def f(x):
+      body = lambda c, _: (np.sin(c), ())
+      c, _ = lax.scan(body, x, None, length=2)
+      return c
+    typed_jaxpr = make_jaxpr(f)(1.)
+    eqns = typed_jaxpr.jaxpr.eqns
+    i, = [i for i, eqn in enumerate(eqns) if eqn.primitive is lax.scan_p]
+    params = dict(eqns[i].params, other_jaxpr=eqns[i].params["jaxpr"])
+    eqns[i] = eqns[i]._replace(params=params)
+    loaded = jaxpr_serialization.loads(jaxpr_serialization.dumps(typed_jaxpr))
+    loaded_params = loaded.jaxpr.eqns[i].params
+    self.assertIs(loaded_params["jaxpr"], loaded_params["other_jaxpr"])
+
+  def testJitJaxpr(self):
+    x = onp.arange(3, dtype=onp.float32)
+    data = jaxpr_serialization.dumps(make_jaxpr(_loop)(x))
+    f = jaxpr_serialization.jit_jaxpr(jaxpr_serialization.loads(data))
+    out, = f(x)
+    self.assertAllClose(out, _loop(x), check_dtypes=True)
+    out, = jit(f)(x)
+    self.assertAllClose(out, _loop(x), check_dtypes=True)
+
+  def testJitJaxprChecksArgumentTypes(self):
+    f = jaxpr_serialization.jit_jaxpr(make_jaxpr(np.sin)(onp.ones(3)))
+    self.assertRaisesRegex(TypeError, "expects arguments of types",
+                           lambda: f(onp.ones(4)))
+
+  def testCustomJvpRuleIsPreserved(self):
+    typed_jaxpr = make_jaxpr(_cube)(3.)
+    loaded = jaxpr_serialization.loads(jaxpr_serialization.dumps(typed_jaxpr))
+    f = jaxpr_serialization.jit_jaxpr(loaded)
+    self.assertAllClose(grad(lambda x: f(x)[0])(3.), 2., check_dtypes=False)
+
+  def testCustomVjpIsNotSerializable(self):
+    @jax.custom_vjp
+    def f(x):
+      return np.sin(x)
+    f.defvjp(lambda x: (np.sin(x), x), lambda x, g: (g * np.cos(x),))
+    self.assertRaisesRegex(
+        TypeError, "Can't serialize param .* of primitive custom_vjp_call_jaxpr",
+        lambda: jaxpr_serialization.dumps(make_jaxpr(f)(1.)))
+
+  def testUnknownPrimitive(self):
+    foo_p = core.Primitive("foo_serialization_test")
+    foo_p.def_abstract_eval(lambda x: x)
+    data = jaxpr_serialization.dumps(make_jaxpr(foo_p.bind)(1.))
+    self.assertRaisesRegex(ValueError, "Unknown primitive foo_serialization_test",
+                           lambda: jaxpr_serialization.loads(data))
+    jaxpr_serialization.register_primitive(foo_p)
+    loaded = jaxpr_serialization.loads(data)
+    self.assertIs(loaded.jaxpr.eqns[0].primitive, foo_p)
+
+  def testNewerVersionIsRejected(self):
+    data = jaxpr_serialization.dumps(make_jaxpr(np.sin)(1.))
+    data = data.replace(b'"version":1', b'"version":9')
+    self.assertRaisesRegex(ValueError, "format version 9",
+                           lambda: jaxpr_serialization.loads(data))
+
+
+if __name__ == "__main__":
+  absltest.main()
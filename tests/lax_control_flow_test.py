@@ -38,6 +38,18 @@ import jax.scipy as jsp
 
 from jax.config import config
 config.parse_flags_with_absl()
+FLAGS = config.FLAGS
+
+
+def with_cond_batching(strategy, num_chunks, fun, *args):
+  prev = FLAGS.jax_cond_batching, FLAGS.jax_predicated_batching_chunks
+  config.update("jax_cond_batching", strategy)
+  config.update("jax_predicated_batching_chunks", num_chunks)
+  try:
+    return fun(*args)
+  finally:
+    config.update("jax_cond_batching", prev[0])
+    config.update("jax_predicated_batching_chunks", prev[1])
 
 
 def while_loop_reference(cond, body, carry):
@@ -375,6 +387,28 @@ class LaxControlFlowTest(jtu.JaxTestCase):
     for args_maker in [lambda: [2], lambda: [3], lambda: [4]]:
       self._CompileAndCheck(count, args_maker, True)
 
+  @parameterized.named_parameters(
+      {"testcase_name": "_unroll={}".format(unroll), "unroll": unroll}
+      for unroll in [1, 2, 3, 4, 11])
+  def testForiLoopUnroll(self, unroll):
+    def count(lower, upper):
+      return lax.fori_loop(lower, upper, lambda i, tot: tot * 2 + i, 0,
+                           unroll=unroll)
+
+    def expected(lower, upper):
+      tot = 0
+      for i in range(lower, upper):
+        tot = tot * 2 + i
+      return tot
+
+    for lower, upper in [(0, 0), (0, 1), (2, 9), (3, 13)]:
+      self.assertEqual(count(lower, upper), expected(lower, upper))
+      self.assertEqual(api.jit(count)(lower, upper), expected(lower, upper))
+
+  def testForiLoopUnrollErrors(self):
+    with self.assertRaisesRegex(ValueError, "must be a positive integer"):
+      lax.fori_loop(0, 3, lambda i, c: c, 0., unroll=0)
+
   def testForiLoopClosure(self):
     def count(num):
       def body_fun(i, tot):
@@ -637,6 +671,65 @@ class LaxControlFlowTest(jtu.JaxTestCase):
     self.assertAllClose(ans, expected, check_dtypes=False)
     assert "select" in str(jaxpr)
 
+  @parameterized.named_parameters(
+      {"testcase_name": "_chunks={}".format(num_chunks),
+       "num_chunks": num_chunks}
+      for num_chunks in [1, 3, 8, 100])
+  def testCondBatchingPredicated(self, num_chunks):
+    def fun(x, y, z):
+      true_fun = lambda y: (np.sin(y) * x, y.sum())
+      false_fun = lambda z: (z, 3.)
+      return lax.cond(x < 0.5, y, true_fun, z, false_fun)
+
+    rng = onp.random.RandomState(0)
+    x = rng.rand(13)
+    y = rng.randn(13, 2)
+    z = rng.randn(2)
+    vmapped = api.vmap(fun, (0, 0, None))
+    expected = vmapped(x, y, z)
+    predicated = lambda f, *args: with_cond_batching(
+        "predicated", num_chunks, f, *args)
+    self.assertAllClose(predicated(vmapped, x, y, z), expected,
+                        check_dtypes=False)
+    self.assertAllClose(predicated(api.jit(vmapped), x, y, z), expected,
+                        check_dtypes=False)
+    loss = lambda x, y: np.sum(np.sin(vmapped(x, y, z)[0]))
+    self.assertAllClose(predicated(api.grad(loss, (0, 1)), x, y),
+                        api.grad(loss, (0, 1))(x, y), check_dtypes=False)
+    jaxpr = predicated(api.make_jaxpr(vmapped), x, y, z)
+    self.assertIn("sort", str(jaxpr))
+
+  @parameterized.named_parameters(
+      {"testcase_name": "_chunks={}".format(num_chunks),
+       "num_chunks": num_chunks}
+      for num_chunks in [1, 3, 8, 100])
+  def testWhileLoopBatchingPredicated(self, num_chunks):
+    def fun(x, n):
+      body = lambda c: (c[0] + 1, c[1] * 0.9 + x)
+      return lax.while_loop(lambda c: c[0] < n, body, (0, x))
+
+    x = onp.arange(11.)
+    n = onp.array([0, 5, 1, 2, 30, 3, 0, 7, 1, 1, 4])
+    expected = api.vmap(fun)(x, n)
+    ans = with_cond_batching("predicated", num_chunks, api.vmap(fun), x, n)
+    self.assertAllClose(ans, expected, check_dtypes=False)
+    ans = with_cond_batching("predicated", num_chunks, api.vmap(fun, (None, 0)),
+                             2., n)
+    self.assertAllClose(ans, api.vmap(fun, (None, 0))(2., n),
+                        check_dtypes=False)
+
+  def testCondBatchingAuto(self):
+    def fun(x):
+      expensive = lambda x: np.tanh(np.outer(x, x)).sum()
+      return lax.cond(x.sum() > 0, x, expensive, x, lambda x: 0.)
+
+    small = onp.ones((4, 64), onp.float32)
+    large = onp.ones((256, 64), onp.float32)
+    jaxpr = lambda x: str(api.make_jaxpr(api.vmap(fun))(x))
+    self.assertNotIn("sort", with_cond_batching("auto", 8, jaxpr, small))
+    self.assertIn("sort", with_cond_batching("auto", 8, jaxpr, large))
+    self.assertNotIn("sort", with_cond_batching("select", 8, jaxpr, large))
+
   def testCondJVP(self):
     def fun_ref(x):
       if x < 3:
@@ -1009,6 +1102,96 @@ class LaxControlFlowTest(jtu.JaxTestCase):
     jtu.check_grads(partial(scan, f), (c, as_), order=2, modes=["rev"],
                     atol=1e-3, rtol=2e-3)
 
+  @parameterized.named_parameters(
+      {"testcase_name": "_unroll={}_reverse={}".format(unroll, reverse),
+       "unroll": unroll, "reverse": reverse}
+      for unroll in [1, 2, 3, 5, 7, 10]
+      for reverse in [False, True])
+  def testScanUnroll(self, unroll, reverse):
+    rng = onp.random.RandomState(0)
+
+    d = rng.randn(2)
+    def f(c, a):
+      b = np.sum(np.sin(a)) + np.sum(np.sin(c)) + np.sum(np.sin(d))
+      c = np.sin(c * b)
+      return c, b
+
+    as_ = rng.randn(7, 3)
+    c = rng.randn(4)
+    scan = lambda c, as_: lax.scan(f, c, as_, reverse=reverse, unroll=unroll)
+    expected_scan = lambda c, as_: lax.scan(f, c, as_, reverse=reverse)
+
+    self.assertAllClose(scan(c, as_), expected_scan(c, as_), check_dtypes=False)
+    self.assertAllClose(api.jit(scan)(c, as_), expected_scan(c, as_),
+                        check_dtypes=False)
+    self.assertAllClose(api.jvp(scan, (c, as_), (c, as_)),
+                        api.jvp(expected_scan, (c, as_), (c, as_)),
+                        check_dtypes=False)
+    loss = lambda scan: lambda c, as_: np.sum(scan(c, as_)[1])
+    self.assertAllClose(api.grad(loss(scan), (0, 1))(c, as_),
+                        api.grad(loss(expected_scan), (0, 1))(c, as_),
+                        check_dtypes=False)
+    batched_c = rng.randn(3, 4)
+    self.assertAllClose(api.vmap(scan, (0, None))(batched_c, as_),
+                        api.vmap(expected_scan, (0, None))(batched_c, as_),
+                        check_dtypes=False)
+    jaxpr = api.make_jaxpr(scan)(c, as_)
+    self.assertEqual(jaxpr.jaxpr.eqns[0].params["unroll"], unroll)
+
+  def testScanUnrollErrors(self):
+    with self.assertRaisesRegex(ValueError, "must be a positive integer"):
+      lax.scan(lambda c, x: (c, x), 0., np.arange(3.), unroll=0)
+
+  @parameterized.named_parameters(
+      {"testcase_name": "_length={}_levels={}_reverse={}".format(
+          length, levels, reverse),
+       "length": length, "levels": levels, "reverse": reverse}
+      for length in [1, 9, 10, 23]
+      for levels in [1, 2]
+      for reverse in [False, True])
+  def testScanCheckpointLevels(self, length, levels, reverse):
+    rng = onp.random.RandomState(0)
+
+    def f(c, a):
+      b = np.sum(np.sin(a)) + np.sum(np.cos(c))
+      c = np.sin(c * b)
+      return c, (b, c)
+
+    as_ = rng.randn(length, 3)
+    c = rng.randn(4)
+    scan = lambda c, as_: lax.scan(f, c, as_, reverse=reverse,
+                                   checkpoint_levels=levels)
+    expected_scan = lambda c, as_: lax.scan(f, c, as_, reverse=reverse)
+
+    self.assertAllClose(scan(c, as_), expected_scan(c, as_), check_dtypes=False)
+    self.assertAllClose(api.jit(scan)(c, as_), expected_scan(c, as_),
+                        check_dtypes=False)
+    loss = lambda scan: lambda c, as_: np.sum(np.cos(scan(c, as_)[1][1]))
+    self.assertAllClose(api.grad(loss(scan), (0, 1))(c, as_),
+                        api.grad(loss(expected_scan), (0, 1))(c, as_),
+                        check_dtypes=False)
+
+  def testScanCheckpointLevelsSavesSegmentCarries(self):
+    length = 1000
+    def loss(checkpoint_levels, c):
+      f = lambda c, _: (np.sin(c), ())
+      c, _ = lax.scan(f, c, None, length=length,
+                      checkpoint_levels=checkpoint_levels)
+      return np.sum(c)
+
+    def num_saved_values(checkpoint_levels):
+      _, f_vjp = api.vjp(partial(loss, checkpoint_levels), np.ones(4))
+      jaxpr = api.make_jaxpr(f_vjp)(1.)
+      return sum(onp.size(x) for x in jaxpr.literals)
+
+    self.assertGreaterEqual(num_saved_values(0), 4 * length)
+    self.assertLess(num_saved_values(1), 4 * 2 * int(onp.sqrt(length)))
+    self.assertLess(num_saved_values(2), num_saved_values(1))
+
+  def testScanCheckpointLevelsErrors(self):
+    with self.assertRaisesRegex(ValueError, "must be a non-negative integer"):
+      lax.scan(lambda c, x: (c, x), 0., np.arange(3.), checkpoint_levels=-1)
+
   @jtu.skip_on_flag("jax_skip_slow_tests", True)
   def testScanRnn(self):
     r = npr.RandomState(0)
@@ -1283,6 +1466,63 @@ class LaxControlFlowTest(jtu.JaxTestCase):
     expected = np.array([])
     self.assertAllClose(ans, expected, check_dtypes=True)
 
+  @parameterized.named_parameters(
+      {"testcase_name": "_length={}_reverse={}".format(length, reverse),
+       "length": length, "reverse": reverse}
+      for length in [0, 1, 2, 7, 8, 33]
+      for reverse in [False, True])
+  def testAssociativeScan(self, length, reverse):
+    rng = onp.random.RandomState(0)
+    x = rng.randn(length, 3)
+    expected = onp.cumsum(x[::-1] if reverse else x, 0)
+    expected = expected[::-1] if reverse else expected
+    ans = lax.associative_scan(lax.add, x, reverse=reverse)
+    self.assertAllClose(ans, expected, check_dtypes=False)
+
+    # Matrix multiplication is associative but not commutative, so it checks
+    # the order in which operands are combined.
+    ms = rng.randn(length, 2, 2)
+    expected = onp.zeros_like(ms)
+    acc = onp.eye(2)
+    for i in (reversed(range(length)) if reverse else range(length)):
+      acc = onp.matmul(ms[i], acc) if reverse else onp.matmul(acc, ms[i])
+      expected[i] = acc
+    matmul = lambda a, b: np.matmul(b, a) if reverse else np.matmul(a, b)
+    ans = api.jit(partial(lax.associative_scan, matmul, reverse=reverse))(ms)
+    self.assertAllClose(ans, expected, check_dtypes=False)
+
+  def testAssociativeScanLinearRecurrence(self):
+    rng = onp.random.RandomState(0)
+    a, b = rng.rand(37, 4), rng.randn(37, 4)
+
+    def recurrence(a, b):
+      def combine(x, y):
+        (a_x, b_x), (a_y, b_y) = x, y
+        return a_x * a_y, a_y * b_x + b_y
+      return lax.associative_scan(combine, (a, b))[1]
+
+    def recurrence_reference(a, b):
+      step = lambda h, ab: (ab[0] * h + ab[1],) * 2
+      return lax.scan(step, np.zeros(4), (a, b))[1]
+
+    self.assertAllClose(recurrence(a, b), recurrence_reference(a, b),
+                        check_dtypes=False)
+    loss = lambda f: lambda a, b: np.sum(np.sin(f(a, b)))
+    self.assertAllClose(api.grad(loss(recurrence), (0, 1))(a, b),
+                        api.grad(loss(recurrence_reference), (0, 1))(a, b),
+                        check_dtypes=False)
+    jtu.check_grads(recurrence, (a, b), order=2, modes=["fwd", "rev"])
+    self.assertAllClose(api.vmap(recurrence, (1, 1), 1)(a, b),
+                        recurrence_reference(a, b), check_dtypes=False)
+
+  def testAssociativeScanErrors(self):
+    with self.assertRaisesRegex(ValueError, "different leading axis sizes"):
+      lax.associative_scan(lax.add, (np.ones(3), np.ones(4)))
+    with self.assertRaisesRegex(ValueError, "no leading axis"):
+      lax.associative_scan(lax.add, 1.)
+    with self.assertRaisesRegex(TypeError, "output pytree structure"):
+      lax.associative_scan(lambda a, b: (a, b), np.ones(3))
+
   def testCaching(self):
     def cond(x):
       assert python_should_be_executing
@@ -1779,6 +1779,37 @@ class LaxBackedNumpyTests(jtu.JaxTestCase):
         onp.array([0x2a], dtype=onp.uint8),
         check_dtypes=True)
 
+  def testArrayFromNestedSequences(self):
+    cases = [
+        ([[1, 2], [3, 4]], None),
+        ([[1, 2.5], (onp.float32(3), 4)], None),
+        ([True, False, 1], None),
+        ([onp.arange(3, dtype=onp.int8), onp.arange(3, dtype=onp.int8)], None),
+        ([onp.float16(1), 2.], None),
+        ([jnp.array([1., 2.]), onp.array([3, 4]), [5, 6]], None),
+        ([[1, 2.5], [3, 4]], onp.int32),
+        ([[[]], [[]]], None),
+        ([1 + 2j, 3], None),
+    ]
+    for arg, dtype in cases:
+      # `array` used to build these by stacking `array(elt)` for each element.
+      stacked = lambda x: (jnp.stack([stacked(elt) for elt in x])
+                           if isinstance(x, (list, tuple)) and x
+                           else jnp.array(x, dtype=dtype))
+      ans = jnp.array(arg, dtype=dtype)
+      self.assertIsInstance(ans, xla.DeviceArray)
+      self.assertAllClose(ans, stacked(arg), check_dtypes=True)
+
+    self.assertRaises(ValueError, lambda: jnp.array([[1, 2], [3]]))
+
+  def testArrayFromNestedSequencesWithTracers(self):
+    f = lambda x: jnp.array([[x, 2.], (onp.float32(3), jnp.array(4.))])
+    expected = onp.array([[1., 2.], [3., 4.]], onp.float32)
+    self.assertAllClose(f(1.), expected, check_dtypes=True)
+    self.assertAllClose(api.jit(f)(1.), expected, check_dtypes=True)
+    self.assertAllClose(api.grad(lambda x: f(x).sum())(1.), 1.,
+                        check_dtypes=False)
+
   def testIsClose(self):
     c_isclose = api.jit(jnp.isclose)
     c_isclose_nan = api.jit(partial(jnp.isclose, equal_nan=True))
@@ -0,0 +1,77 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from absl.testing import absltest
+
+import numpy as onp
+
+import jax
+from jax import test_util as jtu
+from jax.experimental.metrics import Metrics
+import jax.numpy as np
+
+from jax.config import config
+config.parse_flags_with_absl()
+
+
+@jax.jit
+def _step(x):
+  return x + 1, np.sum(x ** 2), np.mean(x)
+
+
+class MetricsTest(jtu.JaxTestCase):
+
+  def testBatchedReads(self):
+    metrics = Metrics(read_every=4)
+    x = np.zeros(3)
+    for step in range(10):
+      x, loss, mean = _step(x)
+      metrics.update(step, loss=loss, mean=mean, lr=0.1)
+      if step < 3:
+        self.assertIsNone(metrics.latest_step)
+        self.assertEqual(metrics.latest(), {})
+
+    metrics.wait()
+    self.assertEqual(metrics.latest_step, 9)
+    self.assertEqual(metrics.latest(), {"loss": 300., "mean": 10., "lr": 0.1})
+    values = metrics.values()
+    self.assertEqual([step for step, _ in values], list(range(10)))
+    for step, m in values:
+      self.assertIsInstance(m["loss"], float)
+      self.assertEqual(m["loss"], 3. * (step + 1) ** 2)
+    self.assertAllClose(metrics.mean(),
+                        {"loss": 3 * onp.mean(onp.arange(1., 11.) ** 2),
+                         "mean": 5.5, "lr": 0.1}, check_dtypes=False)
+
+  def testStartReadOnDemand(self):
+    metrics = Metrics(read_every=1000, history=2)
+    for step in range(3):
+      metrics.update(step, loss=np.float32(step) * 2)
+    metrics.start_read()
+    metrics.start_read()  # nothing left to read
+    metrics.wait()
+    self.assertEqual(metrics.values(), [(1, {"loss": 2.}), (2, {"loss": 4.})])
+
+  def testErrors(self):
+    metrics = Metrics()
+    with self.assertRaisesRegex(TypeError, "expects scalars"):
+      metrics.update(0, loss=np.ones(2))
+    with self.assertRaisesRegex(TypeError, "traced value"):
+      jax.jit(lambda x: metrics.update(0, loss=x))(1.)
+    with self.assertRaisesRegex(ValueError, "read_every"):
+      Metrics(read_every=0)
+
+
+if __name__ == "__main__":
+  absltest.main()
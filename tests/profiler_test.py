@@ -13,11 +13,15 @@
 # limitations under the License.
 
 from functools import partial
+import json
+import os
+import tempfile
 import unittest
 
 from absl.testing import absltest
 
 import jax
+import jax.numpy as np
 import jax.profiler
 from jax.config import config
 import jax.test_util
@@ -61,6 +65,51 @@ class ProfilerTest(unittest.TestCase):
       return x + 2
     self.assertEqual(h(7), 9)
 
+  def testPhaseEventsForJit(self):
+    events = []
+    @jax.jit
+    def f_for_phase_events(x):
+      return x + 2
+    with jax.profiler.listen(events.append):
+      f_for_phase_events(1.).block_until_ready()
+      f_for_phase_events(2.).block_until_ready()
+    phases = [e.phase for e in events if e.name == "f_for_phase_events"]
+    self.assertEqual(phases, ["trace", "lower", "compile", "transfer",
+                              "execute", "result", "transfer", "execute",
+                              "result"])
+    self.assertTrue(all(e.duration >= 0 for e in events))
+
+  def testNoEventsWithoutListeners(self):
+    events = []
+    with jax.profiler.listen(events.append):
+      pass
+    np.sin(1.).block_until_ready()
+    self.assertEqual(events, [])
+
+  def testPhaseCounters(self):
+    counters = jax.profiler.PhaseCounters()
+    with jax.profiler.listen(counters):
+      for i in range(3):
+        jax.device_put(float(i))
+    self.assertEqual(counters.counts["transfer", "device_put"], 3)
+    text = counters.to_prometheus()
+    self.assertIn('jax_phase_calls_total{phase="transfer",name="device_put"} 3',
+                  text)
+    self.assertIn("# TYPE jax_phase_seconds_total counter", text)
+
+  def testChromeTrace(self):
+    trace = jax.profiler.ChromeTrace()
+    with jax.profiler.listen(trace):
+      jax.jit(lambda x: x * 2)(3.).block_until_ready()
+    with tempfile.TemporaryDirectory() as tmpdir:
+      path = os.path.join(tmpdir, "trace.json")
+      trace.save(path)
+      with open(path) as f:
+        trace_events = json.load(f)["traceEvents"]
+    self.assertEqual(len(trace_events), len(trace.events))
+    self.assertIn("compile <lambda>", [e["name"] for e in trace_events])
+    self.assertTrue(all(e["ph"] == "X" for e in trace_events))
+
 
 if __name__ == "__main__":
   absltest.main()
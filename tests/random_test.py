@@ -116,6 +116,165 @@ class LaxRandomTest(jtu.JaxTestCase):
     onp.testing.assert_equal(result[:n], onp.full((n,), 0xc4923a9c, dtype=onp.uint32))
     onp.testing.assert_equal(result[n:], onp.full((n,), 0x483df7a0, dtype=onp.uint32))
 
+  @parameterized.named_parameters(
+      {"testcase_name": "_count={}".format(count), "count": count}
+      for count in [0, 1, 2, 7, 10])
+  def testThreefryIota(self, count):
+    key = random.PRNGKey(3)
+    expected = random.threefry_2x32(key, onp.arange(count, dtype=onp.uint32))
+    self.assertAllClose(random._threefry_iota(key, count), expected,
+                        check_dtypes=True)
+
+  def testRandomBitsBlocks(self):
+    key = random.PRNGKey(0)
+    max_count, random._MAX_COUNT_PER_KEY = random._MAX_COUNT_PER_KEY, 5
+    try:
+      bits = random._random_bits(key, 32, (11,))
+    finally:
+      random._MAX_COUNT_PER_KEY = max_count
+    # 11 counters are split into 3 blocks of 4, one per subkey.
+    expected = np.concatenate([random._threefry_iota(k, 4)
+                               for k in random.split(key, 3)])[:11]
+    self.assertAllClose(bits, expected, check_dtypes=True)
+
+  def testRandomBitsBeyondCounterRange(self):
+    # Only traced abstractly, as the results would take 16GiB.
+    key = random.PRNGKey(0)
+    shape = (2 ** 32 + 3,)
+    out = api.eval_shape(lambda k: random._random_bits(k, 32, shape), key)
+    self.assertEqual(out.shape, shape)
+    shape = (2 ** 31,)
+    out = api.eval_shape(lambda k: random._random_bits(k, 64, shape), key)
+    self.assertEqual(out.shape, shape)
+
+  def testPhilox4x32(self):
+    # Known-answer tests from the Random123 distribution.
+    def result_to_hex(result):
+      return tuple([hex(x.copy()).rstrip("L") for x in result])
+
+    def philox(key, counters):
+      keypair = tuple(onp.uint32(k) for k in key)
+      counters = tuple(onp.uint32([c]) for c in counters)
+      return tuple(x[0] for x in random.philox_4x32(keypair, counters))
+
+    result = philox((0, 0), (0, 0, 0, 0))
+    expected = ("0x6627e8d5", "0xe169c58d", "0xbc57ac4c", "0x9b00dbd8")
+    self.assertEqual(expected, result_to_hex(result))
+
+    result = philox((0xffffffff,) * 2, (0xffffffff,) * 4)
+    expected = ("0x408f276d", "0x41c83b0e", "0xa20bc7c6", "0x6d5451fd")
+    self.assertEqual(expected, result_to_hex(result))
+
+    result = philox((0xa4093822, 0x299f31d0),
+                    (0x243f6a88, 0x85a308d3, 0x13198a2e, 0x03707344))
+    expected = ("0xd16cfe09", "0x94fdcceb", "0x5001e420", "0x24126ea1")
+    self.assertEqual(expected, result_to_hex(result))
+
+  @parameterized.named_parameters(
+      {"testcase_name": "_{}".format(impl), "impl": impl}
+      for impl in ["threefry2x32", "philox4x32", "unsafe_philox4x32"])
+  def testPRNGImpl(self, impl):
+    key = random.PRNGKey(0, impl=impl)
+    key_shape = random._prng_impls[impl].key_shape
+    self.assertEqual(key.shape, key_shape)
+    self.assertEqual(random.split(key, 3).shape, (3,) + key_shape)
+    self.assertEqual(random.fold_in(key, 5).shape, key_shape)
+    self.assertEqual(api.jit(random.fold_in)(key, 5).shape, key_shape)
+
+    keys = random.split(key, 4)
+    self.assertEqual(len(set(tuple(k) for k in onp.asarray(keys))), 4)
+    self.assertFalse(onp.array_equal(random.fold_in(key, 1),
+                                     random.fold_in(key, 2)))
+
+    rand = lambda key: random.uniform(key, (10000,))
+    for samples in [rand(key), api.jit(rand)(key)]:
+      self._CheckCollisions(samples, np.finfo(samples.dtype).nmant)
+      self._CheckKolmogorovSmirnovCDF(samples, scipy.stats.uniform().cdf)
+
+    samples = vmap(lambda key: random.normal(key, (1000,)))(keys)
+    self.assertEqual(samples.shape, (4, 1000))
+    self._CheckKolmogorovSmirnovCDF(samples.ravel(), scipy.stats.norm().cdf)
+    self.assertAllClose(samples[1], random.normal(keys[1], (1000,)),
+                        check_dtypes=True)
+
+  def testPRNGImplFlag(self):
+    threefry_key = random.PRNGKey(0)
+    prev = FLAGS.jax_prng_impl
+    config.update("jax_prng_impl", "philox4x32")
+    try:
+      key = random.PRNGKey(0)
+    finally:
+      config.update("jax_prng_impl", prev)
+    self.assertEqual(key.shape, (4,))
+    self.assertAllClose(random.PRNGKey(0), threefry_key, check_dtypes=True)
+
+  @parameterized.named_parameters(
+      {"testcase_name": "_{}".format(impl), "impl": impl}
+      for impl in ["threefry2x32", "philox4x32"])
+  def testBatchSplitAndFoldIn(self, impl):
+    keys = random.split(random.PRNGKey(0, impl=impl), 5)
+    self.assertAllClose(random.batch_split(keys, 3),
+                        vmap(random.split, (0, None))(keys, 3),
+                        check_dtypes=True)
+    data = onp.arange(5, dtype=onp.int32)
+    self.assertAllClose(random.batch_fold_in(keys, data),
+                        vmap(random.fold_in)(keys, data), check_dtypes=True)
+    self.assertAllClose(random.batch_fold_in(keys, 7),
+                        vmap(random.fold_in, (0, None))(keys, 7),
+                        check_dtypes=True)
+
+  @parameterized.named_parameters(
+      {"testcase_name": "_{}_{}".format(name, impl), "impl": impl,
+       "batch_fn": batch_fn, "fn": fn, "args": args}
+      for impl in ["threefry2x32", "philox4x32"]
+      for name, batch_fn, fn, args in [
+          ("uniform", random.batch_uniform, random.uniform, ((3, 4),)),
+          ("uniform_range", random.batch_uniform, random.uniform,
+           ((3,), onp.float32, onp.float32([0., 1., 2.]), 5.)),
+          ("normal", random.batch_normal, random.normal, ((7,),)),
+          ("bernoulli", random.batch_bernoulli, random.bernoulli,
+           (onp.float32(0.3), (2, 3))),
+          ("permutation", random.batch_permutation, random.permutation,
+           (10,)),
+          ("permutation_array", random.batch_permutation, random.permutation,
+           (onp.arange(12.).reshape(4, 3),)),
+      ])
+  def testBatchSampler(self, impl, batch_fn, fn, args):
+    keys = random.split(random.PRNGKey(1, impl=impl), 6)
+    expected = vmap(lambda key: fn(key, *args))(keys)
+    self.assertAllClose(batch_fn(keys, *args), expected, check_dtypes=True)
+    self.assertAllClose(api.jit(lambda keys: batch_fn(keys, *args))(keys),
+                        expected, check_dtypes=True)
+
+  def testBatchPerKeyParameters(self):
+    keys = random.split(random.PRNGKey(2), 4)
+    p = onp.float32([0.1, 0.5, 0.7, 0.9])
+    self.assertAllClose(random.batch_bernoulli(keys, p, (5,)),
+                        vmap(lambda k, p: random.bernoulli(k, p, (5,)))(keys, p),
+                        check_dtypes=True)
+    logits = onp.log(onp.float32([[.2, .3, .5], [.5, .4, .1]] * 2))
+    self.assertAllClose(
+        random.batch_categorical(keys, logits, shape=(8,)),
+        vmap(lambda k, l: random.categorical(k, l, shape=(8,)))(keys, logits),
+        check_dtypes=True)
+
+  def testBatchSamplingIsOneHash(self):
+    keys = random.split(random.PRNGKey(0), 8)
+    def count_hashes(jaxpr):
+      return (sum(eqn.primitive is random.threefry2x32_p for eqn in jaxpr.eqns)
+              + sum(map(count_hashes, core.subjaxprs(jaxpr))))
+    jaxpr = api.make_jaxpr(lambda keys: random.batch_normal(keys, (16,)))(keys)
+    self.assertEqual(count_hashes(jaxpr.jaxpr), 1)
+
+  def testPRNGImplErrors(self):
+    self.assertRaisesRegex(ValueError, "Unknown PRNG implementation foo",
+                           lambda: random.PRNGKey(0, impl="foo"))
+    self.assertRaisesRegex(TypeError, "Expected a PRNG key",
+                           lambda: random.split(onp.zeros(5, onp.uint32)))
+    impl = random._prng_impls["philox4x32"]._replace(name="philox_copy")
+    self.assertRaisesRegex(ValueError, "same key shape",
+                           lambda: random.register_prng_impl(impl))
+
   @parameterized.named_parameters(jtu.cases_from_list(
       {"testcase_name": "_{}".format(dtype), "dtype": onp.dtype(dtype).name}
       for dtype in [onp.float32, onp.float64]))
@@ -223,6 +382,68 @@ class LaxRandomTest(jtu.JaxTestCase):
     with self.assertRaises(core.ConcretizationTypeError):
       api.jit(random.permutation)(key, 10)
 
+  @parameterized.parameters(1, 2, 3, 4, 5, 17, 100, 1000, 4097)
+  def testPermutationIndex(self, n):
+    key = random.PRNGKey(0)
+    perm = random.permutation_index(key, onp.arange(n), n)
+    self.assertAllClose(onp.sort(perm), onp.arange(n), check_dtypes=False)
+    if n >= 10:
+      self.assertFalse(onp.all(perm == onp.arange(n)))  # seems unlikely!
+    self.assertEqual(random.permutation_index(key, n - 1, n), perm[n - 1])
+    crand = api.jit(lambda i: random.permutation_index(key, i, n))
+    self.assertAllClose(crand(onp.arange(n)), perm, check_dtypes=True)
+
+  def testPermutationIndexBatched(self):
+    keys = random.split(random.PRNGKey(0), 3)
+    perms = vmap(lambda k: random.permutation_index(k, onp.arange(50), 50))(keys)
+    for key, perm in zip(keys, perms):
+      self.assertAllClose(perm, random.permutation_index(key, onp.arange(50), 50),
+                          check_dtypes=True)
+    self.assertFalse(onp.all(perms[0] == perms[1]))
+
+  def testPermutationUsesPermutationIndexForLargeInputs(self):
+    key = random.PRNGKey(0)
+    old_size = random._MIN_INDEX_PERMUTATION_SIZE
+    random._MIN_INDEX_PERMUTATION_SIZE = 64
+    try:
+      perm = random.permutation(key, 100)
+      x = onp.arange(200.).reshape(100, 2)
+      permuted = random.permutation(key, x)
+      batch_perms = random.batch_permutation(random.split(key, 2), 100)
+    finally:
+      random._MIN_INDEX_PERMUTATION_SIZE = old_size
+    self.assertAllClose(perm, random.permutation_index(key, onp.arange(100), 100),
+                        check_dtypes=True)
+    self.assertAllClose(permuted, x[perm], check_dtypes=True)
+    self.assertAllClose(batch_perms[1],
+                        random.permutation_index(random.split(key, 2)[1],
+                                                 onp.arange(100), 100),
+                        check_dtypes=True)
+
+  def testPermutationIndexErrors(self):
+    key = random.PRNGKey(0)
+    self.assertRaisesRegex(ValueError, "requires 0 < n",
+                           lambda: random.permutation_index(key, 0, 0))
+    self.assertRaisesRegex(ValueError, "requires 0 < n",
+                           lambda: random.permutation_index(key, 0, 2 ** 32 + 1))
+    if not FLAGS.jax_enable_x64:
+      self.assertRaisesRegex(ValueError, "requires 0 < n",
+                             lambda: random.permutation_index(key, 0, 2 ** 31 + 1))
+
+  @parameterized.parameters(2 ** 31 + 17, 2 ** 32)
+  def testPermutationIndexAbove31Bits(self, n):
+    if not FLAGS.jax_enable_x64:
+      raise SkipTest("permutations of more than 2 ** 31 elements require x64")
+    key = random.PRNGKey(0)
+    index = onp.concatenate([onp.arange(4096, dtype=onp.uint32),
+                             onp.arange(n - 4096, n, dtype=onp.uint64)
+                             .astype(onp.uint32)])
+    perm = onp.asarray(random.permutation_index(key, index, n))
+    self.assertEqual(perm.dtype, onp.int64)
+    self.assertTrue(onp.all((0 <= perm) & (perm < n)))
+    self.assertEqual(len(onp.unique(perm)), len(index))
+    self.assertGreater(perm.max(), 2 ** 31)
+
   @parameterized.named_parameters(jtu.cases_from_list(
       {"testcase_name": "_p={}_{}".format(p, dtype),
        "p": p, "dtype": onp.dtype(dtype).name}
@@ -276,6 +497,49 @@ class LaxRandomTest(jtu.JaxTestCase):
       else:
         self._CheckChiSquared(samples, pmf=lambda x: p[x])
 
+  def testCategoricalWithoutReplacement(self):
+    p = onp.float32([.1, .2, .3, .4])
+    logits = onp.log(p)
+    keys = random.split(random.PRNGKey(0), 10000)
+    samples = vmap(
+        lambda key: random.categorical_without_replacement(key, logits, 3))(keys)
+    self.assertEqual(samples.shape, (10000, 3))
+    self.assertTrue(onp.all(onp.sort(samples, 1)[:, 1:] !=
+                            onp.sort(samples, 1)[:, :-1]))
+    self._CheckChiSquared(samples[:, 0], pmf=lambda x: p[x])
+
+    logits = onp.log(onp.float32([[.5, .5], [.1, .9]]))
+    out = random.categorical_without_replacement(keys[0], logits, 2, axis=0)
+    self.assertEqual(out.shape, (2, 2))
+    self.assertAllClose(onp.sort(out, 1), onp.array([[0, 1], [0, 1]]),
+                        check_dtypes=False)
+    self.assertRaisesRegex(
+        ValueError, "requires 0 <= k <= 2",
+        lambda: random.categorical_without_replacement(keys[0], logits, 3))
+
+  @parameterized.named_parameters(
+      {"testcase_name": "_{}".format(i), "p": p}
+      for i, p in enumerate([[.25] * 4, [.1, .2, .3, .4], [0., 3., 1., 0., 6.],
+                             onp.arange(1., 50.)]))
+  def testAliasTable(self, p):
+    p = onp.array(p, onp.float32)
+    p_normalized = p / p.sum()
+    table = random.alias_table(p)
+    prob, alias = onp.asarray(table.prob), onp.asarray(table.alias)
+    n = len(p)
+    implied = prob.copy()
+    onp.add.at(implied, alias, 1 - prob)
+    self.assertAllClose(implied / n, p_normalized, atol=1e-5, check_dtypes=False)
+
+    key = random.PRNGKey(0)
+    samples = random.alias_categorical(key, table, (10000,))
+    self.assertEqual(samples.shape, (10000,))
+    if n < 10:
+      self._CheckChiSquared(samples, pmf=lambda x: p_normalized[x])
+    self.assertAllClose(api.jit(random.alias_categorical, static_argnums=(2,))(
+                            key, table, (10000,)),
+                        samples, check_dtypes=True)
+
   def testBernoulliShape(self):
     key = random.PRNGKey(0)
     x = random.bernoulli(key, onp.array([0.2, 0.3]), shape=(3, 2))
@@ -370,6 +634,16 @@ class LaxRandomTest(jtu.JaxTestCase):
     x = random.gamma(key, onp.array([0.2, 0.3]), shape=(3, 2))
     assert x.shape == (3, 2)
 
+  def testGammaBatched(self):
+    keys = random.split(random.PRNGKey(0), 3)
+    alphas = onp.float32([0.3, 1., 4.5])
+    samples = vmap(lambda key: random.gamma(key, alphas, (2000, 3)))(keys)
+    self.assertAllClose(samples[1], random.gamma(keys[1], alphas, (2000, 3)),
+                        check_dtypes=True)
+    for i, a in enumerate(alphas):
+      self._CheckKolmogorovSmirnovCDF(samples[:, :, i].ravel(),
+                                      scipy.stats.gamma(a).cdf)
+
   @parameterized.named_parameters(jtu.cases_from_list(
       {"testcase_name": "_a={}".format(alpha), "alpha": alpha}
       for alpha in [1e-4, 1e-3, 1e-2, 1e-1, 1e0, 1e1, 1e2, 1e3, 1e4]))
@@ -424,6 +698,15 @@ class LaxRandomTest(jtu.JaxTestCase):
     self._CheckChiSquared(samples[:10000], scipy.stats.poisson(2.0).pmf)
     self._CheckChiSquared(samples[10000:], scipy.stats.poisson(20.0).pmf)
 
+  def testPoissonZeroAndMixedRates(self):
+    key = random.PRNGKey(0)
+    lam = onp.float32([0., 0.5, 9.9, 10., 1e3])
+    samples = random.poisson(key, lam, (5000, 5))
+    self.assertTrue(onp.all(samples[:, 0] == 0))
+    self.assertTrue(onp.all(samples >= 0))
+    self.assertAllClose(samples.mean(0), lam, rtol=0.05, atol=0.02,
+                        check_dtypes=False)
+
   def testPoissonShape(self):
     key = random.PRNGKey(0)
     x = random.poisson(key, onp.array([2.0, 20.0]), shape=(3, 2))
@@ -0,0 +1,106 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from absl.testing import absltest, parameterized
+
+import numpy as onp
+
+import jax
+from jax import test_util as jtu
+from jax import tree_util
+from jax.experimental.transfer_pool import TransferPool
+from jax.interpreters import xla
+
+from jax.config import config
+config.parse_flags_with_absl()
+FLAGS = config.FLAGS
+
+
+class TransferPoolTest(jtu.JaxTestCase):
+
+  def _is_staged(self, pool, x):
+    # Whether `x` is backed by one of the pool's staging buffers, i.e. whether
+    # the backend uses them as device buffers.
+    return any(onp.shares_memory(onp.asarray(x), staging)
+               for staging in pool._buffers[(x.shape, x.dtype)])
+
+  def _batch(self, i):
+    return {"x": onp.full((4, 3), i, onp.float64),
+            "y": onp.arange(5, dtype=onp.int32)[::-1] + i,
+            "step": i}
+
+  @parameterized.named_parameters(
+      {"testcase_name": "_zero_copy={}".format(zero_copy),
+       "zero_copy": zero_copy}
+      for zero_copy in (False, True))
+  def testPut(self, zero_copy):
+    prev = FLAGS.jax_cpu_zero_copy
+    config.update("jax_cpu_zero_copy", zero_copy)
+    try:
+      pool = TransferPool(max_buffers_per_key=2)
+      batches = [pool.put(self._batch(i)) for i in range(3)]
+      for i, batch in enumerate(batches):
+        expected = self._batch(i)
+        self.assertEqual(tree_util.tree_structure(batch),
+                         tree_util.tree_structure(expected))
+        for x in tree_util.tree_leaves(batch):
+          self.assertIsInstance(x, xla.DeviceArray)
+        self.assertAllClose(batch, expected, check_dtypes=False)
+        self.assertEqual(batch["x"].dtype, jax.dtypes.canonicalize_dtype(
+            onp.float64))
+
+      staged = self._is_staged(pool, batches[0]["x"])
+      del batches
+      batch = pool.put(self._batch(3))
+      self.assertAllClose(batch, self._batch(3), check_dtypes=False)
+      if staged:
+        # The third batch found no free staging buffers, and the fourth reused
+        # those of the first two.
+        self.assertEqual(pool.num_allocated, 4)
+        self.assertEqual(pool.num_reused, 2)
+      elif jax.devices()[0].platform == "cpu":
+        # Staging buffers are free again as soon as they're transferred.
+        self.assertEqual(pool.num_allocated, 2)
+        self.assertEqual(pool.num_reused, 6)
+    finally:
+      config.update("jax_cpu_zero_copy", prev)
+
+  def testBuffersInUseAreNotReused(self):
+    prev = FLAGS.jax_cpu_zero_copy
+    config.update("jax_cpu_zero_copy", True)
+    try:
+      pool = TransferPool(max_buffers_per_key=1)
+      x = pool.put(onp.ones(8, onp.float32))
+      staged = self._is_staged(pool, x)
+      view = onp.asarray(x)
+      x_t = x.reshape(2, 4).T
+      del x
+      y = pool.put(onp.zeros(8, onp.float32))
+      self.assertAllClose(view, onp.ones(8, onp.float32), check_dtypes=True)
+      self.assertAllClose(x_t, onp.ones((4, 2), onp.float32), check_dtypes=True)
+      self.assertAllClose(y, onp.zeros(8, onp.float32), check_dtypes=True)
+
+      del view, x_t
+      y.delete()
+      z = pool.put(onp.full(8, 2, onp.float32))
+      self.assertAllClose(z, onp.full(8, 2, onp.float32), check_dtypes=True)
+      self.assertEqual(pool.num_allocated, 1)
+      if staged:
+        self.assertEqual(pool.num_reused, 1)
+    finally:
+      config.update("jax_cpu_zero_copy", prev)
+
+
+if __name__ == "__main__":
+  absltest.main()